@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+#
+# Author: Florent Piétot <florent.pietot@gmail.com>
+
+""" Benchmarks of grammar loading and parsing on synthetic grammars
+
+    Usage:
+        python -m benchmarks.run --save baseline.json
+        python -m benchmarks.run --compare baseline.json
+"""
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+#
+# Author: Florent Piétot <florent.pietot@gmail.com>
+
+""" Generate synthetic grammars and sentences of controlled size
+"""
+
+import random
+from cfg.grammar import is_terminal
+
+
+def synthetic_grammar(lexicon_size=1000, fan_out=3, ambiguity=1, depth=3,
+                      seed=0):
+    """ Return the text of a random grammar of the given size
+
+        The grammar has ``depth`` levels of ``fan_out`` phrase symbols, each
+        with ``fan_out`` productions: a unary one and distinct binary ones
+        over symbols of the level below. The last level rewrites to
+        ``fan_out`` word categories. Clauses are joined by 'and' with a
+        right-recursive start symbol, so that sentences can be of any length:
+            S -> CL | CL 'and' S
+            CL -> X1_0 | X1_1 | ...
+            X1_0 -> X2_0 | X2_1 X2_2 | ...
+            ...
+            C0 -> 'w0' | 'w3' | ...
+
+        Args:
+            lexicon_size: number of words
+            fan_out: number of productions of each phrase symbol and number
+                of word categories, at least 2
+            ambiguity: number of categories of each word, at most
+                ``fan_out``
+            depth: number of phrase levels
+            seed: seed of the random choices
+        Returns:
+            grammar as a string, to be read by ``Grammar.parse_grammar``
+    """
+    if fan_out < 2:
+        raise ValueError("fan_out should be at least 2")
+    rng = random.Random(seed)
+    ambiguity = max(1, min(ambiguity, fan_out))
+
+    def level(d):
+        if d > depth:
+            return ["C%d" % i for i in range(fan_out)]
+        return ["X%d_%d" % (d, i) for i in range(fan_out)]
+
+    lines = ["S -> CL | CL 'and' S", "CL -> %s" % " | ".join(level(1))]
+    for d in range(1, depth + 1):
+        below = level(d + 1)
+        for index, symbol in enumerate(level(d)):
+            pairs = ["%s %s" % (left, right) for left in below
+                     for right in below]
+            alternatives = [below[index]] + rng.sample(pairs, fan_out - 1)
+            lines.append("%s -> %s" % (symbol, " | ".join(alternatives)))
+    words = [[] for _ in range(fan_out)]
+    for word in range(lexicon_size):
+        for k in range(ambiguity):
+            words[(word + k) % fan_out].append("'w%d'" % word)
+    for index, category in enumerate(level(depth + 1)):
+        if words[index]:
+            lines.append("%s -> %s" % (category, " | ".join(words[index])))
+    return "\n".join(lines) + "\n"
+
+
+def synthetic_sentences(grammar, length, count, seed=0):
+    """ Return ``count`` random sentences of exactly ``length`` words
+        derived by ``grammar``
+
+        Productions are picked at random among the ones able to derive the
+        number of words left, so every sentence has at least one parse.
+
+        Raises:
+            ValueError if ``grammar`` derives no sentence of ``length`` words
+    """
+    rng = random.Random(seed)
+    lengths = _yield_lengths(grammar, length)
+    if length not in lengths.get(grammar.start(), ()):
+        raise ValueError("Grammar derives no sentence of %d words" % length)
+    candidates = {}
+    sentences = []
+    for _ in range(count):
+        words = []
+        stack = [(grammar.start(), length)]
+        while stack:
+            symbol, size = stack.pop()
+            if is_terminal(symbol):
+                words.append(symbol[1:-1])
+                continue
+            key = (symbol, size)
+            if key not in candidates:
+                candidates[key] = [
+                    production for production in grammar.productions(symbol)
+                    if size in _sequence_lengths(production.rhs(), lengths,
+                                                 length)[0]]
+            production = rng.choice(candidates[key])
+            sizes = _split(production.rhs(), size, lengths, length, rng)
+            stack.extend(reversed(list(zip(production.rhs(), sizes))))
+        sentences.append(" ".join(words))
+    return sentences
+
+
+def _yield_lengths(grammar, max_length):
+    """ Return a dict mapping each symbol of ``grammar`` to the set of the
+        lengths, up to ``max_length``, of the sentences it derives
+    """
+    lengths = {}
+    changed = True
+    while changed:
+        changed = False
+        for production in grammar.productions():
+            derived = _sequence_lengths(production.rhs(), lengths,
+                                        max_length)[0]
+            known = lengths.setdefault(production.lhs(), set())
+            if not derived <= known:
+                known |= derived
+                changed = True
+    return lengths
+
+
+def _sequence_lengths(rhs, lengths, max_length):
+    """ Return the sets of lengths derived by each suffix of ``rhs``, the
+        whole ``rhs`` first
+    """
+    suffixes = [set([0])]
+    for symbol in reversed(rhs):
+        symbol_lengths = [1] if is_terminal(symbol) else lengths.get(symbol,
+                                                                     ())
+        suffixes.append(set(a + b for a in symbol_lengths
+                            for b in suffixes[-1] if a + b <= max_length))
+    suffixes.reverse()
+    return suffixes
+
+
+def _split(rhs, size, lengths, max_length, rng):
+    """ Randomly split ``size`` words among the symbols of ``rhs``
+    """
+    suffixes = _sequence_lengths(rhs, lengths, max_length)
+    sizes = []
+    for index, symbol in enumerate(rhs):
+        symbol_lengths = [1] if is_terminal(symbol) else lengths[symbol]
+        choices = [a for a in symbol_lengths
+                   if size - a in suffixes[index + 1]]
+        chosen = rng.choice(sorted(choices))
+        sizes.append(chosen)
+        size -= chosen
+    return sizes
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+#
+# Author: Florent Piétot <florent.pietot@gmail.com>
+
+""" Time grammar loading and parsing over a grid of synthetic grammars
+
+    Each case generates a grammar and sentences with ``benchmarks.generate``,
+    then measures every engine on them: the best time over a few runs, and
+    the peak memory allocated during a separate traced run. Results can be
+    saved as a baseline and later runs compared against it.
+
+    Usage:
+        python -m benchmarks.run --lexicon-size 100 1000 --length 5 10
+        python -m benchmarks.run --save baseline.json
+        python -m benchmarks.run --compare baseline.json --threshold 1.5
+"""
+
+import argparse
+import gc
+import itertools
+import json
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+from cfg.grammar import Grammar
+from cfg.parse import TopDownParser, CKYParser, EarleyParser, ViterbiParser
+from benchmarks.generate import synthetic_grammar, synthetic_sentences
+
+
+def _parse_with(parser_factory):
+    def setup(text, grammar, sentences):
+        parser = parser_factory(grammar)
+
+        def run():
+            return sum(1 for sentence in sentences
+                       for _ in parser.parse(sentence))
+        return run
+    return setup
+
+
+def _recognize(text, grammar, sentences):
+    parser = EarleyParser(grammar)
+
+    def run():
+        return sum(1 for sentence in sentences if parser.recognize(sentence))
+    return run
+
+
+def _parse_grammar(text, grammar, sentences):
+    def run():
+        return len(Grammar.parse_grammar(text).productions())
+    return run
+
+
+# Engine name -> setup(grammar text, grammar, sentences) returning the
+# function to measure. It returns a count, of parses for the parsers, to
+# check that engines agree; the viterbi engine only returns the best parse
+# and the recognize engine counts grammatical sentences.
+ENGINES = OrderedDict([
+    ("parse_grammar", _parse_grammar),
+    ("topdown", _parse_with(TopDownParser)),
+    ("topdown-memoize", _parse_with(
+        lambda grammar: TopDownParser(grammar, memoize=True))),
+    ("topdown-iterative", _parse_with(
+        lambda grammar: TopDownParser(grammar, iterative=True))),
+    ("cky", _parse_with(CKYParser)),
+    ("earley", _parse_with(EarleyParser)),
+    ("viterbi", _parse_with(ViterbiParser)),
+    ("recognize", _recognize),
+])
+
+
+def cases(lexicon_sizes=(100, ), fan_outs=(3, ), ambiguities=(1, ),
+          depths=(3, ), lengths=(5, 10)):
+    """ Return the grid of benchmark cases as dicts of their parameters
+    """
+    return [OrderedDict([("lexicon_size", lexicon_size),
+                         ("fan_out", fan_out),
+                         ("ambiguity", ambiguity),
+                         ("depth", depth),
+                         ("length", length)])
+            for lexicon_size, fan_out, ambiguity, depth, length in
+            itertools.product(lexicon_sizes, fan_outs, ambiguities, depths,
+                              lengths)]
+
+
+def case_name(case):
+    """ Return the name of ``case``, used as key of its results
+    """
+    return " ".join("%s=%s" % item for item in case.items())
+
+
+def measure(function, repeat=3):
+    """ Measure ``function``
+        Returns:
+            dict of the best time in seconds over ``repeat`` runs, the peak
+            memory in bytes allocated by a traced run and the value returned
+            by ``function``
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return OrderedDict([("time", min(times)), ("memory", memory),
+                        ("count", result)])
+
+
+def run(cases, engines=None, sentences=10, repeat=3, seed=0, output=None):
+    """ Run every engine of ``engines`` on every case of ``cases``
+
+        Args:
+            cases: list of case parameters, see ``cases()``
+            engines: names of the engines of ``ENGINES`` to run, all of them
+                by default
+            sentences: number of sentences parsed by each case
+            repeat: number of timed runs
+            seed: seed of the grammar and sentence generators
+            output: where to print results as they come, None to stay quiet
+        Returns:
+            dict mapping case names to dicts mapping engine names to their
+            measures
+    """
+    if engines is None:
+        engines = list(ENGINES)
+    results = OrderedDict()
+    for case in cases:
+        text = synthetic_grammar(case["lexicon_size"], case["fan_out"],
+                                 case["ambiguity"], case["depth"], seed=seed)
+        grammar = Grammar.parse_grammar(text)
+        batch = synthetic_sentences(grammar, case["length"], sentences,
+                                    seed=seed)
+        name = case_name(case)
+        results[name] = OrderedDict()
+        for engine in engines:
+            function = ENGINES[engine](text, grammar, batch)
+            results[name][engine] = measure(function, repeat)
+            if output is not None:
+                output.write(_format(name, engine, results[name][engine]))
+                output.flush()
+    return results
+
+
+def compare(results, baseline, threshold=1.25, min_time=0.001):
+    """ Compare ``results`` to ``baseline``, both as returned by ``run``
+
+        Args:
+            threshold: ratio to the baseline above which a time or memory
+                measure is a regression
+            min_time: differences of less than this number of seconds are
+                ignored as noise
+        Returns:
+            list of (case name, engine, measure, baseline value, value) for
+            every regression
+    """
+    regressions = []
+    for name, engines in results.items():
+        for engine, measures in engines.items():
+            reference = baseline.get(name, {}).get(engine)
+            if reference is None:
+                continue
+            for key in ("time", "memory"):
+                value, expected = measures[key], reference[key]
+                if key == "time" and value - expected < min_time:
+                    continue
+                if value > expected * threshold:
+                    regressions.append((name, engine, key, expected, value))
+    return regressions
+
+
+def _format(name, engine, measures):
+    return "%-60s %-18s %10.4fs %10.1fKiB %8d\n" % (
+        name, engine, measures["time"], measures["memory"] / 1024.0,
+        measures["count"])
+
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(
+        description="Benchmark grammar loading and parsing")
+    arguments.add_argument("--lexicon-size", type=int, nargs="+",
+                           default=[100])
+    arguments.add_argument("--fan-out", type=int, nargs="+", default=[3])
+    arguments.add_argument("--ambiguity", type=int, nargs="+", default=[1])
+    arguments.add_argument("--depth", type=int, nargs="+", default=[3])
+    arguments.add_argument("--length", type=int, nargs="+", default=[5, 10])
+    arguments.add_argument("--engine", nargs="+", choices=list(ENGINES),
+                           default=None)
+    arguments.add_argument("--sentences", type=int, default=10,
+                           help="number of sentences per case")
+    arguments.add_argument("--repeat", type=int, default=3)
+    arguments.add_argument("--seed", type=int, default=0)
+    arguments.add_argument("--save", metavar="PATH",
+                           help="save the results as a baseline")
+    arguments.add_argument("--compare", metavar="PATH",
+                           help="compare the results to a saved baseline")
+    arguments.add_argument("--threshold", type=float, default=1.25,
+                           help="ratio to the baseline flagged as regression")
+    options = arguments.parse_args(argv)
+
+    grid = cases(options.lexicon_size, options.fan_out, options.ambiguity,
+                 options.depth, options.length)
+    results = run(grid, options.engine, options.sentences, options.repeat,
+                  options.seed, output=sys.stdout)
+    if options.save:
+        with open(options.save, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+    if options.compare:
+        with open(options.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, options.threshold)
+        for name, engine, key, expected, value in regressions:
+            print("REGRESSION %s %s %s: %.6g -> %.6g (x%.2f)" %
+                  (name, engine, key, expected, value, value / expected))
+        if regressions:
+            return 1
+        print("No regression against %s" % options.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
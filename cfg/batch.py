@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+#
+# Author: Florent Piétot <florent.pietot@gmail.com>
+
+""" Parse batches of sentences, optionally across a pool of processes
+"""
+
+import signal
+import threading
+import time
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from cfg.serialize import tree_to_json, tree_from_json
+from cfg.tree import tree_to_tuples
+
+# Result of parsing a sentence of a batch:
+#   status: "complete", "timeout" if the sentence took longer than the
+#       timeout, or "error" if parsing it raised an exception
+#   parses: trees found, in the nested tuples form of ``tree_to_tuples``
+#   error: error message if status is "error", None otherwise
+BatchResult = namedtuple('BatchResult', ['status', 'parses', 'error'])
+
+# Parser of the current worker process, shipped once by ``_init_worker``
+_worker_parser = None
+_worker_timeout = None
+
+
+def parse_many(parser, sentences, workers=1, chunk_size=64, timeout=None,
+               max_pending=None):
+    """ Parse every sentence of ``sentences`` with ``parser``
+
+        Args:
+            parser: any parser of ``cfg.parse``
+            sentences: iterable of strings or lists of tokens
+            workers: number of processes. With more than one, ``parser`` and
+                its grammar are shipped once to each worker process and
+                sentences are distributed in chunks.
+            chunk_size: number of sentences sent to a worker at once
+            timeout: maximum number of seconds spent on each sentence, None
+                for no limit
+            max_pending: maximum number of chunks sent to the workers and not
+                yet consumed, twice the number of workers by default.
+                ``sentences`` is only read as results are consumed, which
+                bounds memory on large inputs.
+        Returns:
+            generator of a ``BatchResult`` for each sentence, in the order
+            of ``sentences``
+
+        Workers send trees back as flat JSON strings, so that parses of any
+        depth reach the parent process. If a worker process dies, the
+        sentences of the chunks in flight get an "error" result and the
+        workers are started again for the next chunks.
+    """
+    if workers < 1:
+        raise ValueError("workers should be at least 1")
+    chunks = _chunks(sentences, chunk_size)
+    if workers == 1:
+        for chunk in chunks:
+            for result in _parse_chunk_with(parser, chunk, timeout,
+                                            tree_to_tuples):
+                yield result
+        return
+    if max_pending is None:
+        max_pending = 2 * workers
+    pool = _Workers(parser, workers, timeout)
+    try:
+        # Only read the next chunk once the oldest one has been consumed
+        pending = deque()
+        for chunk in chunks:
+            pending.append((chunk, pool.submit(chunk)))
+            if len(pending) >= max_pending:
+                for result in _collect(*pending.popleft()):
+                    yield result
+        while pending:
+            for result in _collect(*pending.popleft()):
+                yield result
+    finally:
+        pool.close()
+
+
+def _chunks(sentences, chunk_size):
+    chunk = []
+    for sentence in sentences:
+        chunk.append(sentence)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _Workers(object):
+    """ Pool of worker processes, started again once one of them died
+    """
+
+    def __init__(self, parser, workers, timeout):
+        self._parser = parser
+        self._workers = workers
+        self._timeout = timeout
+        self._pool = None
+
+    def submit(self, chunk):
+        """ Return the future of the results of ``chunk``
+        """
+        for _ in range(2):
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    self._workers, initializer=_init_worker,
+                    initargs=(self._parser, self._timeout))
+            try:
+                return self._pool.submit(_parse_chunk, chunk)
+            except BrokenProcessPool:
+                self.close()
+        raise BrokenProcessPool("Can't start the worker processes")
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def _collect(chunk, future):
+    """ Return the ``BatchResult``s of ``chunk`` once parsed by a worker
+    """
+    try:
+        results = future.result()
+    except BrokenProcessPool as error:
+        message = "Worker process died: %s" % error
+        return [BatchResult("error", [], message) for _ in chunk]
+    return [result._replace(parses=[tree_to_tuples(tree_from_json(parse))
+                                    for parse in result.parses])
+            for result in results]
+
+
+def _init_worker(parser, timeout):
+    global _worker_parser, _worker_timeout
+    _worker_parser = parser
+    _worker_timeout = timeout
+
+
+def _parse_chunk(chunk):
+    return _parse_chunk_with(_worker_parser, chunk, _worker_timeout,
+                             tree_to_json)
+
+
+def _parse_chunk_with(parser, chunk, timeout, encode):
+    return [_parse_sentence(parser, sentence, timeout, encode)
+            for sentence in chunk]
+
+
+def _parse_sentence(parser, sentence, timeout, encode):
+    """ Parse ``sentence`` within ``timeout`` seconds, ``encode`` converting
+        each tree to the form of the result
+        The search is interrupted by an alarm signal where available,
+        otherwise the deadline is only checked between two parses.
+    """
+    parses = []
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    try:
+        with _Alarm(timeout):
+            for tree, _ in parser.parse(sentence):
+                parses.append(encode(tree))
+                if deadline is not None and time.perf_counter() > deadline:
+                    raise _Timeout()
+    except _Timeout:
+        return BatchResult("timeout", parses, None)
+    except Exception as error:
+        return BatchResult("error", parses, str(error))
+    return BatchResult("complete", parses, None)
+
+
+class _Timeout(Exception):
+    pass
+
+
+class _Alarm(object):
+    """ Raise ``_Timeout`` in the main thread after ``timeout`` seconds
+    """
+
+    def __init__(self, timeout):
+        self._enabled = (timeout is not None and
+                         hasattr(signal, "setitimer") and
+                         threading.current_thread() is
+                         threading.main_thread())
+        self._timeout = timeout
+        self._handler = None
+
+    def __enter__(self):
+        if self._enabled:
+            self._handler = signal.signal(signal.SIGALRM, _raise_timeout)
+            signal.setitimer(signal.ITIMER_REAL, self._timeout)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._enabled:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, self._handler)
+        return False
+
+
+def _raise_timeout(signum, frame):
+    raise _Timeout()
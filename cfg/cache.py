@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+#
+# Author: Florent Piétot <florent.pietot@gmail.com>
+
+""" Load grammar files through a binary cache of their compiled form
+
+    Parsing a large grammar text runs several regular expressions per rule.
+    The first time a grammar file is loaded, its ``CompiledGrammar`` is saved
+    next to it; later loads map the cache file in memory and copy its arrays
+    back without parsing anything. A cache is only used if it was written by
+    the same format version from a grammar with the same content hash,
+    otherwise the text is parsed again and the cache rewritten.
+
+    Cache file layout, in native byte order:
+        header: magic, format version, byte order mark, SHA-256 of the
+            grammar text, number of symbols, start symbol id (``NO_START``
+            for a grammar without productions), number of productions,
+            length of the right-hand side array, number of left-hand side
+            symbols, number of lexicon words, number of lexicon productions,
+            length of the symbols section, total size of the FIRST sets of
+            the symbols and of the productions
+        symbols: symbols encoded in UTF-8, separated by newlines
+        terminal, lhs, rhs_offsets, rhs: arrays of ``CompiledGrammar``
+        lhs_index, lexicon: indexes of ``CompiledGrammar``, each as its keys,
+            offsets, and production ids grouped by key
+        probs: probabilities of the productions, as doubles
+        nullable, preterminal, production_nullable, min_yield,
+            production_min_yield: tables of ``CompiledGrammar.analyze``,
+            -1 standing for an infinite minimum yield
+        first, production_first: FIRST sets of ``CompiledGrammar.analyze``,
+            each as offsets and sorted terminal ids grouped by symbol or
+            production
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from bisect import bisect_left
+from cfg.grammar import Grammar, CompiledGrammar
+
+MAGIC = b"CFGC"
+VERSION = 4
+CACHE_SUFFIX = ".cfgc"
+
+_HEADER = struct.Struct("=4sHxxI32sIIIIIIIIII")
+_BYTE_ORDER_MARK = 0x01020304
+NO_START = 0xFFFFFFFF
+_INFINITE = float('inf')
+
+
+def load_grammar(path, cache=True, cache_path=None):
+    """ Load the grammar written in the file at ``path``
+
+        Args:
+            path: path of the grammar text file
+            cache: whether to read and write the compiled grammar cache
+            cache_path: path of the cache file, ``path`` followed by
+                ``CACHE_SUFFIX`` by default
+        Returns:
+            a ``Grammar``, already compiled when loaded from the cache
+    """
+    if not cache:
+        with open(path) as lines:
+            return Grammar.parse_lines(lines)
+    if cache_path is None:
+        cache_path = path + CACHE_SUFFIX
+    digest = file_digest(path)
+    compiled = read_cache(cache_path, digest)
+    if compiled is not None:
+        return Grammar.from_compiled(compiled)
+    with open(path) as lines:
+        grammar = Grammar.parse_lines(lines)
+    try:
+        write_cache(cache_path, grammar.compile(), digest)
+    except (IOError, OSError):
+        # A read-only location only costs the next load a parse
+        pass
+    return grammar
+
+
+def file_digest(path):
+    """ Return the SHA-256 digest of the content of the file at ``path``
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(1 << 20), b""):
+            digest.update(block)
+    return digest.digest()
+
+
+def write_cache(cache_path, compiled, digest):
+    """ Save ``compiled`` to ``cache_path``, keyed by ``digest``
+        The file is written aside then moved in place, so that concurrent
+        loaders never see a partial cache. ``compiled`` is analyzed first,
+        so that its loaders don't have to.
+    """
+    compiled.analyze()
+    symbols = "\n".join(compiled.symbols).encode("utf-8")
+    first = _sets_arrays(compiled.first)
+    production_first = _sets_arrays(compiled.production_first)
+    header = _HEADER.pack(MAGIC, VERSION, _BYTE_ORDER_MARK, digest,
+                          len(compiled.symbols),
+                          NO_START if compiled.start is None
+                          else compiled.start,
+                          len(compiled.lhs), len(compiled.rhs),
+                          len(compiled.lhs_index), len(compiled.lexicon),
+                          sum(map(len, compiled.lexicon.values())),
+                          len(symbols), len(first[1]),
+                          len(production_first[1]))
+    directory = os.path.dirname(os.path.abspath(cache_path))
+    handle, temporary = tempfile.mkstemp(dir=directory, suffix=CACHE_SUFFIX)
+    try:
+        with os.fdopen(handle, "wb") as output:
+            output.write(header)
+            output.write(symbols)
+            output.write(compiled.terminal)
+            for values in ((compiled.lhs, compiled.rhs_offsets,
+                            compiled.rhs) +
+                           _index_arrays(compiled.lhs_index) +
+                           _index_arrays(compiled.lexicon)):
+                array('i', values).tofile(output)
+            array('d', compiled.probs).tofile(output)
+            output.write(compiled.nullable)
+            output.write(compiled.preterminal)
+            output.write(compiled.production_nullable)
+            for values in ((_yields(compiled.min_yield),
+                            _yields(compiled.production_min_yield)) +
+                           first + production_first):
+                array('i', values).tofile(output)
+        os.replace(temporary, cache_path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+def read_cache(cache_path, digest):
+    """ Return the ``CompiledGrammar`` saved in ``cache_path``, or None if
+        there is no cache or it is stale: written by another format version
+        or byte order, or for a grammar other than ``digest``
+    """
+    try:
+        with open(cache_path, "rb") as source:
+            if os.fstat(source.fileno()).st_size < _HEADER.size:
+                return None
+            with mmap.mmap(source.fileno(), 0,
+                           access=mmap.ACCESS_READ) as data:
+                return _read_compiled(data, digest)
+    except (IOError, OSError):
+        return None
+
+
+def _read_compiled(data, digest):
+    (magic, version, byte_order, cached_digest, symbols_count, start,
+     productions_count, rhs_count, index_count, lexicon_count,
+     lexicon_productions, symbols_size, first_count,
+     production_first_count) = _HEADER.unpack_from(data, 0)
+    if (magic, version, byte_order, cached_digest) != \
+            (MAGIC, VERSION, _BYTE_ORDER_MARK, digest):
+        return None
+    itemsize = array('i').itemsize
+    counts = [productions_count, productions_count + 1, rhs_count,
+              index_count, index_count + 1, productions_count,
+              lexicon_count, lexicon_count + 1, lexicon_productions]
+    analysis_counts = [symbols_count, productions_count, symbols_count + 1,
+                       first_count, productions_count + 1,
+                       production_first_count]
+    sizes = [symbols_size, symbols_count] + \
+        [count * itemsize for count in counts] + \
+        [productions_count * array('d').itemsize] + \
+        [symbols_count, symbols_count, productions_count] + \
+        [count * itemsize for count in analysis_counts]
+    if _HEADER.size + sum(sizes) != len(data):
+        return None
+    decoders = [_decode_symbols, bytearray] + [_ints] * len(counts) + \
+        [_doubles] + [bytearray] * 3 + [_ints] * len(analysis_counts)
+    sections = []
+    offset = _HEADER.size
+    # Sections are decoded straight from the mapped file, then released
+    # before it is closed
+    with memoryview(data) as view:
+        for size, decode in zip(sizes, decoders):
+            with view[offset:offset + size] as section:
+                sections.append(decode(section))
+            offset += size
+    symbols = sections[0]
+    if len(symbols) != symbols_count:
+        return None
+    terminal = sections[1]
+    arrays = sections[2:11]
+    lhs, rhs_offsets, rhs = arrays[:3]
+    probs = sections[11]
+    nullable, preterminal, production_nullable = sections[12:15]
+    min_yield, production_min_yield = sections[15:17]
+    if start == NO_START:
+        start = None
+    analysis = (nullable, _Sets(*sections[17:19]), _infinite(min_yield),
+                production_nullable, _Sets(*sections[19:21]),
+                _infinite(production_min_yield), preterminal)
+    return CompiledGrammar.from_arrays(symbols, terminal, start, lhs,
+                                       rhs_offsets, rhs, probs,
+                                       _index_dict(*arrays[3:6]),
+                                       _index_dict(*arrays[6:9]),
+                                       analysis)
+
+
+def _decode_symbols(section):
+    return str(section, "utf-8").split("\n") if len(section) else []
+
+
+def _ints(section):
+    values = array('i')
+    values.frombytes(section)
+    return values
+
+
+def _doubles(section):
+    values = array('d')
+    values.frombytes(section)
+    return values
+
+
+def _yields(min_yield):
+    """ Return ``min_yield`` with -1 for the infinite minimum yields
+    """
+    return [-1 if length == _INFINITE else length for length in min_yield]
+
+
+def _infinite(values):
+    """ Return the minimum yields of ``_yields``
+    """
+    return [_INFINITE if length < 0 else length for length in values]
+
+
+def _sets_arrays(sets):
+    """ Return the offsets and grouped sorted values of ``sets``, a list
+        of sets of ints
+    """
+    offsets = array('i', [0])
+    values = array('i')
+    for items in sets:
+        values.extend(sorted(items))
+        offsets.append(len(values))
+    return (offsets, values)
+
+
+class _Sets(object):
+    """ Sets of ``_sets_arrays``, indexed like the original list
+        The FIRST sets of large grammars hold millions of terminal ids, of
+        which a parse only looks at a few: each set is read in place from
+        its sorted values rather than built as a frozenset.
+    """
+
+    def __init__(self, offsets, values):
+        self._offsets = offsets
+        self._values = values
+        self._sets = [None] * (len(offsets) - 1)
+
+    def __getitem__(self, index):
+        items = self._sets[index]
+        if items is None:
+            items = self._sets[index] = _SortedSet(
+                self._values, self._offsets[index], self._offsets[index + 1])
+        return items
+
+    def __len__(self):
+        return len(self._sets)
+
+    def __iter__(self):
+        for index in range(len(self._sets)):
+            yield self[index]
+
+
+class _SortedSet(object):
+    """ Set of the sorted ints of values[start:end]
+    """
+
+    __slots__ = ('_values', '_start', '_end')
+
+    def __init__(self, values, start, end):
+        self._values = values
+        self._start = start
+        self._end = end
+
+    def __contains__(self, item):
+        index = bisect_left(self._values, item, self._start, self._end)
+        return index < self._end and self._values[index] == item
+
+    def __len__(self):
+        return self._end - self._start
+
+    def __iter__(self):
+        return iter(self._values[self._start:self._end])
+
+
+def _index_arrays(index):
+    """ Return the keys, offsets and grouped values of ``index``, a dict of
+        lists of ints
+    """
+    keys = array('i', index)
+    offsets = array('i', [0])
+    values = array('i')
+    for key in keys:
+        values.extend(index[key])
+        offsets.append(len(values))
+    return (keys, offsets, values)
+
+
+def _index_dict(keys, offsets, values):
+    """ Rebuild the dict of lists of ``_index_arrays`` without looping over
+        its keys in Python
+    """
+    return dict(zip(keys, map(array.tolist, map(
+        values.__getitem__, map(slice, offsets, offsets[1:])))))
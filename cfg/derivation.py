@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+# Author: Florent Piétot <florent.pietot@gmail.com>
+
+""" Compact parses made of production ids
+    A derivation only records the productions applied by a parse, in
+    leftmost order, along with the index of the first token each of them
+    covers. Trees are built from it on demand.
+"""
+
+from cfg.transform import restore
+
+
+class Derivation(object):
+    """ Leftmost derivation of a sentence by a compiled grammar
+    """
+
+    __slots__ = ('_compiled', '_productions', '_starts')
+
+    def __init__(self, compiled, productions, starts):
+        """ Args:
+                compiled: ``CompiledGrammar`` the production ids refer to
+                productions: production ids in the order they were applied,
+                    i.e. the preorder of the nodes of the tree
+                starts: index of the first token covered by each production
+        """
+        self._compiled = compiled
+        self._productions = tuple(productions)
+        self._starts = tuple(starts)
+
+    def production_ids(self):
+        """ Return the ids of the productions applied, in leftmost order
+        """
+        return self._productions
+
+    def productions(self):
+        """ Return the ``Production``s applied, in leftmost order
+        """
+        productions = self._compiled.productions
+        return [productions[production] for production in self._productions]
+
+    def starts(self):
+        """ Return the index of the first token covered by each production
+        """
+        return self._starts
+
+    def spans(self):
+        """ Return the (start, end) token span covered by each production
+        """
+        compiled = self._compiled
+        ends = [None] * len(self._productions)
+        productions = enumerate(self._productions)
+        index, production = next(productions)
+        position = self._starts[0]
+        # Frames of [index of the production, right-hand side, number of
+        # symbols of the right-hand side done]
+        stack = [[index, compiled.production_rhs(production), 0]]
+        while stack:
+            frame = stack[-1]
+            index, rhs, done = frame
+            if done == len(rhs):
+                stack.pop()
+                ends[index] = position
+                continue
+            frame[2] += 1
+            if compiled.terminal[rhs[done]]:
+                position += 1
+            else:
+                index, production = next(productions)
+                stack.append([index, compiled.production_rhs(production), 0])
+        return list(zip(self._starts, ends))
+
+    def tree(self):
+        """ Build the ``Tree`` of this ``derivation``, in the shape of the
+            original grammar if the productions were transformed
+        """
+        compiled = self._compiled
+        symbols, terminal = compiled.symbols, compiled.terminal
+        productions = iter(self._productions)
+        production = next(productions)
+        # Frames of [production id, right-hand side, built children]
+        stack = [[production, compiled.production_rhs(production), []]]
+        while True:
+            production, rhs, children = stack[-1]
+            if len(children) < len(rhs):
+                symbol = rhs[len(children)]
+                if terminal[symbol]:
+                    children.append(symbols[symbol])
+                else:
+                    production = next(productions)
+                    stack.append([production,
+                                  compiled.production_rhs(production), []])
+                continue
+            stack.pop()
+            nodes = restore(compiled.productions[production], children)
+            if not stack:
+                return nodes[0]
+            stack[-1][2].extend(nodes)
+
+    def __len__(self):
+        """ Return the number of productions applied
+        """
+        return len(self._productions)
+
+    def __eq__(self, other):
+        return (type(self) == type(other) and
+                self._compiled is other._compiled and
+                self._productions == other._productions and
+                self._starts == other._starts)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self._productions, self._starts))
+
+    def __repr__(self):
+        return "Derivation(%s)" % ", ".join(
+            "%s@%d" % (self._compiled.productions[production], start)
+            for production, start in zip(self._productions, self._starts))
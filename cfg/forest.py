@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+#
+# Author: Florent Piétot <florent.pietot@gmail.com>
+
+""" Shared packed parse forests
+    A forest holds every parse of a sentence at once: each node packs all the
+    ways a symbol derives a span of the tokens, and nodes are shared between
+    the parses using them. Trees are only unpacked on demand.
+"""
+
+from bisect import bisect_right
+from cfg.transform import restore
+
+
+class ForestNode(object):
+    """ Every derivation of a ``symbol`` over tokens[start:end]
+    """
+
+    def __init__(self, symbol, start, end):
+        """ Args:
+                symbol: symbol derived by this ``node``
+                start: index of the first token covered by this ``node``
+                end: index following the last token covered by this ``node``
+        """
+        self._symbol = symbol
+        self._start = start
+        self._end = end
+        self._alternatives = []
+        self._count = None
+
+    def symbol(self):
+        return self._symbol
+
+    def start(self):
+        return self._start
+
+    def end(self):
+        return self._end
+
+    def alternatives(self):
+        """ Return the packed alternatives of this ``node``
+            Returns:
+                list of (production, children) where children are
+                ``ForestNode``s or terminals
+        """
+        return self._alternatives
+
+    def add(self, production, children):
+        """ Pack a new alternative in this ``node``
+        """
+        self._alternatives.append((production, tuple(children)))
+        self._count = None
+
+    def count(self):
+        """ Return the number of derivations packed in this ``node``
+            The count is computed once, then cached until an alternative is
+            added.
+        """
+        if self._count is None:
+            self._count = _Counts(self).count(self, _NO_PATH)
+        return self._count
+
+    def __repr__(self):
+        return "(%s, %d, %d)" % (self._symbol, self._start, self._end)
+
+
+class Forest(object):
+    """ Shared packed forest of all the parses of a sentence
+        The forest can be cyclic, e.g. with A -> B | 'x' and B -> A. Its
+        parses are the finite derivations in which no node derives itself:
+        a cycle is cut on each path from the root where it comes back to a
+        node, and the node is kept on every other path.
+    """
+
+    def __init__(self, root):
+        """ Args:
+                root: ``ForestNode`` of the start symbol over all the tokens,
+                    None if the sentence has no parse
+        """
+        self._root = root
+        self._counts = None
+
+    def root(self):
+        return self._root
+
+    def count(self):
+        """ Return the number of parses in this ``forest``
+        """
+        if self._root is None:
+            return 0
+        return self._root_counts().count(self._root, _NO_PATH)
+
+    def trees(self):
+        """ Lazily unpack every parse of this ``forest``
+            Returns:
+                generator of ``Tree``s, in the order of ``tree(k)``
+        """
+        count = self.count()
+        k = 0
+        while k < count:
+            yield _unpack_nth(self._root_counts(), self._root, k)[0]
+            k += 1
+
+    def __iter__(self):
+        return self.trees()
+
+    def tree(self, k):
+        """ Return the k-th parse of this ``forest`` without unpacking the
+            parses before it
+
+            Raises:
+                IndexError if there is no k-th parse
+        """
+        if k < 0 or k >= self.count():
+            raise IndexError("Forest has no parse #%d" % k)
+        return _unpack_nth(self._root_counts(), self._root, k)[0]
+
+    def _root_counts(self):
+        if self._counts is None:
+            self._counts = _Counts(self._root)
+        return self._counts
+
+    def __repr__(self):
+        return "Forest with %d parses rooted at %r" % (self.count(),
+                                                       self._root)
+
+
+# Ancestors of a node on the path from the root, see ``_Counts``
+_NO_PATH = frozenset()
+
+
+class _Counts(object):
+    """ Number of derivations of the nodes of a forest, cycles excluded
+
+        Only the ancestors which are in the same strongly connected component
+        as a node can come back under it: a node is counted once for each
+        set of such ancestors, and once overall outside cycles. The states
+        (node, ancestors) never cycle, since the ancestors only grow within a
+        component.
+    """
+
+    def __init__(self, root):
+        self._components = _cyclic_components(root)
+        # (id of node, ancestors) -> (cumulative counts of the alternatives,
+        # ancestors of the children of each alternative, None if the
+        # alternative goes back to an ancestor)
+        self._memo = {}
+
+    def count(self, node, path):
+        """ Return the number of derivations of ``node`` whose ancestors in
+            its component are ``path``
+        """
+        entry = self._entry(node, path)
+        return entry[0][-1] if entry[0] else 0
+
+    def select(self, node, path, k):
+        """ Return (production, children, digits, child paths) of the k-th
+            derivation of ``node``, digits being the index of the derivation
+            of each child
+        """
+        cumulative, paths = self._entry(node, path)
+        index = bisect_right(cumulative, k)
+        if index:
+            k -= cumulative[index - 1]
+        production, children = node._alternatives[index]
+        child_paths = paths[index]
+        digits = []
+        for child, child_path in zip(reversed(children),
+                                     reversed(child_paths)):
+            if isinstance(child, ForestNode):
+                k, digit = divmod(k, self.count(child, child_path))
+            else:
+                digit = None
+            digits.append(digit)
+        digits.reverse()
+        return production, children, digits, child_paths
+
+    def _entry(self, node, path):
+        """ Return the memoized counts of the state (``node``, ``path``),
+            computing the states it depends on in postorder
+        """
+        memo = self._memo
+        root = (id(node), path)
+        stack = [(node, path)]
+        while root not in memo:
+            node, path = stack[-1]
+            key = (id(node), path)
+            if key in memo:
+                stack.pop()
+                continue
+            paths = [self._child_paths(node, path, children)
+                     for _, children in node._alternatives]
+            pending = [(child, child_path)
+                       for (_, children), child_paths in
+                       zip(node._alternatives, paths)
+                       if child_paths is not None
+                       for child, child_path in zip(children, child_paths)
+                       if isinstance(child, ForestNode) and
+                       (id(child), child_path) not in memo]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            cumulative, total = [], 0
+            for (_, children), child_paths in zip(node._alternatives, paths):
+                if child_paths is not None:
+                    count = 1
+                    for child, child_path in zip(children, child_paths):
+                        if isinstance(child, ForestNode):
+                            counts = memo[(id(child), child_path)][0]
+                            count *= counts[-1] if counts else 0
+                    total += count
+                cumulative.append(total)
+            memo[key] = (cumulative, paths)
+        return memo[root]
+
+    def _child_paths(self, node, path, children):
+        """ Return the ancestors of each of ``children`` of ``node`` in their
+            component, None if one of them is an ancestor of ``node``
+        """
+        component = self._components.get(id(node))
+        if component is None:
+            return [_NO_PATH] * len(children)
+        inner = path | frozenset([id(node)])
+        child_paths = []
+        for child in children:
+            if not isinstance(child, ForestNode) or \
+                    id(child) not in component:
+                child_paths.append(_NO_PATH)
+            elif id(child) in inner:
+                return None
+            else:
+                child_paths.append(inner)
+        return child_paths
+
+
+def _cyclic_components(root):
+    """ Return a dict mapping the id of each node under ``root`` which is on
+        a cycle to the ids of the nodes of its strongly connected component
+        Tarjan's algorithm, with explicit frames of [node, index of the
+        next edge, edges].
+    """
+    index, low, on_stack = {}, {}, set()
+    components = {}
+    nodes = []
+    frames = []
+
+    def visit(node):
+        index[id(node)] = low[id(node)] = len(index)
+        nodes.append(node)
+        on_stack.add(id(node))
+        frames.append([node, 0, [child for _, children in node._alternatives
+                                 for child in children
+                                 if isinstance(child, ForestNode)]])
+
+    visit(root)
+    while frames:
+        frame = frames[-1]
+        node, edge, children = frame
+        if edge < len(children):
+            frame[1] += 1
+            child = children[edge]
+            if id(child) not in index:
+                visit(child)
+            elif id(child) in on_stack:
+                low[id(node)] = min(low[id(node)], index[id(child)])
+            continue
+        frames.pop()
+        if frames:
+            parent = frames[-1][0]
+            low[id(parent)] = min(low[id(parent)], low[id(node)])
+        if low[id(node)] == index[id(node)]:
+            component = []
+            while True:
+                member = nodes.pop()
+                on_stack.discard(id(member))
+                component.append(id(member))
+                if member is node:
+                    break
+            if len(component) > 1 or node in children:
+                component = frozenset(component)
+                for member in component:
+                    components[member] = component
+    return components
+
+
+def _unpack_nth(counts, root, k):
+    """ Return the restored nodes of the k-th derivation packed in ``root``
+        The first child is the most significant digit of ``k`` within an
+        alternative.
+    """
+    # Frames of [production, children, digits, paths of the children,
+    # index of the next child, restored children]
+    stack = [list(counts.select(root, _NO_PATH, k)) + [0, []]]
+    while True:
+        frame = stack[-1]
+        production, children, digits, paths, index, restored = frame
+        if index < len(children):
+            frame[4] += 1
+            child = children[index]
+            if isinstance(child, ForestNode):
+                stack.append(list(counts.select(child, paths[index],
+                                                digits[index])) + [0, []])
+            else:
+                restored.append(child)
+            continue
+        stack.pop()
+        nodes = restore(production, restored)
+        if not stack:
+            return nodes
+        stack[-1][5].extend(nodes)
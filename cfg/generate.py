@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+#
+# Author: Florent Piétot <florent.pietot@gmail.com>
+
+""" Generate random sentences from a grammar
+
+    For every nonterminal and every length up to a maximum, the number of
+    derivations of that length is counted once. Sentences are then drawn
+    uniformly among the derivations of a requested length: each production
+    and each split of the length among the symbols of a right-hand side is
+    picked with the share of the derivations going through it, up to the
+    precision of floats.
+
+    Usage:
+        python -m cfg.generate grammar.txt --length 10 --count 1000000
+"""
+
+import argparse
+import random
+import sys
+from bisect import bisect_right
+from cfg.cache import load_grammar
+
+# Number of sentences written at once
+CHUNK_SIZE = 4096
+
+
+class SentenceGenerator(object):
+    """ Draw sentences of a given length uniformly among the derivations of
+        a grammar
+    """
+
+    def __init__(self, grammar, max_length, seed=None):
+        """ Args:
+                grammar: a ``Grammar``
+                max_length: maximum length of the sentences to generate
+                seed: seed of the random draws, None for an unseeded one
+            Raises:
+                ValueError if a nonterminal has infinitely many derivations
+                of a length, e.g. through a cycle of unit productions
+        """
+        self._compiled = compiled = grammar.compile()
+        self._max_length = max_length
+        self._rng = random.Random(seed)
+        self._words = [symbol[1:-1] if terminal else None
+                       for symbol, terminal in zip(compiled.symbols,
+                                                   compiled.terminal)]
+        self._rhs = [tuple(compiled.production_rhs(production))
+                     for production in range(len(compiled))]
+        # Choices made while sampling, keyed by symbol or position in the
+        # right-hand side array, times the number of lengths, plus a length
+        self._production_choices = {}
+        self._split_choices = {}
+        self._count()
+
+    def _count(self):
+        """ Count the derivations of every nonterminal and of every suffix
+            of every right-hand side, for each length up to the maximum:
+            counts[symbol][length] and suffixes[production][i][length] are
+            numbers of derivations, as exact ints.
+        """
+        compiled = self._compiled
+        terminal = compiled.terminal
+        size = self._max_length + 1
+        counts = [None if terminal[symbol] else [0] * size
+                  for symbol in range(len(compiled.symbols))]
+        suffixes = []
+        # Productions made of terminals only derive a single sentence:
+        # only the others are counted length after length
+        derived = []
+        for production in range(len(compiled)):
+            rhs = compiled.production_rhs(production)
+            suffixes.append([[0] * size for _ in range(len(rhs))] +
+                            [[1] + [0] * (size - 1)])
+            if all(terminal[symbol] for symbol in rhs):
+                for i in range(len(rhs)):
+                    if len(rhs) - i < size:
+                        suffixes[production][i][len(rhs) - i] = 1
+                if len(rhs) < size:
+                    counts[compiled.lhs[production]][len(rhs)] += 1
+            else:
+                derived.append(production)
+
+        for length in range(size):
+            # Counts of a length can depend on counts of the same length
+            # through unit productions or nullable symbols: iterate until
+            # they stop changing, which they never do around a cycle
+            for _ in range(len(compiled.lhs_index) + 2):
+                changed = False
+                for production in derived:
+                    rhs = compiled.production_rhs(production)
+                    tables = suffixes[production]
+                    for i in range(len(rhs) - 1, -1, -1):
+                        rest = tables[i + 1]
+                        if terminal[rhs[i]]:
+                            value = rest[length - 1] if length else 0
+                        else:
+                            symbol_counts = counts[rhs[i]]
+                            value = sum(symbol_counts[a] * rest[length - a]
+                                        for a in range(length + 1)
+                                        if symbol_counts[a])
+                        tables[i][length], previous = value, \
+                            tables[i][length]
+                    if tables[0][length] != previous:
+                        counts[compiled.lhs[production]][length] += \
+                            tables[0][length] - previous
+                        changed = True
+                if not changed:
+                    break
+            else:
+                raise ValueError("Infinitely many derivations of length %d"
+                                 % length)
+        self._counts = counts
+        self._suffixes = suffixes
+
+    def count(self, length, symbol=None):
+        """ Return the number of derivations of ``length`` tokens of
+            ``symbol``, the start symbol by default
+        """
+        if length > self._max_length:
+            raise ValueError("Lengths are counted up to %d" %
+                             self._max_length)
+        compiled = self._compiled
+        symbol_id = compiled.start if symbol is None else \
+            compiled.symbol_id(symbol)
+        if symbol_id is None or compiled.terminal[symbol_id]:
+            return 0
+        return self._counts[symbol_id][length]
+
+    def sample(self, length):
+        """ Return a sentence of ``length`` tokens, as a list of words,
+            drawn uniformly among the derivations of that length
+
+            Raises:
+                ValueError if the grammar derives no sentence of ``length``
+                tokens
+        """
+        if self.count(length) == 0:
+            raise ValueError("Grammar derives no sentence of %d words" %
+                             length)
+        compiled = self._compiled
+        terminal, words = compiled.terminal, self._words
+        rhs_of, offsets = self._rhs, compiled.rhs_offsets
+        stride = self._max_length + 1
+        productions, splits = self._production_choices, self._split_choices
+        random = self._rng.random
+        sentence = []
+        stack = [(compiled.start, length)]
+        while stack:
+            symbol, size = stack.pop()
+            if terminal[symbol]:
+                sentence.append(words[symbol])
+                continue
+            key = symbol * stride + size
+            choice = productions.get(key)
+            if choice is None:
+                choice = productions[key] = self._production_weights(symbol,
+                                                                     size)
+            cumulative, options = choice
+            production = options[0] if cumulative is None else \
+                options[bisect_right(cumulative, random())]
+            rhs = rhs_of[production]
+            if len(rhs) == 1:
+                stack.append((rhs[0], size))
+                continue
+            children = []
+            position = offsets[production]
+            for symbol in rhs:
+                key = position * stride + size
+                choice = splits.get(key)
+                if choice is None:
+                    choice = splits[key] = self._split_weights(position,
+                                                               size)
+                cumulative, options = choice
+                part = options[0] if cumulative is None else \
+                    options[bisect_right(cumulative, random())]
+                children.append((symbol, part))
+                size -= part
+                position += 1
+            children.reverse()
+            stack.extend(children)
+        return sentence
+
+    def sentences(self, length, count):
+        """ Generate ``count`` sentences of ``length`` tokens, as strings
+        """
+        sample = self.sample
+        for _ in range(count):
+            yield " ".join(sample(length))
+
+    def _production_weights(self, symbol, size):
+        """ Return the choice of the production of ``symbol`` deriving
+            ``size`` tokens, see ``_choice``
+        """
+        compiled = self._compiled
+        weights = []
+        for production in compiled.lhs_index.get(symbol, ()):
+            weights.append((self._suffixes[production][0][size], production))
+        return _choice(weights)
+
+    def _split_weights(self, position, size):
+        """ Return the choice of the number of tokens derived by the symbol
+            at ``position`` in the right-hand side array, given the ``size``
+            tokens left for the rest of its right-hand side, see ``_choice``
+        """
+        compiled = self._compiled
+        production = bisect_right(compiled.rhs_offsets, position) - 1
+        i = position - compiled.rhs_offsets[production]
+        symbol = compiled.rhs[position]
+        rest = self._suffixes[production][i + 1]
+        if compiled.terminal[symbol]:
+            return _choice([(rest[size - 1], 1)])
+        counts = self._counts[symbol]
+        return _choice([(counts[part] * rest[size - part], part)
+                        for part in range(size + 1)])
+
+
+def _choice(weights):
+    """ Return (cumulative probabilities, options) of (weight, option)
+        pairs, dropping the options of weight 0
+        Cumulative probabilities are None when there is a single option: it
+        is taken without drawing anything.
+    """
+    options = [option for weight, option in weights if weight]
+    if len(options) == 1:
+        return (None, options)
+    total = sum(weight for weight, _ in weights)
+    cumulative = []
+    partial = 0
+    for weight, _ in weights:
+        if weight:
+            partial += weight
+            cumulative.append(partial / total)
+    # Draws are in [0, 1[: rounding must not leave the last option out
+    cumulative[-1] = 1.0
+    return (cumulative, options)
+
+
+def write_sentences(generator, lengths, count, output):
+    """ Write ``count`` sentences of each of ``lengths`` to ``output``, one
+        per line, in chunks of ``CHUNK_SIZE`` lines
+    """
+    for length in lengths:
+        left = count
+        while left > 0:
+            chunk = min(left, CHUNK_SIZE)
+            output.write("\n".join(generator.sentences(length, chunk)))
+            output.write("\n")
+            left -= chunk
+
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(
+        description="Generate random sentences from a grammar")
+    arguments.add_argument("grammar", help="grammar file")
+    arguments.add_argument("-l", "--length", type=int, nargs="+",
+                           required=True,
+                           help="number of words of the sentences")
+    arguments.add_argument("-n", "--count", type=int, default=1,
+                           help="number of sentences of each length")
+    arguments.add_argument("-o", "--output", default="-",
+                           help="output file, - or nothing for stdout")
+    arguments.add_argument("--seed", type=int, default=None)
+    arguments.add_argument("--no-cache", dest="cache", action="store_false",
+                           help="don't read or write the compiled grammar "
+                           "cache")
+    options = arguments.parse_args(argv)
+
+    grammar = load_grammar(options.grammar, cache=options.cache)
+    generator = SentenceGenerator(grammar, max(options.length),
+                                  seed=options.seed)
+    output = sys.stdout if options.output == "-" else open(options.output,
+                                                           "w")
+    try:
+        write_sentences(generator, options.length, options.count, output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,20 +9,27 @@
     grammar.
 """
 
+import heapq
 import re
+from array import array
+from math import isnan
+from itertools import compress
+from operator import itemgetter
 
 _NONTERMINAL_RE = re.compile(r'([\w][\w]*) \s*', re.VERBOSE)
 _ARROW_RE = re.compile(r'\s* -> \s*', re.VERBOSE)
 _DISJUNCTION_RE = re.compile(r'\| \s*', re.VERBOSE)
 _TERMINAL_RE = re.compile(r'(\'\w+\') \s*', re.VERBOSE)
+_PROBABILITY_RE = re.compile(r'\[ \s* ([^\]\s]+) \s* \] \s*', re.VERBOSE)
 
 
 class Production(object):
     # TODO: docstring for this
 
-    def __init__(self, lhs, rhs):
+    def __init__(self, lhs, rhs, prob=None):
         self._lhs = lhs
         self._rhs = tuple(rhs)
+        self._prob = prob
 
     def lhs(self):
         """ Return the left hand side of this ```production```
@@ -40,11 +47,20 @@ class Production(object):
         """
         return self._rhs
 
+    def prob(self):
+        """ Return the probability of this ```production```, None if it
+            wasn't given one
+            Probabilities don't take part in the equality of productions.
+        """
+        return self._prob
+
     def __str__(self):
         """ Return a representation of this ``Production``as a string
         """
         string = "%s -> " % self._lhs
         string += " ".join(el for el in self._rhs)
+        if self._prob is not None:
+            string += " [%s]" % self._prob
         return string
 
     def __repr__(self):
@@ -65,10 +81,20 @@ class Production(object):
         """
         return not self == other
 
+    def __hash__(self):
+        """ Hash consistently with ``__eq__`` so productions can be used as
+            dictionary keys
+        """
+        return hash((self._lhs, self._rhs))
+
     @staticmethod
     def parse_production(line):
         """ Parse a grammar rule, given as a string
             and returns a list of production
+            Each alternative can end with its probability between brackets,
+            e.g. NP -> D N [0.4] | N [0.6]
+        Raises:
+            ValueError if a probability is not a number in ]0, 1]
         """
         pos = 0
         line = line.strip()
@@ -81,6 +107,7 @@ class Production(object):
         pos = m.end()
 
         rhsides = [[]]
+        probs = [None]
 
         while pos < len(line):
             # Terminal
@@ -93,6 +120,16 @@ class Production(object):
             elif line[pos] == '|':
                 m = _DISJUNCTION_RE.match(line, pos)
                 rhsides.append([])
+                probs.append(None)
+                pos = m.end()
+            # Probability of the current rhside
+            elif line[pos] == '[':
+                m = _PROBABILITY_RE.match(line, pos)
+                if m is None or probs[-1] is not None:
+                    raise ValueError("Invalid probability: %s" % line)
+                probs[-1] = float(m.group(1))
+                if not 0 < probs[-1] <= 1:
+                    raise ValueError("Probability out of ]0, 1]: %s" % line)
                 pos = m.end()
             # Non-terminal
             else:
@@ -100,7 +137,8 @@ class Production(object):
                 pos = m.end()
                 # TODO: the strip() is not elegant, fix if possible
                 rhsides[-1].append(m.group().strip())
-        return [Production(lhs, rhs) for rhs in rhsides]
+        return [Production(lhs, rhs, prob)
+                for rhs, prob in zip(rhsides, probs)]
 
 
 class Grammar(object):
@@ -116,10 +154,12 @@ class Grammar(object):
                 list(Production)
         """
         self._start = start
-        self._productions = productions
+        self._productions = list(productions)
         self._lhs_index = self._calculate_lhs_index()
+        # Immutable views of the index, built on demand
+        self._lhs_tuples = {}
+        self._compiled = None
 
-    # TODO: maybe remove this?
     def _calculate_lhs_index(self):
         """ Index ``productions`` of this ``grammar`` on lhs
             Example:
@@ -142,9 +182,10 @@ class Grammar(object):
     def __str__(self):
         """ Returns a verbose representation of this ``grammar`` as a string
         """
+        productions = self.productions()
         string = ("Grammar starting with: \"%s\"\n%d productions:" %
-                  (self._start, len(self._productions)))
-        for production in self._productions:
+                  (self._start, len(productions)))
+        for production in productions:
             string += '\n%s' % production
         return string
 
@@ -152,18 +193,104 @@ class Grammar(object):
         """ Returns a concise representation of this ``grammar`` as a string
         """
         return ("Grammar with %d productions starting with \"%s\"" %
-                (len(self._productions), self._start))
+                (len(self.productions()), self._start))
+
+    def compile(self):
+        """ Return the compiled form of this ``grammar`` used by the parsers
+            It is computed once, then cached.
+        """
+        if self._compiled is None:
+            self._compiled = CompiledGrammar(self)
+        return self._compiled
+
+    def nullable(self):
+        """ Return the set of nonterminals of this ``grammar`` deriving the
+            empty string
+        """
+        compiled = self.compile().analyze()
+        return set(symbol for symbol, nullable in
+                   zip(compiled.symbols, compiled.nullable) if nullable)
+
+    def first(self, symbol):
+        """ Return the set of terminals that can start a derivation of
+            ``symbol``
+        """
+        compiled = self.compile().analyze()
+        symbol_id = compiled.symbol_id(symbol)
+        if symbol_id is None:
+            return set()
+        return set(compiled.symbols[terminal] for terminal in
+                   compiled.first[symbol_id])
+
+    def min_yield(self, symbol):
+        """ Return the minimum number of tokens derived by ``symbol``,
+            ``float('inf')`` if it can't derive any sentence
+        """
+        compiled = self.compile().analyze()
+        symbol_id = compiled.symbol_id(symbol)
+        if symbol_id is None:
+            return float('inf')
+        return compiled.min_yield[symbol_id]
 
     def productions(self, lhs=None):
         """ Return this ``Grammar`` production filtered by the left-hand side
             Params
-                lhs: array of left-hand sides productions
+                lhs: left-hand side of the productions
+            Returns:
+                all the productions if ``lhs`` is None, otherwise a tuple of
+                the productions of ``lhs`` served from the index
         """
+        if self._productions is None and not lhs:
+            self._productions = list(self._compiled.productions)
+            self._lhs_index = self._calculate_lhs_index()
         if not lhs:
             return self._productions
 
-        # Filter on left-hand side
-        return list(filter(lambda x: lhs == x._lhs, self._productions))
+        productions = self._lhs_tuples.get(lhs)
+        if productions is None:
+            if self._lhs_index is None:
+                productions = self._compiled_productions(lhs)
+            else:
+                productions = tuple(self._lhs_index.get(lhs, ()))
+            if productions:
+                self._lhs_tuples[lhs] = productions
+        return productions
+
+    def _compiled_productions(self, lhs):
+        """ Return the productions of ``lhs`` from the compiled form of this
+            ``grammar``, for grammars loaded in compiled form
+        """
+        compiled = self._compiled
+        return tuple(compiled.productions[production] for production in
+                     compiled.lhs_index.get(compiled.symbol_id(lhs), ()))
+
+    def lexicon(self, word):
+        """ Return the preterminal productions producing ``word``
+            Params
+                word: a word, without quotes
+            Returns:
+                tuple of productions such as N -> 'fall', served from the
+                lexicon index of the compiled grammar
+        """
+        compiled = self.compile()
+        return tuple(compiled.productions[production] for production in
+                     compiled.lexicon.get(compiled.word_id(word), ()))
+
+    def add_productions(self, productions):
+        """ Add ``productions`` to this ``grammar``
+            The index and the compiled form are updated incrementally: only
+            the left-hand sides of the new productions are touched.
+        """
+        self.productions()
+        for production in productions:
+            self._productions.append(production)
+            lhs = production.lhs()
+            if lhs not in self._lhs_index:
+                self._lhs_index[lhs] = []
+            self._lhs_index[lhs].append(production)
+            self._lhs_tuples.pop(lhs, None)
+            if self._compiled is not None:
+                self._compiled.add_production(production)
 
     @staticmethod
     def parse_grammar(input):
@@ -176,7 +303,20 @@ class Grammar(object):
             TypeError if input is not a string
         """
         assert isinstance(input, str), "Input should be a string"
-        lines = input.split('\n')
+        return Grammar.parse_lines(input.split('\n'))
+
+    @staticmethod
+    def parse_lines(lines):
+        """ Read a grammar given as an iterable of lines, such as a file
+            Lines are consumed one at a time, so the whole grammar text is
+            never held in memory.
+        Args:
+            lines: iterable of strings
+        Returns:
+            a `Grammar`
+        Raises:
+            ValueError if a line is not a valid production
+        """
         productions = []
         start = None
         for linenum, line in enumerate(lines):
@@ -193,5 +333,344 @@ class Grammar(object):
                                                                  line))
         return Grammar(start, productions)
 
+    @staticmethod
+    def from_compiled(compiled):
+        """ Return the ``Grammar`` of ``compiled``, which it keeps as its
+            compiled form
+        """
+        grammar = Grammar(None if compiled.start is None else
+                          compiled.symbols[compiled.start], [])
+        # Productions are only listed and indexed by lhs if asked for
+        grammar._productions = None
+        grammar._lhs_index = None
+        grammar._compiled = compiled
+        return grammar
+
+
+class CompiledGrammar(object):
+    """ Compact form of a ``Grammar`` used by the parsers
+
+        Symbols are interned to dense integers and productions are packed in
+        flat arrays, so that parsers only compare integers:
+            symbols: list of symbols, indexed by symbol id
+            terminal: bytearray flagging terminal symbol ids
+            start: symbol id of the start of the grammar, None if it has no
+                productions
+            lhs: array of the left-hand side symbol id of each production
+            rhs_offsets: array such as the right-hand side of production p is
+                rhs[rhs_offsets[p]:rhs_offsets[p + 1]]
+            rhs: array of the right-hand side symbol ids of all productions
+            productions: sequence of the original ``Production``s, indexed
+                by production id
+            probs: array of the probability of each production, NaN for
+                productions without one
+            lhs_index: dict mapping a left-hand side symbol id to the list of
+                its production ids
+            lexicon: dict mapping a terminal id to the list of the ids of the
+                preterminal productions producing it, e.g. N -> 'fall'
+
+        Once ``analyze()`` has been called, these are also available:
+            nullable: bytearray flagging symbol ids deriving the empty string
+            first: list of the set of terminal ids that can start each
+                symbol id, as frozensets or read-only sets of a cache file
+            min_yield: list of the minimum number of tokens derived by each
+                symbol id, ``float('inf')`` for unproductive ones
+            production_nullable, production_first, production_min_yield:
+                same for the right-hand side of each production id
+            preterminal: bytearray flagging nonterminal ids whose productions
+                are all preterminal, so that the lexicon gives the ones
+                matching a word
+    """
+
+    def __init__(self, grammar):
+        """ Compile ``grammar``
+        """
+        self.symbols = []
+        self.terminal = bytearray()
+        self._ids = {}
+        # Words map to the id of their terminal symbol
+        self._words = {}
+        # A grammar without productions has no start symbol
+        self.start = None if grammar.start() is None else \
+            self._intern(grammar.start())
+        self.lhs = array('i')
+        self.rhs_offsets = array('i', [0])
+        self.rhs = array('i')
+        self.probs = array('d')
+        self.productions = _Productions(self)
+        self.lhs_index = {}
+        self.lexicon = {}
+        self._analyzed = False
+        for production in grammar.productions():
+            self.add_production(production)
+
+    @staticmethod
+    def from_arrays(symbols, terminal, start, lhs, rhs_offsets, rhs, probs,
+                    lhs_index, lexicon, analysis=None):
+        """ Rebuild a compiled grammar from its symbols, arrays and indexes,
+            e.g. as read back from a cache file
+            Nothing is done per production: their ``Production`` objects are
+            only built when first accessed.
+            Args:
+                analysis: tables of a previous ``analyze()``, as (nullable,
+                    first, min_yield, production_nullable, production_first,
+                    production_min_yield, preterminal), None to compute them
+                    on demand
+        """
+        compiled = CompiledGrammar.__new__(CompiledGrammar)
+        compiled.symbols = symbols
+        compiled.terminal = terminal
+        compiled._ids = dict(zip(symbols, range(len(symbols))))
+        compiled._words = dict(zip(
+            map(_unquote, compress(symbols, terminal)),
+            compress(range(len(symbols)), terminal)))
+        compiled.start = start
+        compiled.lhs = lhs
+        compiled.rhs_offsets = rhs_offsets
+        compiled.rhs = rhs
+        compiled.probs = probs
+        compiled.productions = _Productions(compiled, len(lhs))
+        compiled.lhs_index = lhs_index
+        compiled.lexicon = lexicon
+        compiled._analyzed = analysis is not None
+        if analysis is not None:
+            (compiled.nullable, compiled.first, compiled.min_yield,
+             compiled.production_nullable, compiled.production_first,
+             compiled.production_min_yield, compiled.preterminal) = analysis
+        return compiled
+
+    def _intern(self, symbol):
+        if symbol not in self._ids:
+            symbol_id = len(self.symbols)
+            self._ids[symbol] = symbol_id
+            self.symbols.append(symbol)
+            self.terminal.append(is_terminal(symbol))
+            if self.terminal[symbol_id]:
+                self._words[_unquote(symbol)] = symbol_id
+        return self._ids[symbol]
+
+    def add_production(self, production):
+        """ Append ``production`` to this compiled grammar
+            Returns:
+                the id of ``production``
+        """
+        production_id = len(self.lhs)
+        lhs = self._intern(production.lhs())
+        self.productions.append(production)
+        self.lhs.append(lhs)
+        self.rhs.extend(self._intern(symbol) for symbol in production.rhs())
+        self.rhs_offsets.append(len(self.rhs))
+        self.probs.append(_NO_PROB if production.prob() is None
+                          else production.prob())
+        if lhs not in self.lhs_index:
+            self.lhs_index[lhs] = []
+        self.lhs_index[lhs].append(production_id)
+        if len(self.rhs) - self.rhs_offsets[-2] == 1 and \
+                self.terminal[self.rhs[-1]]:
+            if self.rhs[-1] not in self.lexicon:
+                self.lexicon[self.rhs[-1]] = []
+            self.lexicon[self.rhs[-1]].append(production_id)
+        self._analyzed = False
+        return production_id
+
+    def analyze(self):
+        """ Compute the nullable symbols, FIRST sets and minimum yields of
+            this compiled grammar, unless they are up to date
+            Each table is filled from a worklist of the symbols whose value
+            changed, following the productions using them on their
+            right-hand side, rather than by scanning every production until
+            nothing changes.
+            Returns:
+                this ``CompiledGrammar``
+        """
+        if self._analyzed:
+            return self
+        productions = range(len(self.lhs))
+        rhs = [self.production_rhs(p) for p in productions]
+        terminal = self.terminal
+        lhs = self.lhs
+        # Productions using each nonterminal, once per occurrence
+        uses = {}
+        for p in productions:
+            for symbol in rhs[p]:
+                if not terminal[symbol]:
+                    uses.setdefault(symbol, []).append(p)
+
+        # Nullable: count down the symbols of each right-hand side not yet
+        # known to be nullable
+        nullable = bytearray(len(self.symbols))
+        non_nullable = list(map(len, rhs))
+        stack = []
+        for p in productions:
+            if not non_nullable[p] and not nullable[lhs[p]]:
+                nullable[lhs[p]] = 1
+                stack.append(lhs[p])
+        while stack:
+            for p in uses.get(stack.pop(), ()):
+                non_nullable[p] -= 1
+                if not non_nullable[p] and not nullable[lhs[p]]:
+                    nullable[lhs[p]] = 1
+                    stack.append(lhs[p])
+
+        # FIRST sets: start from the terminals beginning the productions,
+        # then pass the terminals added to a nonterminal on to the
+        # left-hand sides it can start
+        first = dict((symbol, set()) for symbol in self.lhs_index)
+        starts = {}
+        for p in productions:
+            for symbol in rhs[p]:
+                if terminal[symbol]:
+                    first[lhs[p]].add(symbol)
+                elif symbol != lhs[p]:
+                    starts.setdefault(symbol, set()).add(lhs[p])
+                if not nullable[symbol]:
+                    break
+        added = dict((symbol, set(first[symbol])) for symbol in starts
+                     if first.get(symbol))
+        while added:
+            symbol, terminals = added.popitem()
+            for parent in starts.get(symbol, ()):
+                new = terminals - first[parent]
+                if new:
+                    first[parent] |= new
+                    if parent in added:
+                        added[parent] |= new
+                    else:
+                        added[parent] = new
+
+        # Minimum yields, smallest first: a symbol is settled by the
+        # shortest of its productions whose symbols are all settled
+        min_yield = [1 if terminal[symbol] else float('inf')
+                     for symbol in range(len(self.symbols))]
+        settled = bytearray(terminal)
+        remaining = [sum(1 for symbol in symbols if not terminal[symbol])
+                     for symbols in rhs]
+        heap = [(sum(min_yield[symbol] for symbol in rhs[p]), lhs[p])
+                for p in productions if not remaining[p]]
+        heapq.heapify(heap)
+        while heap:
+            length, symbol = heapq.heappop(heap)
+            if settled[symbol]:
+                continue
+            settled[symbol] = 1
+            min_yield[symbol] = length
+            for p in uses.get(symbol, ()):
+                remaining[p] -= 1
+                if not remaining[p] and not settled[lhs[p]]:
+                    heapq.heappush(heap, (sum(min_yield[child] for child in
+                                              rhs[p]), lhs[p]))
+
+        self.nullable = nullable
+        self.first = [frozenset((symbol, )) if terminal[symbol] else
+                      frozenset(first.get(symbol, ())) for symbol in
+                      range(len(self.symbols))]
+        self.min_yield = min_yield
+        self.production_nullable = bytearray(not count for count in
+                                             non_nullable)
+        self.production_first = []
+        for p in productions:
+            if rhs[p] and not nullable[rhs[p][0]]:
+                # Most productions start with a single symbol's FIRST set
+                self.production_first.append(self.first[rhs[p][0]])
+                continue
+            symbols = set()
+            for symbol in rhs[p]:
+                symbols |= self.first[symbol]
+                if not nullable[symbol]:
+                    break
+            self.production_first.append(frozenset(symbols))
+        self.production_min_yield = [sum(min_yield[symbol] for symbol in
+                                         rhs[p]) for p in productions]
+        self.preterminal = bytearray(len(self.symbols))
+        for symbol, symbol_productions in self.lhs_index.items():
+            self.preterminal[symbol] = all(
+                len(rhs[p]) == 1 and terminal[rhs[p][0]]
+                for p in symbol_productions)
+        self._analyzed = True
+        return self
+
+    def symbol_id(self, symbol):
+        """ Return the id of ``symbol``, None if it isn't in the grammar
+        """
+        return self._ids.get(symbol)
+
+    def production_rhs(self, production):
+        """ Return the right-hand side symbol ids of production id
+            ``production``
+        """
+        return self.rhs[self.rhs_offsets[production]:
+                        self.rhs_offsets[production + 1]]
+
+    def word_id(self, word):
+        """ Return the terminal symbol id of ``word``, -1 if it is unknown to
+            the grammar
+        """
+        return self._words.get(word, -1)
+
+    def token_ids(self, tokens):
+        """ Return the terminal symbol id matching each word of ``tokens``,
+            -1 for words unknown to the grammar
+        """
+        return [self._words.get(token, -1) for token in tokens]
+
+    def __len__(self):
+        """ Return the number of productions
+        """
+        return len(self.lhs)
+
+
+class _Productions(object):
+    """ ``Production``s of a ``CompiledGrammar``, indexed by production id
+        Productions restored from arrays are only built when first accessed.
+    """
+
+    def __init__(self, compiled, size=0):
+        self._compiled = compiled
+        self._productions = [None] * size
+
+    def __getitem__(self, production_id):
+        production = self._productions[production_id]
+        if production is None:
+            compiled = self._compiled
+            symbols = compiled.symbols
+            production = Production(
+                symbols[compiled.lhs[production_id]],
+                [symbols[symbol] for symbol in
+                 compiled.production_rhs(production_id)],
+                _prob(compiled.probs[production_id]))
+            self._productions[production_id] = production
+        return production
+
+    def __len__(self):
+        return len(self._productions)
+
+    def __iter__(self):
+        for production_id in range(len(self._productions)):
+            yield self[production_id]
+
+    def built(self):
+        """ Return the ``Production``s built so far
+            The others are restored from arrays: none of them comes from a
+            grammar transformation.
+        """
+        return [production for production in self._productions
+                if production is not None]
+
+    def append(self, production):
+        self._productions.append(production)
+
 
 # Helpers
+_unquote = itemgetter(slice(1, -1))
+_NO_PROB = float('nan')
+
+
+def _prob(value):
+    return None if isnan(value) else value
+
+
+def is_terminal(symbol):
+    """ Return True if ``symbol`` is a terminal, i.e. a quoted word such as
+        "'fall'"
+    """
+    return len(symbol) > 1 and symbol[0] in "\'\"" and symbol[-1] == symbol[0]
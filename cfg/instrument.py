@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+#
+# Author: Florent Piétot <florent.pietot@gmail.com>
+
+""" Statistics on the search of a ``TopDownParser``
+
+    Give an ``Instrumentation`` to a parser to find out what its searches
+    spend their time on:
+
+        instrument = Instrumentation()
+        parser = TopDownParser(grammar, instrument=instrument)
+        list(parser.parse(tokens))
+        print(instrument.report())
+
+    Parsers without an instrumentation run their search untouched: the
+    instrumented steps are only swapped in when one is given.
+"""
+
+from collections import OrderedDict
+
+# Events passed to callbacks, along with the symbol and the token position:
+#   expand: a nonterminal is about to be expanded
+#   match: a terminal matched the token at position
+#   fail: a terminal didn't match the token at position
+EVENTS = ("expand", "match", "fail")
+
+
+class Instrumentation(object):
+    """ Counters, timings and event callbacks of the searches of a parser
+
+        Counters, accumulated over all the parses until ``reset()``:
+            expansions: number of nonterminals expanded
+            matches: number of terminals matched with a token
+            failed_matches: number of terminals which didn't match a token
+            tree_copies: number of partial trees copied to apply a
+                production
+            max_frontier: largest number of nodes waiting to be expanded or
+                matched
+            symbol_expansions: dict mapping each nonterminal to its number of
+                expansions
+            symbol_time: dict mapping each nonterminal to the number of
+                seconds spent searching below its expansions. Like
+                cumulative times of profilers, the time of a symbol includes
+                the time of the symbols below it, but recursive expansions
+                of a symbol are only counted once.
+    """
+
+    def __init__(self, callback=None, timing=True):
+        """ Args:
+                callback: function called as callback(event, symbol,
+                    position) at every event of ``EVENTS``, None for none
+                timing: whether to time the expansions of each nonterminal
+        """
+        self.callback = callback
+        self.timing = timing
+        self.reset()
+
+    def reset(self):
+        """ Reset all counters and timings
+        """
+        self.expansions = 0
+        self.matches = 0
+        self.failed_matches = 0
+        self.tree_copies = 0
+        self.max_frontier = 0
+        self.symbol_expansions = {}
+        self.symbol_time = {}
+
+    def counters(self):
+        """ Return the global counters as a dict
+        """
+        return OrderedDict([("expansions", self.expansions),
+                            ("matches", self.matches),
+                            ("failed_matches", self.failed_matches),
+                            ("tree_copies", self.tree_copies),
+                            ("max_frontier", self.max_frontier)])
+
+    def report(self, limit=10):
+        """ Return the counters and the ``limit`` nonterminals taking the
+            most time, or expanded the most if not timed, as a string
+        """
+        lines = ["%s: %d" % item for item in self.counters().items()]
+        key = self.symbol_time if self.timing else self.symbol_expansions
+        symbols = sorted(self.symbol_expansions, key=lambda symbol:
+                         key.get(symbol, 0), reverse=True)[:limit]
+        for symbol in symbols:
+            line = "%-20s %10d expansions" % (symbol,
+                                             self.symbol_expansions[symbol])
+            if self.timing:
+                line += " %10.4fs" % self.symbol_time.get(symbol, 0.0)
+            lines.append(line)
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return "Instrumentation(%s)" % ", ".join(
+            "%s=%d" % item for item in self.counters().items())
+
+
+def print_event(event, symbol, position):
+    """ Callback printing every event, as used by verbose parsers
+    """
+    print("%s %s at %d" % (event, symbol, position))
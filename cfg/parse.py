@@ -5,21 +5,210 @@
 """ Parse sentences using trees
 """
 
-from cfg.tree import Tree, tree_from_production
+import heapq
+import math
+import random
+import sys
+import time
+from array import array
+from collections import OrderedDict, namedtuple
+from operator import itemgetter
+from cfg.tree import Tree, PersistentTree
 from cfg.tokenize import tokenize
+from cfg.transform import (DerivedProduction, chomsky_normal_form,
+                           with_probabilities, restore)
+from cfg.forest import Forest, ForestNode
+from cfg.derivation import Derivation
+from cfg.batch import parse_many
+from cfg.instrument import Instrumentation, print_event
 
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize',
+                                     'currsize'])
 
-class TopDownParser(object):
+# Result of a bounded parse:
+#   status: "complete" if every parse was found, "truncated" if a limit
+#       stopped the search first
+#   trees: parses found, as ``Tree``s
+#   reason: limit which stopped the search, None if complete
+ParseResult = namedtuple('ParseResult', ['status', 'trees', 'reason'])
 
-    def __init__(self, grammar, verbose=0):
+# Parse of a probabilistic parser with the natural logarithm of its
+# probability
+ScoredParse = namedtuple('ScoredParse', ['tree', 'logprob'])
+
+# Estimated sizes of a tree node, a frontier link and a search state, used
+# to bound the memory of partial trees
+_NODE_BYTES = sys.getsizeof(PersistentTree(0, (0, 0))) + \
+    sys.getsizeof((0, 0))
+_LINK_BYTES = sys.getsizeof(((), 0, None))
+_STATE_BYTES = sys.getsizeof((0, None, None, 0, 0))
+
+
+class Parser(object):
+    """ Base class of the parsers
+        Parsers define ``parse(tokens)``, returning a generator of (tree,
+        frontier), and ``parse_forest(tokens)``, returning a ``Forest``.
+    """
+
+    def grammar(self):
+        return self._grammar
+
+    def recognize(self, tokens):
+        """ Return True if the grammar of this ``parser`` derives a list of
+            tokens, without building any tree
+
+            Parsers answer with an Earley recognizer over the compiled
+            grammar, which is cheap enough to filter sentences before
+            parsing them. It also answers for grammars a ``TopDownParser``
+            can't search, e.g. left-recursive ones whose recursion may
+            derive no token.
+            Args:
+                tokens: a list of words or a string
+        """
+        tokens = _prepare_tokens(tokens)
+        compiled = self._grammar.compile()
+        recognizer = getattr(self, '_recognizer', None)
+        if recognizer is None or not recognizer.compiles(compiled):
+            recognizer = self._recognizer = _Recognizer(compiled)
+        return recognizer.recognize(compiled.token_ids(tokens))
+
+    def parse_many(self, sentences, workers=1, chunk_size=64, timeout=None,
+                   max_pending=None):
+        """ Parse every sentence of ``sentences``
+
+            Args:
+                sentences: iterable of strings or lists of tokens
+                workers: number of processes. With more than one, this
+                    ``parser`` and its grammar are shipped once to each
+                    worker and sentences are distributed in chunks.
+                chunk_size: number of sentences sent to a worker at once
+                timeout: maximum number of seconds spent on each sentence,
+                    None for no limit
+                max_pending: maximum number of chunks in flight, see
+                    ``cfg.batch.parse_many``
+            Returns:
+                generator of a ``cfg.batch.BatchResult(status, parses,
+                error)`` for each sentence, in the order of ``sentences``
+        """
+        return parse_many(self, sentences, workers=workers,
+                          chunk_size=chunk_size, timeout=timeout,
+                          max_pending=max_pending)
+
+    def parse_bounded(self, tokens, max_results=None, timeout=None,
+                      max_steps=None, max_memory=None):
+        """ Parse a list of tokens within limits
+
+            Args:
+                tokens: a list of words or a string
+                max_results: maximum number of trees returned
+                timeout: maximum number of seconds spent on the search
+                max_steps: maximum number of search steps
+                max_memory: maximum estimated number of bytes of partial
+                    trees
+            Returns:
+                a ``ParseResult(status, trees, reason)``: status is
+                "complete" if every parse was found, "truncated" if the
+                search was stopped by the limit named in reason: one of
+                "max_results", "timeout", "max_steps" or "max_memory"
+
+            Chart parsers only support max_results and timeout, the timeout
+            being checked between two trees.
+        """
+        if max_steps is not None or max_memory is not None:
+            raise ValueError("%s only supports max_results and timeout" %
+                             type(self).__name__)
+        limits = _Limits(timeout=timeout)
+        trees = []
+        for tree, _ in self.parse(tokens):
+            if not limits.check():
+                return ParseResult("truncated", trees, limits.reason)
+            if max_results is not None and len(trees) == max_results:
+                return ParseResult("truncated", trees, "max_results")
+            trees.append(tree)
+        return ParseResult("complete", trees, None)
+
+    def count_parses(self, tokens):
+        """ Return the exact number of parses of a list of tokens
+            They are counted on the packed forest of ``parse_forest``,
+            without building any tree, so that sentences with billions of
+            parses are counted in polynomial time.
+        """
+        return self.parse_forest(tokens).count()
+
+    def nth_parse(self, tokens, k):
+        """ Return the k-th parse of a list of tokens, in the order of
+            ``parse_forest``, without building the parses before it
+
+            Raises:
+                IndexError if there is no k-th parse
+        """
+        return self.parse_forest(tokens).tree(k)
+
+    def sample_parses(self, tokens, m, seed=None):
+        """ Return ``m`` parses of a list of tokens drawn uniformly at
+            random, with replacement, none if there is no parse
+            Args:
+                seed: seed of the random draws, None for an unseeded one
+        """
+        forest = self.parse_forest(tokens)
+        count = forest.count()
+        if count == 0:
+            return []
+        rng = random.Random(seed)
+        return [forest.tree(rng.randrange(count)) for _ in range(m)]
+
+
+class TopDownParser(Parser):
+
+    def __init__(self, grammar, verbose=0, memoize=False, cache_size=None,
+                 iterative=False, max_depth=None, instrument=None):
         """ params:
             grammar: a ``grammar`` object that states rules for the parsing
+            verbose: if 1 or more, print every step of the search
+            memoize: if True, cache the derivations of each (nonterminal,
+                start index) and reuse them across alternatives instead of
+                re-deriving them
+            cache_size: maximum number of cached (nonterminal, start index)
+                entries in memoize mode, least recently used ones being
+                evicted first. None for no limit.
+            iterative: if True, run the same search with an explicit stack
+                instead of nested generators: results are yielded directly
+                and long sentences don't hit the recursion limit
+            max_depth: in iterative mode, maximum number of expansions and
+                matches along a branch of the search, deeper branches being
+                abandoned. None for no limit.
+            instrument: a ``cfg.instrument.Instrumentation`` collecting
+                statistics on the searches. Only the default mode can be
+                instrumented; the iterative mode runs the same search.
         """
+        if memoize and iterative:
+            raise ValueError("memoize and iterative modes are exclusive")
+        if verbose >= 1 and instrument is None:
+            instrument = Instrumentation(callback=print_event, timing=False)
+        if instrument is not None and (memoize or iterative):
+            raise ValueError("Only the default mode can be instrumented")
         self._grammar = grammar
-        self._verbose = verbose
+        self._instrument = instrument
+        self._iterative = iterative
+        self._max_depth = max_depth
+        self._memoize = memoize
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._hits = self._misses = 0
+        self._length = 0
+        self._compile()
+        if instrument is not None:
+            self._instrument_search()
 
-    def grammar(self):
-        return self._grammar
+    def _compile(self):
+        """ Fetch the compiled form of this ``parser``'s grammar
+        """
+        compiled = self._grammar.compile()
+        if getattr(self, '_compiled', None) is not compiled:
+            self._compiled = compiled
+            # Immutable subtrees of each production, shared by all the trees
+            self._subtrees = {}
+            self._labels = None
 
     def parse(self, tokens):
         """ Parse a list of tokens and return the possible tree based on the
@@ -27,45 +216,192 @@ class TopDownParser(object):
             Args:
                 tokens: a string
         """
-        if len(tokens) == 0:
-            raise ValueError("Tokens can't be empy")
-
-        # Tokenize if needed
-        if not isinstance(tokens, list):
-            tokens = tokenize(tokens)
-        root_tree = Tree(self._grammar.start(), [])
+        tokens = _prepare_tokens(tokens)
+        self._compile()
+        tokens = self._compiled.token_ids(tokens)
+        if -1 in tokens:
+            # Unknown words can't be matched: no need to search
+            return iter(())
+        if self._memoize:
+            # Cached derivations are only valid for the same tokens
+            self._cache.clear()
+            self._deriving = set()
+            return self._trees(self._parse_memoized(tokens))
+        if self._iterative:
+            return self._trees(self._parse_iterative(tokens))
+        self._length = len(tokens)
+        root_tree = PersistentTree(self._compiled.start)
         frontier = [()]
-        return self._parse(tokens, root_tree, frontier)
+        return self._trees(self._parse(tokens, root_tree, frontier))
+
+    def parse_bounded(self, tokens, max_results=None, timeout=None,
+                      max_steps=None, max_memory=None):
+        """ Parse a list of tokens within limits, see
+            ``Parser.parse_bounded``
 
-    def _parse(self, tokens, tree, frontier):
+            The search runs with an explicit stack, as in iterative mode,
+            whatever the mode of this ``parser``: it yields the same trees
+            in the same order. A step is an expansion or a match, and the
+            memory is estimated from the nodes copied by the partial trees
+            waiting on the stack. Once max_results trees are found, the
+            result is truncated if any state is left to explore, even if it
+            would lead to no other parse.
+        """
+        tokens = _prepare_tokens(tokens)
+        self._compile()
+        tokens = self._compiled.token_ids(tokens)
+        if -1 in tokens:
+            return ParseResult("complete", [], None)
+        limits = _Limits(timeout, max_steps, max_memory)
+        trees = []
+        for tree, _ in self._trees(self._parse_iterative(tokens, limits)):
+            if max_results is not None and len(trees) == max_results:
+                return ParseResult("truncated", trees, "max_results")
+            trees.append(tree)
+            if max_results is not None and len(trees) == max_results and \
+                    limits.pending:
+                return ParseResult("truncated", trees, "max_results")
+        if limits.reason is not None:
+            return ParseResult("truncated", trees, limits.reason)
+        return ParseResult("complete", trees, None)
+
+    def parse_forest(self, tokens):
+        """ Parse a list of tokens and return all the possible trees packed
+            in a ``Forest``
+            The forest is built by an ``EarleyParser`` on the same grammar:
+            it holds the same trees as ``parse``, in another order.
+        """
+        if getattr(self, '_earley', None) is None:
+            self._earley = EarleyParser(self._grammar)
+        return self._earley.parse_forest(tokens)
+
+    def parse_derivations(self, tokens):
+        """ Parse a list of tokens and return its parses as compact
+            ``Derivation``s, whose ``tree()`` is only built on demand
+
+            The search runs with an explicit stack, as in iterative mode,
+            whatever the mode of this ``parser``, and yields the parses in
+            the same order as ``parse``. It applies productions without
+            copying any tree.
+            Args:
+                tokens: a list of words or a string
+            Returns:
+                generator of ``Derivation``s
+        """
+        tokens = _prepare_tokens(tokens)
+        self._compile()
+        tokens = self._compiled.token_ids(tokens)
+        if -1 in tokens:
+            return iter(())
+        return self._derivations(self._parse_iterative(tokens,
+                                                       derivations=True))
+
+    def _derivations(self, parses):
+        """ Convert the linked lists of productions of ``parses`` to
+            ``Derivation``s
+        """
+        compiled = self._compiled
+        for applied, _ in parses:
+            productions, starts = [], []
+            while applied is not None:
+                production, start, applied = applied
+                productions.append(production)
+                starts.append(start)
+            productions.reverse()
+            starts.reverse()
+            yield Derivation(compiled, productions, starts)
+
+    def cache_info(self):
+        """ Return the statistics of the memoize mode cache, accumulated over
+            all the parses, as a ``CacheInfo(hits, misses, maxsize, currsize)``
+        """
+        return CacheInfo(self._hits, self._misses, self._cache_size,
+                         len(self._cache))
+
+    def _trees(self, parses):
+        """ Convert the ``PersistentTree``s of symbol ids of ``parses`` to
+            ``Tree``s of symbols
+        """
+        labels, derived = self._tree_labels()
+        for tree, frontier in parses:
+            if derived:
+                yield (self._restore(tree), frontier)
+            else:
+                yield (tree.to_tree(labels), frontier)
+
+    def _tree_labels(self):
+        """ Return (labels, derived): the symbol of every label of the
+            ``PersistentTree``s built by the search, and whether the grammar
+            was transformed from another one
+            Expanded nodes are labeled with ~production id, so that trees of
+            a transformed grammar can be restored to the shape of the
+            original one: with the left-hand sides of the productions listed
+            backwards after the symbols, ~production indexes its own.
+        """
+        compiled = self._compiled
+        size = (len(compiled.symbols), len(compiled.lhs))
+        if self._labels is None or self._labels[0] != size:
+            symbols = compiled.symbols
+            labels = symbols + [symbols[lhs] for lhs in reversed(compiled.lhs)]
+            derived = any(isinstance(production, DerivedProduction)
+                          for production in compiled.productions.built())
+            self._labels = (size, labels, derived)
+        return self._labels[1:]
+
+    def _restore(self, tree):
+        """ Convert a ``PersistentTree`` of production labels to a ``Tree``
+            in the shape of the grammar this ``parser``'s grammar was
+            transformed from
+        """
+        compiled = self._compiled
+        # Frames of [tree, restored children]
+        stack = [[tree, []]]
+        while True:
+            node, children = stack[-1]
+            if len(children) < len(node):
+                child = node[len(children)]
+                if isinstance(child, PersistentTree):
+                    stack.append([child, []])
+                else:
+                    children.append(compiled.symbols[child])
+                continue
+            stack.pop()
+            nodes = restore(compiled.productions[~node.node()], children)
+            if not stack:
+                return nodes[0]
+            stack[-1][1].extend(nodes)
+
+    def _parse(self, tokens, tree, frontier, needed=None):
         """ Recursively parse a list of tokens given a starting tree and a
             frontier of "to be expanded" nodes
+            Trees and tokens are made of the symbol ids of the compiled
+            grammar.
             Args:
-                tokens: ``list`` if strings we want to match to a derivation
+                tokens: ``list`` of terminal ids we want to match to a
+                    derivation
                 initial_tree: starting ``tree``
                 frontier: ``list`` of candidates for expansion?
+                needed: minimum number of tokens derived by the frontier,
+                    carried along the search. Computed from the frontier
+                    if None.
         """
-        if self._verbose >= 1:
-            print("Parsing: %s with frontier: %s for tokens: %s" % (tree,
-                                                                    frontier,
-                                                                    tokens))
         if len(tokens) == 0 and len(frontier) == 0:
             # Found a match
             yield (tree, frontier)
         elif len(tokens) == 0 or len(frontier) == 0:
             pass
-        elif isinstance(tree[frontier[0]], Tree):
+        elif isinstance(tree[frontier[0]], (Tree, PersistentTree)):
             # Expand the tree at frontier
             for (new_tree, new_frontier) in self._expand(tokens, tree,
-                                                         frontier):
+                                                         frontier, needed):
                 yield (new_tree, new_frontier)
         else:
             # This is a terminal, we will match it
             for (new_tree, new_frontier) in self._match(tokens, tree,
-                                                        frontier):
+                                                        frontier, needed):
                 yield (new_tree, new_frontier)
 
-    def _match(self, tokens, tree, frontier):
+    def _match(self, tokens, tree, frontier, needed=None):
         """ Match
         """
 
@@ -74,19 +410,14 @@ class TopDownParser(object):
         if len(frontier) == 0:
             raise ValueError("`frontier` requires at least one element")
 
-        if self._verbose >= 1:
-            print("Matching %s with frontier %s and tokens %s" % (tree,
-                                                                  frontier,
-                                                                  tokens))
-
-        # TODO: clean this dirty hack. Maybe create Terminal class?
-        if len(tokens) > 0 and tree[frontier[0]][1:-1] == tokens[0]:
-            newtree = tree.copy(deep=True)
-            for new_tree, new_frontier in self._parse(tokens[1:], newtree,
-                                                      frontier[1:]):
+        # Matching doesn't change the tree: no need to copy it
+        if len(tokens) > 0 and tree[frontier[0]] == tokens[0]:
+            for new_tree, new_frontier in self._parse(
+                    tokens[1:], tree, frontier[1:],
+                    None if needed is None else needed - 1):
                 yield (new_tree, new_frontier)
 
-    def _expand(self, tokens, tree, frontier):
+    def _expand(self, tokens, tree, frontier, needed=None):
         """ Expand a ``tree`` with the first element of the ``frontier``
             If given a ``production``, will expand the tree following this
             production rule, otherwise, will use this ``parser.grammar()``
@@ -96,21 +427,1053 @@ class TopDownParser(object):
         if len(frontier) == 0:
             raise ValueError("Frontier requires at least one element")
 
-        if self._verbose >= 1:
-            print("Expanding %s at subtree %s" % (tree, tree[frontier[0]]))
-
-        if isinstance(tree[frontier[0]], Tree):
-            for production in self.grammar().productions():
-                if tree[frontier[0]].node() == production.lhs():
-                    subtree = tree_from_production(production)
-                    if frontier[0] == ():
-                        newtree = subtree
-                    else:
-                        newtree = tree.copy(deep=True)
-                        newtree[frontier[0]] = subtree
-                    newfrontier = [frontier[0] + (i, ) for i in
-                                   range(len(production.rhs()))]
-                    newfrontier = newfrontier + frontier[1:]
-                    for new_tree, new_frontier in self._parse(tokens, newtree,
-                                                              newfrontier):
-                        yield (new_tree, new_frontier)
+        node = tree[frontier[0]]
+        if isinstance(node, (Tree, PersistentTree)):
+            symbol = node.node()
+            lookahead = tokens[0] if tokens else None
+            productions = self._productions(symbol, lookahead)
+            if not productions:
+                return
+            compiled = self._compiled
+            if needed is None:
+                needed = self._needed(tree, frontier)
+            # Minimum number of tokens needed by the rest of the frontier
+            rest = needed - compiled.min_yield[symbol]
+            available = len(tokens) - rest
+            for production in productions:
+                # Prune productions that can't start with the next token or
+                # would need more tokens than remain
+                if lookahead not in compiled.production_first[production] \
+                        and not compiled.production_nullable[production]:
+                    continue
+                if compiled.production_min_yield[production] > available:
+                    continue
+                newtree, subtree = self._apply(tree, frontier[0], production)
+                newfrontier = [frontier[0] + (i, ) for i in
+                               range(len(subtree))]
+                newfrontier = newfrontier + frontier[1:]
+                for new_tree, new_frontier in self._parse(
+                        tokens, newtree, newfrontier,
+                        rest + compiled.production_min_yield[production]):
+                    yield (new_tree, new_frontier)
+
+    def _needed(self, tree, frontier):
+        """ Return the minimum number of tokens derived by the nodes of
+            ``tree`` at the paths of ``frontier``
+        """
+        min_yield = self._compiled.analyze().min_yield
+        needed = 0
+        for path in frontier:
+            node = tree[path]
+            if isinstance(node, (Tree, PersistentTree)):
+                needed += min_yield[node.node()]
+            else:
+                needed += 1
+        return needed
+
+    def _apply(self, tree, path, production):
+        """ Expand the node of ``tree`` at ``path`` with production id
+            ``production``
+            Returns:
+                (new tree, subtree of ``production``)
+        """
+        subtree = self._subtree(production)
+        if path == ():
+            return (subtree, subtree)
+        # Only copy the path to the expanded node
+        return (tree.replace(path, subtree), subtree)
+
+    def _instrument_search(self):
+        """ Swap the steps of the search for ones reporting to this
+            ``parser``'s instrumentation
+        """
+        instrument = self._instrument
+        callback = instrument.callback
+        parse, match = self._parse, self._match
+        expand, apply = self._expand, self._apply
+        # Number of expansions of each symbol being run, so that recursive
+        # expansions are only timed once
+        active = {}
+
+        def traced_parse(tokens, tree, frontier, needed=None):
+            if len(frontier) > instrument.max_frontier:
+                instrument.max_frontier = len(frontier)
+            return parse(tokens, tree, frontier, needed)
+
+        def traced_match(tokens, tree, frontier, needed=None):
+            if tokens and frontier:
+                matched = tree[frontier[0]] == tokens[0]
+                if matched:
+                    instrument.matches += 1
+                else:
+                    instrument.failed_matches += 1
+                if callback is not None:
+                    callback("match" if matched else "fail",
+                             self._compiled.symbols[tree[frontier[0]]],
+                             self._length - len(tokens))
+            return match(tokens, tree, frontier, needed)
+
+        def traced_apply(tree, path, production):
+            if path != ():
+                instrument.tree_copies += 1
+            return apply(tree, path, production)
+
+        def traced_expand(tokens, tree, frontier, needed=None):
+            symbol = self._compiled.symbols[tree[frontier[0]].node()]
+            instrument.expansions += 1
+            instrument.symbol_expansions[symbol] = \
+                instrument.symbol_expansions.get(symbol, 0) + 1
+            if callback is not None:
+                callback("expand", symbol, self._length - len(tokens))
+            results = expand(tokens, tree, frontier, needed)
+            if not instrument.timing:
+                for result in results:
+                    yield result
+                return
+            while True:
+                outermost = not active.get(symbol)
+                active[symbol] = active.get(symbol, 0) + 1
+                start = time.perf_counter()
+                try:
+                    result = next(results)
+                except StopIteration:
+                    return
+                finally:
+                    active[symbol] -= 1
+                    if outermost:
+                        instrument.symbol_time[symbol] = \
+                            instrument.symbol_time.get(symbol, 0.0) + \
+                            time.perf_counter() - start
+                yield result
+
+        self._parse, self._match = traced_parse, traced_match
+        self._expand, self._apply = traced_expand, traced_apply
+
+    def instrument(self):
+        """ Return the instrumentation of this ``parser``, None if it isn't
+            instrumented
+        """
+        return self._instrument
+
+    def __getstate__(self):
+        # Instrumented steps are closures: swap them in again once unpickled
+        state = self.__dict__.copy()
+        for name in ("_parse", "_match", "_expand", "_apply"):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self._instrument is not None:
+            self._instrument_search()
+
+    def _productions(self, symbol, lookahead):
+        """ Return the production ids to try for expanding nonterminal id
+            ``symbol`` before terminal id ``lookahead``
+            Preterminals only have a production for each word: the ones
+            producing ``lookahead`` are taken from the lexicon instead of
+            going through all of them.
+        """
+        compiled = self._compiled.analyze()
+        productions = compiled.lhs_index.get(symbol, ())
+        if productions and compiled.preterminal[symbol]:
+            lhs = compiled.lhs
+            return [production for production in
+                    compiled.lexicon.get(lookahead, ())
+                    if lhs[production] == symbol]
+        return productions
+
+    def _parse_iterative(self, tokens, limits=None, derivations=False):
+        """ Yield the (tree, frontier) parsing all ``tokens``, in the same
+            order as ``_parse``, using an explicit stack
+
+            Each state of the search is (position, tree, frontier, needed,
+            depth): position is the index of the next token to match,
+            frontier a linked list of (path, symbol id, rest) and needed the
+            minimum number of tokens the frontier derives.
+
+            Given ``_Limits``, the search stops as soon as one of them is
+            exceeded, recording which one in ``limits.reason``.
+
+            With ``derivations``, no tree is built: the tree of each state
+            is replaced by the linked list of the productions applied, as
+            (production id, position, previous), the last one first.
+        """
+        compiled = self._compiled.analyze()
+        terminal, min_yield = compiled.terminal, compiled.min_yield
+        n = len(tokens)
+        max_depth = self._max_depth
+        start = compiled.start
+        if min_yield[start] > n:
+            return
+        root = None if derivations else PersistentTree(start)
+        stack = [(0, root, ((), start, None), min_yield[start], 0)]
+        if limits is not None:
+            # Estimated bytes of the nodes copied by each state of the stack
+            costs = [_NODE_BYTES]
+            memory = _NODE_BYTES
+            steps = 0
+        while stack:
+            position, tree, frontier, needed, depth = stack.pop()
+            if limits is not None:
+                memory -= costs.pop()
+                steps += 1
+                if not limits.check(steps, memory + len(stack) * _STATE_BYTES):
+                    return
+                limits.pending = len(stack)
+            if frontier is None:
+                if position == n:
+                    # Found a match
+                    yield (tree, [])
+                continue
+            if position == n or (max_depth is not None and
+                                 depth >= max_depth):
+                continue
+            path, symbol, rest = frontier
+            if terminal[symbol]:
+                # Match, no need to copy the tree
+                if tokens[position] == symbol:
+                    stack.append((position + 1, tree, rest, needed - 1,
+                                  depth + 1))
+                    if limits is not None:
+                        costs.append(0)
+                continue
+            # Expand, pushing alternatives in reverse order so the first
+            # production is explored first
+            lookahead = tokens[position]
+            available = n - position - (needed - min_yield[symbol])
+            for production in reversed(self._productions(symbol,
+                                                         lookahead)):
+                if lookahead not in compiled.production_first[production] \
+                        and not compiled.production_nullable[production]:
+                    continue
+                if compiled.production_min_yield[production] > available:
+                    continue
+                new_frontier = rest
+                if derivations:
+                    new_tree = (production, position, tree)
+                    children = compiled.production_rhs(production)
+                    for child in reversed(children):
+                        new_frontier = ((), child, new_frontier)
+                else:
+                    children = self._subtree(production)
+                    new_tree = children if path == () else \
+                        tree.replace(path, children)
+                    for i in range(len(children) - 1, -1, -1):
+                        child = children[i]
+                        if isinstance(child, PersistentTree):
+                            child = child.node()
+                        new_frontier = (path + (i, ), child, new_frontier)
+                stack.append((position, new_tree, new_frontier,
+                              needed - min_yield[symbol] +
+                              compiled.production_min_yield[production],
+                              depth + 1))
+                if limits is not None:
+                    # Path copying allocates a node per level of path, and
+                    # the frontier a link per child
+                    cost = (len(path) * _NODE_BYTES +
+                            len(children) * _LINK_BYTES)
+                    costs.append(cost)
+                    memory += cost
+        if limits is not None:
+            limits.pending = 0
+
+    def _parse_memoized(self, tokens):
+        """ Lazily yield the (tree, frontier) parsing all ``tokens``, in the
+            same order as ``_parse``
+        """
+        n = len(tokens)
+        for production in self._compiled.lhs_index.get(self._compiled.start,
+                                                        ()):
+            for tree, end in self._derive_production(tokens, production, 0,
+                                                     n):
+                if end == n:
+                    yield (tree, [])
+
+    def _derive(self, tokens, symbol, start, budget):
+        """ Return every (tree, end) such as nonterminal id ``symbol``
+            derives tokens[start:end] in at most ``budget`` tokens, from the
+            cache if possible
+
+            The budget is the number of tokens left once the rest of the
+            search takes its minimum yield, as in ``_expand``: derivations
+            beyond it can't lead to a parse. A left-recursive call has a
+            smaller budget than the call it comes from, so that the search
+            stops, unless the rest of the production may derive nothing.
+        """
+        key = (symbol, start)
+        cache = self._cache
+        cached = cache.get(key)
+        if cached is not None and cached[0] >= budget:
+            self._hits += 1
+            cache.move_to_end(key)
+            if cached[0] == budget:
+                return cached[1]
+            # Derivations of a larger budget hold the ones of this budget
+            return [(tree, end) for tree, end in cached[1]
+                    if end - start <= budget]
+        deriving = (symbol, start, budget)
+        if deriving in self._deriving:
+            raise ValueError("Left-recursive derivation of %s" %
+                             self._compiled.symbols[symbol])
+        self._misses += 1
+        self._deriving.add(deriving)
+        results = []
+        lookahead = tokens[start] if start < len(tokens) else None
+        try:
+            for production in self._productions(symbol, lookahead):
+                results.extend(self._derive_production(tokens, production,
+                                                       start, budget))
+        finally:
+            self._deriving.discard(deriving)
+        cache[key] = (budget, results)
+        cache.move_to_end(key)
+        if self._cache_size is not None:
+            while len(cache) > self._cache_size:
+                cache.popitem(last=False)
+        return results
+
+    def _derive_production(self, tokens, production, start, budget):
+        """ Yield every (tree, end) such as ``production`` derives
+            tokens[start:end] in at most ``budget`` tokens
+        """
+        compiled = self._compiled.analyze()
+        lookahead = tokens[start] if start < len(tokens) else None
+        if lookahead not in compiled.production_first[production] and \
+                not compiled.production_nullable[production]:
+            return
+        if compiled.production_min_yield[production] > budget:
+            return
+        rhs = compiled.production_rhs(production)
+        # Minimum number of tokens derived by each suffix of rhs
+        needed = [0] * (len(rhs) + 1)
+        for index in range(len(rhs) - 1, -1, -1):
+            needed[index] = needed[index + 1] + compiled.min_yield[rhs[index]]
+        label = ~production
+        for children, end in self._derive_children(tokens, rhs, needed, 0,
+                                                   start, start + budget):
+            yield (PersistentTree(label, children), end)
+
+    def _derive_children(self, tokens, rhs, needed, index, start, limit):
+        """ Yield every (children, end) such as rhs[index:] derives
+            tokens[start:end], end being at most ``limit``
+            Args:
+                needed: minimum number of tokens derived by each suffix of
+                    ``rhs``
+        """
+        if start + needed[index] > limit:
+            return
+        if index == len(rhs):
+            yield ((), start)
+            return
+        symbol = rhs[index]
+        if self._compiled.terminal[symbol]:
+            if start < len(tokens) and tokens[start] == symbol:
+                for children, end in self._derive_children(
+                        tokens, rhs, needed, index + 1, start + 1, limit):
+                    yield ((symbol, ) + children, end)
+            return
+        budget = limit - start - needed[index + 1]
+        for subtree, middle in self._derive(tokens, symbol, start, budget):
+            for children, end in self._derive_children(
+                    tokens, rhs, needed, index + 1, middle, limit):
+                yield ((subtree, ) + children, end)
+
+    def _subtree(self, production):
+        """ Return the ``PersistentTree`` expanding production id
+            ``production``
+        """
+        if production not in self._subtrees:
+            compiled = self._compiled
+            children = [symbol if compiled.terminal[symbol] else
+                        PersistentTree(symbol) for symbol in
+                        compiled.production_rhs(production)]
+            self._subtrees[production] = PersistentTree(~production,
+                                                        children)
+        return self._subtrees[production]
+
+
+class CKYParser(Parser):
+    """ Chart parser based on the Cocke-Younger-Kasami algorithm
+
+        The grammar is converted to Chomsky normal form internally and the
+        chart is filled bottom-up in O(n^3 * |G|). Trees are restored to the
+        shape of the original grammar before being returned.
+
+        Each cell of the chart is a bitset, as a Python int, of the
+        nonterminals deriving its span: binary productions are applied by
+        intersecting the bitsets of the two halves of a span with the right
+        symbols expected by each left symbol, so that only the productions
+        whose both symbols are present are ever looked at. Backpointers
+        aren't stored: the forest is rebuilt top-down from the nodes of the
+        parses only.
+    """
+
+    def __init__(self, grammar):
+        """ params:
+            grammar: a ``grammar`` object that states rules for the parsing
+        """
+        self._grammar = grammar
+        self._normalize()
+
+    def _normalize(self):
+        """ Convert this ``parser``'s grammar to Chomsky normal form and index
+            its productions
+        """
+        # Productions are only ever appended to a grammar
+        self._size = len(self._grammar.productions())
+        cnf = self._cnf = chomsky_normal_form(self._cnf_source()).compile()
+        # Index binary CNF production ids on their left symbol id:
+        # left -> [(right symbol id, production)]. Lexical productions are
+        # served by the lexicon of the compiled grammar.
+        self._binary = {}
+        for production in range(len(cnf)):
+            rhs = cnf.production_rhs(production)
+            if len(rhs) == 2:
+                self._binary.setdefault(rhs[0], []).append((rhs[1],
+                                                            production))
+
+        # Nonterminals are interned to the bits of the chart bitsets
+        bits = {}
+        for symbol in cnf.lhs:
+            bits.setdefault(symbol, len(bits))
+        self._bits = bits
+        # Bitsets of the preterminals of each terminal id
+        self._lexical = {}
+        for token, productions in cnf.lexicon.items():
+            for production in productions:
+                self._lexical[token] = self._lexical.get(token, 0) | \
+                    1 << bits[cnf.lhs[production]]
+        # For each left bit, bitset of the right symbols of its productions
+        # and the bitset of the left-hand sides of the productions of each
+        # (left bit, right bit) pair
+        self._right_masks = [0] * len(bits)
+        self._parents = [{} for _ in range(len(bits))]
+        # lhs symbol id -> [bitset of left symbols, dict mapping left bits
+        # to [(right bit, left symbol id, right symbol id, production)]]
+        self._splits = {}
+        for left, rights in self._binary.items():
+            if left not in bits:
+                continue
+            for right, production in rights:
+                if right not in bits:
+                    continue
+                left_bit, right_bit = bits[left], bits[right]
+                self._right_masks[left_bit] |= 1 << right_bit
+                parents = self._parents[left_bit]
+                parents[right_bit] = parents.get(right_bit, 0) | \
+                    1 << bits[cnf.lhs[production]]
+                left_mask, by_left = self._splits.setdefault(
+                    cnf.lhs[production], [0, {}])
+                self._splits[cnf.lhs[production]][0] = left_mask | \
+                    1 << left_bit
+                by_left.setdefault(left_bit, []).append(
+                    (right_bit, left, right, production))
+
+    def _cnf_source(self):
+        """ Return the grammar converted to Chomsky normal form
+        """
+        return self._grammar
+
+    def parse(self, tokens):
+        """ Parse a list of tokens and return the possible trees based on the
+            ``grammar`` of this ``Parser``
+            Args:
+                tokens: a list of words or a string
+            Returns:
+                generator of (tree, frontier) like ``TopDownParser``, the
+                frontier being always empty
+        """
+        return _parses(self.parse_forest(tokens))
+
+    def parse_forest(self, tokens):
+        """ Parse a list of tokens and return all the possible trees packed
+            in a ``Forest``
+            Alternatives of the forest use the productions of the grammar in
+            Chomsky normal form: unpacked trees are restored to the shape of
+            the original grammar.
+        """
+        tokens = self._token_ids(tokens)
+        if -1 in tokens:
+            # Sentences with unknown words have no parse
+            return Forest(None)
+        return self._forest(self._chart(tokens), tokens)
+
+    def recognize(self, tokens):
+        """ Return True if the grammar of this ``parser`` derives a list of
+            tokens, from the bitset chart alone
+            Returns False as soon as a token has no preterminal.
+        """
+        tokens = self._token_ids(tokens)
+        if -1 in tokens:
+            return False
+        chart = self._chart(tokens)
+        start = self._bits.get(self._cnf.start)
+        return chart is not None and start is not None and \
+            chart[0][len(tokens)] >> start & 1 == 1
+
+    def _token_ids(self, tokens):
+        """ Return the terminal ids of a list of tokens or a string, once
+            the normal form is up to date with the grammar
+        """
+        tokens = _prepare_tokens(tokens)
+        if self._size != len(self._grammar.productions()):
+            self._normalize()
+        return self._cnf.token_ids(tokens)
+
+    def _chart(self, tokens):
+        """ Fill the chart for ``tokens`` given as terminal ids
+            chart[i][j] is the bitset of the nonterminals deriving
+            tokens[i:j]. Returns None if a token has no preterminal.
+        """
+        lexical, right_masks, parents = self._lexical, self._right_masks, \
+            self._parents
+        n = len(tokens)
+        chart = [[0] * (n + 1) for _ in range(n + 1)]
+        for i, token in enumerate(tokens):
+            chart[i][i + 1] = lexical.get(token, 0)
+            if not chart[i][i + 1]:
+                return None
+        for length in range(2, n + 1):
+            for i in range(n - length + 1):
+                j = i + length
+                cell = 0
+                for k in range(i + 1, j):
+                    left, right = chart[i][k], chart[k][j]
+                    if not right:
+                        continue
+                    while left:
+                        low = left & -left
+                        left ^= low
+                        bit = low.bit_length() - 1
+                        matches = right & right_masks[bit]
+                        if not matches:
+                            continue
+                        left_parents = parents[bit]
+                        while matches:
+                            low = matches & -matches
+                            matches ^= low
+                            cell |= left_parents[low.bit_length() - 1]
+                chart[i][j] = cell
+        return chart
+
+    def _forest(self, chart, tokens):
+        """ Pack the derivations of the start symbol in ``chart`` in a
+            ``Forest``, from the root down
+        """
+        cnf, bits = self._cnf, self._bits
+        n = len(tokens)
+        if chart is None or cnf.start not in bits or \
+                not chart[0][n] >> bits[cnf.start] & 1:
+            return Forest(None)
+        nodes = {}
+        stack = []
+
+        def node(symbol, i, j):
+            key = (symbol, i, j)
+            if key not in nodes:
+                nodes[key] = ForestNode(cnf.symbols[symbol], i, j)
+                stack.append(key)
+            return nodes[key]
+
+        root = node(cnf.start, 0, n)
+        while stack:
+            symbol, i, j = stack.pop()
+            forest_node = nodes[(symbol, i, j)]
+            if j == i + 1:
+                for production in cnf.lexicon[tokens[i]]:
+                    if cnf.lhs[production] == symbol:
+                        forest_node.add(cnf.productions[production],
+                                        cnf.productions[production].rhs())
+                continue
+            left_mask, by_left = self._splits[symbol]
+            for k in range(i + 1, j):
+                right_cell = chart[k][j]
+                lefts = chart[i][k] & left_mask
+                while lefts:
+                    low = lefts & -lefts
+                    lefts ^= low
+                    for right_bit, left, right, production in \
+                            by_left[low.bit_length() - 1]:
+                        if right_cell >> right_bit & 1:
+                            forest_node.add(cnf.productions[production],
+                                            [node(left, i, k),
+                                             node(right, k, j)])
+        return Forest(root)
+
+
+class ViterbiParser(CKYParser):
+    """ Probabilistic CKY parser returning the most likely parses
+
+        Productions are given probabilities in the grammar, e.g.
+        NP -> D N [0.4] | N [0.6]; the productions of a symbol without one
+        share evenly what the others leave. Instead of every derivation, the
+        chart keeps the ``k`` most likely derivations of each symbol over
+        each span, so that the best parses are found in O(n^3 * |G| * k^2)
+        however ambiguous the sentence.
+
+        The chart can be pruned further, at the risk of missing the best
+        parse: ``threshold`` drops the entries of a span much less likely
+        than the best entry of that span, and ``beam`` keeps only the most
+        likely symbols of each span.
+    """
+
+    def __init__(self, grammar, k=1, beam=None, threshold=None):
+        """ params:
+            grammar: a ``grammar`` object that states rules for the parsing
+            k: number of parses returned
+            beam: maximum number of symbols kept for each span, None for
+                no limit
+            threshold: ratio, in ]0, 1], of the probability of the best
+                entry of a span below which entries are dropped, None for no
+                pruning
+        """
+        if k < 1:
+            raise ValueError("k should be at least 1")
+        if threshold is not None and not 0 < threshold <= 1:
+            raise ValueError("threshold should be in ]0, 1]")
+        self._k = k
+        self._beam = beam
+        self._threshold = threshold
+        CKYParser.__init__(self, grammar)
+
+    def _normalize(self):
+        CKYParser._normalize(self)
+        self._logprob = [math.log(prob) for prob in self._cnf.probs]
+
+    def _cnf_source(self):
+        return with_probabilities(self._grammar)
+
+    def parse(self, tokens):
+        """ Parse a list of tokens and return its ``k`` most likely trees
+            Returns:
+                generator of (tree, frontier) like ``TopDownParser``, the
+                most likely tree first
+        """
+        for tree, _ in self.parse_scored(tokens):
+            yield (tree, [])
+
+    def parse_scored(self, tokens):
+        """ Return the ``k`` most likely parses of a list of tokens
+            Returns:
+                list of ``ScoredParse(tree, logprob)``, the most likely
+                first. Log probabilities don't underflow on long sentences
+                like probabilities would.
+        """
+        tokens = self._token_ids(tokens)
+        if -1 in tokens:
+            return []
+        chart = self._viterbi_chart(tokens)
+        n = len(tokens)
+        entries = chart[0][n].get(self._cnf.start, ())
+        return [ScoredParse(self._tree(chart, self._cnf.start, 0, n, rank),
+                            entry[0])
+                for rank, entry in enumerate(entries)]
+
+    def best_parse(self, tokens):
+        """ Return the most likely parse of a list of tokens as a
+            ``ScoredParse(tree, logprob)``, None if there is none
+        """
+        parses = self.parse_scored(tokens)
+        return parses[0] if parses else None
+
+    def _viterbi_chart(self, tokens):
+        """ Fill the chart for ``tokens`` given as terminal ids
+            chart[i][j] maps every symbol id deriving tokens[i:j] to its
+            best derivations, the most likely first, as (log probability,
+            production id, split, left rank, right rank) tuples where the
+            ranks are the ones of the derivations of the children
+        """
+        lhs, lexicon, logprob = self._cnf.lhs, self._cnf.lexicon, \
+            self._logprob
+        n = len(tokens)
+        chart = [[None] * (n + 1) for _ in range(n + 1)]
+        for i, token in enumerate(tokens):
+            candidates = {}
+            for production in lexicon.get(token, ()):
+                candidates.setdefault(lhs[production], []).append(
+                    (logprob[production], production, None, 0, 0))
+            chart[i][i + 1] = self._cell(candidates, n == 1)
+        for length in range(2, n + 1):
+            for i in range(n - length + 1):
+                j = i + length
+                candidates = {}
+                for split in range(i + 1, j):
+                    right_cell = chart[split][j]
+                    for left, left_entries in chart[i][split].items():
+                        for right, production in self._binary.get(left, ()):
+                            right_entries = right_cell.get(right)
+                            if right_entries is None:
+                                continue
+                            score = logprob[production]
+                            entries = candidates.setdefault(lhs[production],
+                                                            [])
+                            for a, left_entry in enumerate(left_entries):
+                                for b, right_entry in enumerate(
+                                        right_entries):
+                                    entries.append(
+                                        (score + left_entry[0] +
+                                         right_entry[0], production, split,
+                                         a, b))
+                chart[i][j] = self._cell(candidates, length == n)
+        return chart
+
+    def _cell(self, candidates, whole):
+        """ Return the cell of the chart keeping the best of ``candidates``
+            The cell of the ``whole`` sentence isn't pruned, so as not to
+            drop the start symbol.
+        """
+        cell = {}
+        for symbol, entries in candidates.items():
+            if len(entries) > self._k:
+                entries = heapq.nlargest(self._k, entries, key=_score)
+            else:
+                entries.sort(key=_score, reverse=True)
+            cell[symbol] = entries
+        if whole or not cell:
+            return cell
+        if self._threshold is not None:
+            floor = max(entries[0][0] for entries in cell.values()) + \
+                math.log(self._threshold)
+            cell = dict((symbol, [entry for entry in entries
+                                  if entry[0] >= floor])
+                        for symbol, entries in cell.items()
+                        if entries[0][0] >= floor)
+        if self._beam is not None and len(cell) > self._beam:
+            cell = dict(heapq.nlargest(self._beam, cell.items(),
+                                       key=lambda item: item[1][0][0]))
+        return cell
+
+    def _tree(self, chart, symbol, i, j, rank):
+        """ Return the restored tree of the derivation of rank ``rank`` of
+            symbol id ``symbol`` over tokens[i:j]
+        """
+        productions = self._cnf.productions
+        # Postorder walk, the restored nodes of each derivation being pushed
+        # on ``nodes`` once its children are
+        nodes = []
+        stack = [(symbol, i, j, rank, False)]
+        while stack:
+            symbol, i, j, rank, visited = stack.pop()
+            _, production, split, left, right = chart[i][j][symbol][rank]
+            if split is None:
+                nodes.append(restore(productions[production],
+                                     list(productions[production].rhs())))
+            elif visited:
+                children = nodes.pop()
+                children = nodes.pop() + children
+                nodes.append(restore(productions[production], children))
+            else:
+                rhs = self._cnf.production_rhs(production)
+                stack.append((symbol, i, j, rank, True))
+                stack.append((rhs[1], split, j, right, False))
+                stack.append((rhs[0], i, split, left, False))
+        return nodes[0][0]
+
+
+class EarleyParser(Parser):
+    """ Chart parser based on Earley's algorithm
+
+        Any context-free grammar is accepted as is, including left-recursive
+        ones, empty productions and the start symbol on a right-hand side.
+        Parsing is O(n^3) in the worst case and O(n^2) for unambiguous
+        grammars.
+    """
+
+    def __init__(self, grammar):
+        """ params:
+            grammar: a ``grammar`` object that states rules for the parsing
+        """
+        self._grammar = grammar
+
+    def parse(self, tokens):
+        """ Parse a list of tokens and return the possible trees based on the
+            ``grammar`` of this ``Parser``
+            Args:
+                tokens: a list of words or a string
+            Returns:
+                generator of (tree, frontier) like ``TopDownParser``, the
+                frontier being always empty
+        """
+        return _parses(self.parse_forest(tokens))
+
+    def parse_forest(self, tokens):
+        """ Parse a list of tokens and return all the possible trees packed
+            in a ``Forest``
+            The forest is cyclic when a symbol derives itself over a span:
+            its parses leave out the derivations going back to a node
+            being derived, see ``Forest``.
+        """
+        tokens = _prepare_tokens(tokens)
+        self._compiled = self._grammar.compile().analyze()
+        tokens = self._compiled.token_ids(tokens)
+        if -1 in tokens:
+            # Sentences with unknown words have no parse
+            return Forest(None)
+        completed = self._chart(tokens)
+        return self._forest(tokens, completed)
+
+    def _chart(self, tokens):
+        """ Run Earley's recognizer over ``tokens`` given as terminal ids
+            Returns:
+                dict mapping every (symbol id, i, j) such as symbol derives
+                tokens[i:j] to the list of its completed production ids
+        """
+        compiled = self._compiled
+        lhs, rhs, offsets = compiled.lhs, compiled.rhs, compiled.rhs_offsets
+        terminal, nullable = compiled.terminal, compiled.nullable
+        n = len(tokens)
+        # Items are (production, position, origin) tuples, position being
+        # the index of the dot in the compiled rhs array. Each set keeps its
+        # items in order along with the items waiting on each symbol.
+        sets = [[] for _ in range(n + 1)]
+        seen = [set() for _ in range(n + 1)]
+        waiting = [{} for _ in range(n + 1)]
+        completed = {}
+
+        def add(j, item):
+            if item not in seen[j]:
+                seen[j].add(item)
+                sets[j].append(item)
+
+        lhs_index = compiled.lhs_index
+        for production in lhs_index.get(compiled.start, ()):
+            add(0, (production, offsets[production], 0))
+        for j in range(n + 1):
+            items = sets[j]
+            index = 0
+            while index < len(items):
+                production, position, origin = items[index]
+                index += 1
+                if position == offsets[production + 1]:
+                    # Complete
+                    key = (lhs[production], origin, j)
+                    if key not in completed:
+                        completed[key] = []
+                    completed[key].append(production)
+                    for parent, parent_position, parent_origin in \
+                            waiting[origin].get(lhs[production], ()):
+                        add(j, (parent, parent_position + 1, parent_origin))
+                    continue
+                symbol = rhs[position]
+                if terminal[symbol]:
+                    # Scan
+                    if j < n and symbol == tokens[j]:
+                        add(j + 1, (production, position + 1, origin))
+                    continue
+                # Predict
+                if symbol not in waiting[j]:
+                    waiting[j][symbol] = []
+                    for predicted in lhs_index.get(symbol, ()):
+                        add(j, (predicted, offsets[predicted], j))
+                waiting[j][symbol].append((production, position, origin))
+                if nullable[symbol]:
+                    add(j, (production, position + 1, origin))
+        return completed
+
+    def _forest(self, tokens, completed):
+        """ Pack the derivations of the start symbol found by the recognizer
+            in a ``Forest``
+        """
+        compiled = self._compiled
+        root = (compiled.start, 0, len(tokens))
+        if root not in completed:
+            return Forest(None)
+        ends = {}
+        for symbol, i, j in completed:
+            ends.setdefault((symbol, i), []).append(j)
+        for span in ends.values():
+            span.sort()
+        nodes = {root: ForestNode(compiled.symbols[root[0]], 0, len(tokens))}
+        stack = [root]
+        while stack:
+            key = stack.pop()
+            forest_node = nodes[key]
+            for production in completed[key]:
+                for children in self._splits(tokens, ends, production,
+                                             key[1], key[2]):
+                    for index, child in enumerate(children):
+                        if isinstance(child, tuple):
+                            if child not in nodes:
+                                nodes[child] = ForestNode(
+                                    compiled.symbols[child[0]], child[1],
+                                    child[2])
+                                stack.append(child)
+                            children[index] = nodes[child]
+                    forest_node.add(compiled.productions[production],
+                                    children)
+        return Forest(nodes[root])
+
+    def _splits(self, tokens, ends, production, i, j):
+        """ Return every way of deriving tokens[i:j] from the right-hand side
+            of production id ``production``
+            Returns:
+                list of children, given as terminals or (symbol id, start,
+                end) spans for nonterminals
+        """
+        compiled = self._compiled
+        partial = [(i, [])]
+        for symbol in compiled.production_rhs(production):
+            extended = []
+            for k, children in partial:
+                if compiled.terminal[symbol]:
+                    if k < j and symbol == tokens[k]:
+                        extended.append((k + 1, children +
+                                         [compiled.symbols[symbol]]))
+                    continue
+                for end in ends.get((symbol, k), ()):
+                    if end > j:
+                        break
+                    extended.append((end, children + [(symbol, k, end)]))
+            partial = extended
+        return [children for k, children in partial if k == j]
+
+
+class _Recognizer(object):
+    """ Earley recognizer over a ``CompiledGrammar``
+
+        Items are packed in ints: the dotted rule times the number of Earley
+        sets plus the origin of the item. Dotted rules are numbered so that
+        the rule of production p with its dot at k is ``first_dot[p] + k``
+        and moving the dot over a symbol only adds the number of sets to an
+        item.
+    """
+
+    def __init__(self, compiled):
+        compiled.analyze()
+        self._compiled = compiled
+        self._size = len(compiled)
+        # Symbol id after the dot of each dotted rule, -1 at the end
+        self._next_symbol = array('i')
+        # Left-hand side symbol id of the production of each dotted rule
+        self._dotted_lhs = array('i')
+        self._first_dot = array('i')
+        for production in range(len(compiled)):
+            rhs = compiled.production_rhs(production)
+            self._first_dot.append(len(self._next_symbol))
+            self._next_symbol.extend(rhs)
+            self._next_symbol.append(-1)
+            self._dotted_lhs.extend([compiled.lhs[production]] *
+                                    (len(rhs) + 1))
+
+    def compiles(self, compiled):
+        """ Return True if this ``recognizer`` is up to date with
+            ``compiled``
+        """
+        return compiled is self._compiled and len(compiled) == self._size
+
+    def recognize(self, tokens):
+        """ Return True if ``tokens``, given as terminal ids, are derived
+            from the start symbol
+            Returns False as soon as an Earley set is empty.
+        """
+        compiled = self._compiled
+        n = len(tokens)
+        if -1 in tokens or compiled.min_yield[compiled.start] > n:
+            return False
+        width = n + 1
+        next_symbol, dotted_lhs = self._next_symbol, self._dotted_lhs
+        first_dot, lhs_index = self._first_dot, compiled.lhs_index
+        terminal, nullable = compiled.terminal, compiled.nullable
+        # Items waiting on each nonterminal, for each Earley set
+        waiting = []
+        items = [first_dot[production] * width for production in
+                 lhs_index.get(compiled.start, ())]
+        for j in range(n + 1):
+            seen = set(items)
+            token = tokens[j] if j < n else -1
+            waiting.append({})
+            scanned = []
+            index = 0
+            while index < len(items):
+                item = items[index]
+                index += 1
+                dot, origin = divmod(item, width)
+                symbol = next_symbol[dot]
+                if symbol < 0:
+                    # Complete
+                    for parent in waiting[origin].get(dotted_lhs[dot], ()):
+                        if parent + width not in seen:
+                            seen.add(parent + width)
+                            items.append(parent + width)
+                elif terminal[symbol]:
+                    # Scan
+                    if symbol == token:
+                        scanned.append(item + width)
+                else:
+                    # Predict
+                    parents = waiting[j].get(symbol)
+                    if parents is None:
+                        parents = waiting[j][symbol] = []
+                        for production in lhs_index.get(symbol, ()):
+                            predicted = first_dot[production] * width + j
+                            if predicted not in seen:
+                                seen.add(predicted)
+                                items.append(predicted)
+                    parents.append(item)
+                    if nullable[symbol] and item + width not in seen:
+                        seen.add(item + width)
+                        items.append(item + width)
+            if j < n:
+                if not scanned:
+                    return False
+                items = scanned
+        offsets = compiled.rhs_offsets
+        return any((first_dot[production] + offsets[production + 1] -
+                    offsets[production]) * width in seen
+                   for production in lhs_index.get(compiled.start, ()))
+
+
+class _Limits(object):
+    """ Limits of a bounded parse
+    """
+
+    # Number of steps between two checks of the clock
+    CLOCK_INTERVAL = 256
+
+    def __init__(self, timeout=None, max_steps=None, max_memory=None):
+        self.deadline = None if timeout is None else \
+            time.perf_counter() + timeout
+        self.max_steps = max_steps
+        self.max_memory = max_memory
+        # Limit which stopped the search, None if none did
+        self.reason = None
+        # Number of states left to explore by the search
+        self.pending = 0
+
+    def check(self, steps=0, memory=0):
+        """ Return True if the search can go on after ``steps`` steps using
+            ``memory`` bytes, otherwise record the limit exceeded
+        """
+        if self.max_steps is not None and steps > self.max_steps:
+            self.reason = "max_steps"
+        elif self.max_memory is not None and memory > self.max_memory:
+            self.reason = "max_memory"
+        elif self.deadline is not None and \
+                steps % self.CLOCK_INTERVAL == 0 and \
+                time.perf_counter() > self.deadline:
+            self.reason = "timeout"
+        return self.reason is None
+
+
+_score = itemgetter(0)
+
+
+def _parses(forest):
+    """ Yield a (tree, frontier) for every tree of ``forest``, the frontier
+        being always empty like in a complete ``TopDownParser`` parse
+    """
+    for tree in forest.trees():
+        yield (tree, [])
+
+
+def _prepare_tokens(tokens):
+    """ Check ``tokens`` and tokenize them if given as a string
+    """
+    if len(tokens) == 0:
+        raise ValueError("Tokens can't be empy")
+
+    # Tokenize if needed
+    if not isinstance(tokens, list):
+        tokens = tokenize(tokens)
+    return tokens
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+#
+# Author: Florent Piétot <florent.pietot@gmail.com>
+
+""" Stream a corpus through a parser
+
+    Sentences are read line by line, tokenized, parsed in batches and written
+    out as soon as they are parsed, so that memory stays bounded whatever the
+    size of the corpus.
+
+    Usage:
+        python -m cfg.pipeline grammar.txt corpus.txt -o parses.jsonl
+        cat corpus.txt | python -m cfg.pipeline grammar.txt --format bracketed
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import deque
+from cfg import serialize
+from cfg.cache import load_grammar
+from cfg.parse import TopDownParser, CKYParser, EarleyParser, ViterbiParser
+from cfg.tokenize import tokenize
+from cfg.tree import tree_from_tuples
+
+PARSERS = {
+    "topdown": TopDownParser,
+    "cky": CKYParser,
+    "earley": EarleyParser,
+    "viterbi": ViterbiParser
+}
+
+
+class Progress(object):
+    """ Count parsed sentences and periodically report the throughput
+    """
+
+    def __init__(self, stream=None, interval=10.0):
+        """ Args:
+                stream: where to report, e.g. ``sys.stderr``. None to only
+                    count.
+                interval: minimum number of seconds between two reports
+        """
+        self._stream = stream
+        self._interval = interval
+        self._start = self._last = time.time()
+        self.sentences = 0
+        self.parses = 0
+
+    def update(self, result):
+        """ Count the ``BatchResult`` of a sentence
+        """
+        self.sentences += 1
+        self.parses += len(result.parses)
+        if self._stream is not None and \
+                time.time() - self._last >= self._interval:
+            self.report()
+
+    def throughput(self):
+        """ Return the number of sentences parsed per second
+        """
+        elapsed = time.time() - self._start
+        return self.sentences / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        self._last = time.time()
+        if self._stream is not None:
+            self._stream.write("%d sentences, %d parses, %.1f sentences/s\n" %
+                               (self.sentences, self.parses,
+                                self.throughput()))
+            self._stream.flush()
+
+
+def parse_stream(parser, lines, workers=1, chunk_size=64, timeout=None,
+                 window=None, progress=None):
+    """ Parse a stream of sentences, one per line
+
+        Args:
+            parser: any parser of ``cfg.parse``
+            lines: iterable of sentences, e.g. a file. Blank lines are
+                skipped.
+            workers, chunk_size, timeout: see ``Parser.parse_many``
+            window: maximum number of sentences read ahead of the results
+                consumed, which bounds memory. Chunks are shrunk to fit in
+                it. Defaults to two chunks per worker.
+            progress: optional ``Progress`` counter
+        Returns:
+            generator of (line number, sentence, ``BatchResult``), in the
+            order of ``lines``
+    """
+    sentences = deque()
+
+    def read():
+        # Keep the line number and sentence of each tokenized sentence in
+        # flight. Reading is driven by parse_many, so this stays bounded.
+        for number, line in enumerate(lines, 1):
+            sentence = line.strip()
+            if sentence:
+                sentences.append((number, sentence))
+                yield tokenize(sentence)
+
+    max_pending = None
+    if window is not None:
+        chunk_size = min(chunk_size, window)
+        max_pending = window // chunk_size
+    results = parser.parse_many(read(), workers=workers,
+                                chunk_size=chunk_size, timeout=timeout,
+                                max_pending=max_pending)
+    for result in results:
+        number, sentence = sentences.popleft()
+        if progress is not None:
+            progress.update(result)
+        yield (number, sentence, result)
+
+
+def write_jsonl(records, output):
+    """ Write each (line number, sentence, ``BatchResult``) of ``records`` as
+        a JSON object on its own line
+    """
+    for number, sentence, result in records:
+        output.write(json.dumps({
+            "line": number,
+            "sentence": sentence,
+            "status": result.status,
+            "error": result.error,
+            "parses": result.parses
+        }))
+        output.write("\n")
+
+
+def write_bracketed(records, output):
+    """ Write the parses of each (line number, sentence, ``BatchResult``) of
+        ``records`` in the bracketed notation of ``cfg.serialize``, one tree
+        per line after a "#" comment line and a blank line after each
+        sentence, so that ``cfg.serialize.read_bracketed`` reads them back
+    """
+    for number, sentence, result in records:
+        output.write("# %d: %s (%s)\n" % (number, sentence, result.status))
+        serialize.write_bracketed(map(tree_from_tuples, result.parses),
+                                  output)
+        output.write("\n")
+
+
+WRITERS = {
+    "jsonl": write_jsonl,
+    "bracketed": write_bracketed
+}
+
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(
+        description="Parse a corpus, one sentence per line")
+    arguments.add_argument("grammar", help="grammar file")
+    arguments.add_argument("input", nargs="?", default="-",
+                           help="corpus file, - or nothing for stdin")
+    arguments.add_argument("-o", "--output", default="-",
+                           help="output file, - or nothing for stdout")
+    arguments.add_argument("-f", "--format", choices=sorted(WRITERS),
+                           default="jsonl")
+    arguments.add_argument("-p", "--parser", choices=sorted(PARSERS),
+                           default="earley")
+    arguments.add_argument("-w", "--workers", type=int, default=1)
+    arguments.add_argument("--chunk-size", type=int, default=64)
+    arguments.add_argument("--window", type=int, default=None,
+                           help="maximum number of sentences in flight")
+    arguments.add_argument("--timeout", type=float, default=None,
+                           help="maximum number of seconds per sentence")
+    arguments.add_argument("--progress", type=float, default=None,
+                           metavar="SECONDS",
+                           help="report throughput on stderr periodically")
+    arguments.add_argument("--no-cache", dest="cache", action="store_false",
+                           help="don't read or write the compiled grammar "
+                           "cache")
+    options = arguments.parse_args(argv)
+
+    grammar = load_grammar(options.grammar, cache=options.cache)
+    parser = PARSERS[options.parser](grammar)
+    progress = Progress(sys.stderr if options.progress else None,
+                        options.progress or 0)
+    input = sys.stdin if options.input == "-" else open(options.input)
+    output = sys.stdout if options.output == "-" else open(options.output,
+                                                           "w")
+    try:
+        records = parse_stream(parser, input, workers=options.workers,
+                               chunk_size=options.chunk_size,
+                               timeout=options.timeout,
+                               window=options.window, progress=progress)
+        WRITERS[options.format](records, output)
+    finally:
+        if input is not sys.stdin:
+            input.close()
+        if output is not sys.stdout:
+            output.close()
+    if options.progress:
+        progress.report()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
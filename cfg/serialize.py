@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+#
+# Author: Florent Piétot <florent.pietot@gmail.com>
+
+""" Write trees to text and read them back
+
+    Two formats are supported, one tree per line when written:
+        bracketed: Penn treebank style, e.g. (S (NP (N 'fall')) (VP))
+            Parentheses in labels and leaves are written as -LRB- and -RRB-.
+            Labels and leaves can't contain spaces, and leaves can't be
+            empty.
+            When read, trees may span several lines, and lines starting
+            with "#" between trees are comments.
+        json: nested lists of the label followed by the children, e.g.
+            ["S", ["NP", ["N", "'fall'"]], ["VP"]], the same shape as
+            ``tree_to_tuples``
+
+    Trees are written and read with explicit stacks, in time linear in their
+    size, so that arbitrarily deep trees are supported.
+"""
+
+import json
+import re
+from json.encoder import encode_basestring
+from cfg.tree import Tree
+
+_BRACKETED_TOKENS = re.compile(r"\(|\)|[^\s()]+")
+_JSON_TOKENS = re.compile(r'"(?:[^"\\]|\\.)*"|[\[\],]|[^\s\[\],]+')
+_SPACE = re.compile(r"\s")
+
+
+def tree_to_bracketed(tree):
+    """ Return ``tree`` in bracketed notation
+
+        Example:
+            (S, (NP, (N, 'fall')), (VP)) -> "(S (NP (N 'fall')) (VP))"
+    """
+    return "".join(_bracketed_parts(tree, {}))
+
+
+def tree_from_bracketed(string):
+    """ Return the single ``Tree`` written in bracketed notation in
+        ``string``
+
+        Raises:
+            ValueError if ``string`` isn't exactly one tree
+    """
+    trees = list(read_bracketed([string]))
+    if len(trees) != 1:
+        raise ValueError("Expected one tree, found %d" % len(trees))
+    return trees[0]
+
+
+def write_bracketed(trees, output):
+    """ Write each of ``trees`` in bracketed notation on its own line
+    """
+    escaped = {}
+    for tree in trees:
+        parts = _bracketed_parts(tree, escaped)
+        parts.append("\n")
+        output.write("".join(parts))
+
+
+def read_bracketed(lines):
+    """ Generate the ``Tree``s written in bracketed notation in ``lines``, an
+        iterable of strings such as a file
+
+        Raises:
+            ValueError if the brackets don't match
+    """
+    labels = {}
+    stack = []
+    # True after an opening bracket, until the label of its node is read
+    opened = False
+    for line in lines:
+        if line.startswith("#") and not stack and not opened:
+            continue
+        for token in _BRACKETED_TOKENS.findall(line):
+            if opened:
+                opened = False
+                if token != "(" and token != ")":
+                    _open(stack, _unescape(token, labels))
+                    continue
+                # Bracket without label, e.g. the root of "( (S ...) )"
+                _open(stack, "")
+            if token == "(":
+                opened = True
+            elif token == ")":
+                if not stack:
+                    raise ValueError("Unbalanced closing bracket")
+                tree = stack.pop()
+                if not stack:
+                    yield tree
+            elif stack:
+                stack[-1].append(_unescape(token, labels))
+            else:
+                raise ValueError("Leaf outside of a tree: %s" % token)
+    if stack or opened:
+        raise ValueError("Unbalanced opening bracket")
+
+
+def tree_to_json(tree):
+    """ Return ``tree`` as a JSON array of its label followed by its
+        children
+
+        Example:
+            (S, (NP, (N, fall)), (VP)) -> '["S",["NP",["N","fall"]],["VP"]]'
+    """
+    return "".join(_json_parts(tree, {}))
+
+
+def tree_from_json(string):
+    """ Return the single ``Tree`` written as JSON arrays in ``string``
+
+        Raises:
+            ValueError if ``string`` isn't exactly one tree
+    """
+    trees = list(_read_json(_JSON_TOKENS.findall(string), {}))
+    if len(trees) != 1:
+        raise ValueError("Expected one tree, found %d" % len(trees))
+    return trees[0]
+
+
+def write_json(trees, output):
+    """ Write each of ``trees`` as JSON on its own line
+    """
+    quoted = {}
+    for tree in trees:
+        parts = _json_parts(tree, quoted)
+        parts.append("\n")
+        output.write("".join(parts))
+
+
+def read_json(lines):
+    """ Generate the ``Tree``s written as JSON in ``lines``, one per line
+        Blank lines are skipped.
+    """
+    labels = {}
+    for line in lines:
+        tokens = _JSON_TOKENS.findall(line)
+        if tokens:
+            trees = list(_read_json(tokens, labels))
+            if len(trees) != 1:
+                raise ValueError("Expected one tree per line, found %d" %
+                                 len(trees))
+            yield trees[0]
+
+
+def _open(stack, label):
+    """ Push a new node labeled ``label`` on ``stack``, as the last child of
+        the node below it if any
+    """
+    tree = Tree(label)
+    if stack:
+        stack[-1].append(tree)
+    stack.append(tree)
+
+
+def _escape(label, escaped):
+    """ Return ``label`` as written in bracketed notation, caching it in
+        ``escaped``
+    """
+    text = escaped.get(label)
+    if text is None:
+        text = "%s" % label
+        if _SPACE.search(text):
+            raise ValueError("Can't write label with spaces %r" % text)
+        text = escaped[label] = text.replace("(", "-LRB-") \
+            .replace(")", "-RRB-")
+    return text
+
+
+def _unescape(token, labels):
+    """ Return the label written as ``token`` in bracketed notation, caching
+        it in ``labels`` so that equal labels are shared
+    """
+    label = labels.get(token)
+    if label is None:
+        label = labels[token] = token.replace("-LRB-", "(") \
+            .replace("-RRB-", ")")
+    return label
+
+
+def _bracketed_parts(tree, escaped):
+    """ Return the list of strings making ``tree`` in bracketed notation
+    """
+    parts = ["(", _escape(tree.node(), escaped)]
+    stack = [iter(tree)]
+    while stack:
+        for child in stack[-1]:
+            if isinstance(child, Tree):
+                parts.append(" (")
+                parts.append(_escape(child.node(), escaped))
+                stack.append(iter(child))
+                break
+            leaf = _escape(child, escaped)
+            if not leaf:
+                raise ValueError("Can't write empty leaf")
+            parts.append(" ")
+            parts.append(leaf)
+        else:
+            stack.pop()
+            parts.append(")")
+    return parts
+
+
+def _quote(label, quoted):
+    """ Return ``label`` as a JSON string, caching it in ``quoted``
+    """
+    text = quoted.get(label)
+    if text is None:
+        text = quoted[label] = encode_basestring("%s" % label)
+    return text
+
+
+def _json_parts(tree, quoted):
+    """ Return the list of strings making ``tree`` as JSON
+    """
+    parts = ["[", _quote(tree.node(), quoted)]
+    stack = [iter(tree)]
+    while stack:
+        for child in stack[-1]:
+            if isinstance(child, Tree):
+                parts.append(",[")
+                parts.append(_quote(child.node(), quoted))
+                stack.append(iter(child))
+                break
+            parts.append(",")
+            parts.append(_quote(child, quoted))
+        else:
+            stack.pop()
+            parts.append("]")
+    return parts
+
+
+def _read_json(tokens, labels):
+    """ Generate the ``Tree``s made of JSON ``tokens``
+    """
+    stack = []
+    # True after an opening bracket, until the label of its node is read
+    opened = False
+    for token in tokens:
+        if opened:
+            opened = False
+            if token[0] != '"':
+                raise ValueError("Expected a label, found %s" % token)
+            _open(stack, _unquote(token, labels))
+        elif token == ",":
+            continue
+        elif token == "[":
+            opened = True
+        elif token == "]":
+            if not stack:
+                raise ValueError("Unbalanced closing bracket")
+            tree = stack.pop()
+            if not stack:
+                yield tree
+        elif token[0] == '"' and stack:
+            stack[-1].append(_unquote(token, labels))
+        else:
+            raise ValueError("Unexpected token: %s" % token)
+    if stack or opened:
+        raise ValueError("Unbalanced opening bracket")
+
+
+def _unquote(token, labels):
+    """ Return the string of the JSON string ``token``, caching it in
+        ``labels`` so that equal labels are shared
+    """
+    label = labels.get(token)
+    if label is None:
+        label = labels[token] = json.loads(token) if "\\" in token \
+            else token[1:-1]
+    return label
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+#
+# Author: Florent Piétot <florent.pietot@gmail.com>
+
+""" Grammar transformations
+    A transformed grammar is made of ``DerivedProduction``s. Each of them
+    remembers the nodes of the original grammar it stands for, so that trees
+    built with the transformed grammar can be restored to the shape of the
+    original one. Transformations compose: a transformed grammar can be
+    transformed again and still be restored to the original shape.
+"""
+
+from collections import OrderedDict
+from cfg.grammar import Production, Grammar, is_terminal
+from cfg.tree import Tree
+
+
+class DerivedProduction(Production):
+    """ A ``Production`` created by a grammar transformation
+    """
+
+    def __init__(self, lhs, rhs, chain, prob=None):
+        """ Args:
+                lhs: left-hand side of this ``production``
+                rhs: right-hand side of this ``production``
+                chain: labels of the original nodes this ``production``
+                    stands for, outermost first. An empty chain marks a
+                    symbol introduced by the transformation: its node is
+                    spliced into its parent when restoring a tree.
+                prob: probability of the original productions this
+                    ``production`` stands for, None if they have none
+        """
+        Production.__init__(self, lhs, rhs, prob)
+        self._chain = tuple(chain)
+
+    def chain(self):
+        """ Return the labels of the original nodes, outermost first
+        """
+        return self._chain
+
+    def __eq__(self, other):
+        """ Return True if this ``DerivedProduction`` is equal to ``other``
+        """
+        return Production.__eq__(self, other) and self._chain == other._chain
+
+    def __hash__(self):
+        return hash((self._lhs, self._rhs, self._chain))
+
+
+def restore(production, children):
+    """ Return the nodes ``production`` stands for in the original grammar
+
+        Args:
+            production: a ``Production`` or ``DerivedProduction``
+            children: already restored children of the node
+        Returns:
+            list of nodes to insert in the parent: a single ``Tree`` for
+            regular productions, ``children`` themselves for spliced ones
+
+        Example:
+            A -> 'x' derived from the unit chain A -> B, B -> 'x':
+            restore(production, ["'x'"]) -> [(A, (B, 'x'))]
+    """
+    if not isinstance(production, DerivedProduction):
+        return [Tree(production.lhs(), children)]
+    chain = production.chain()
+    if not chain:
+        return children
+    node = Tree(chain[-1], children)
+    for label in reversed(chain[:-1]):
+        node = Tree(label, [node])
+    return [node]
+
+
+def chomsky_normal_form(grammar):
+    """ Return a ``grammar`` in Chomsky normal form generating the same
+        sentences as ``grammar``
+
+        Unit productions are collapsed along their chains, terminals of long
+        right-hand sides are lifted into their own preterminal and long
+        right-hand sides are binarized. Cyclic unit chains are only followed
+        once: they would otherwise derive infinitely many trees.
+
+        Probabilities are carried over so that a derivation has the same
+        probability in both grammars: a collapsed production gets the product
+        of the probabilities along its unit chain, and the productions
+        introduced by the conversion a probability of 1.
+
+        Raises:
+            ValueError if ``grammar`` has empty productions
+    """
+    for production in grammar.productions():
+        if len(production.rhs()) == 0:
+            raise ValueError("Can't convert empty production to CNF: %s" %
+                             production)
+
+    productions = []
+    seen = set()
+
+    def add(production):
+        if production not in seen:
+            seen.add(production)
+            productions.append(production)
+
+    for lhs, rhs, chain, prob in _collapse_units(grammar):
+        if len(rhs) == 1:
+            add(DerivedProduction(lhs, rhs, chain, prob))
+            continue
+        certain = None if prob is None else 1.0
+        rhs = list(rhs)
+        for index, symbol in enumerate(rhs):
+            if is_terminal(symbol):
+                rhs[index] = "<%s>" % symbol
+                add(DerivedProduction(rhs[index], [symbol], (), certain))
+        head = lhs
+        while len(rhs) > 2:
+            intermediate = "%s|<%s>" % (head, "-".join(rhs[1:]))
+            add(DerivedProduction(lhs, [rhs[0], intermediate], chain, prob))
+            lhs, rhs, chain, prob = intermediate, rhs[1:], (), certain
+        add(DerivedProduction(lhs, rhs, chain, prob))
+    return Grammar(grammar.start(), productions)
+
+
+def _collapse_units(grammar):
+    """ Yield (lhs, rhs, chain, prob) for every non-unit production
+        reachable from each nonterminal through a chain of unit productions,
+        prob being the product of the probabilities along the chain
+    """
+    nonterminals = {}
+    for production in grammar.productions():
+        nonterminals.setdefault(production.lhs(), None)
+    for symbol in nonterminals:
+        # (symbol, symbols of the unit chain, chain, probability)
+        stack = [(symbol, (symbol, ), (), 1.0)]
+        while stack:
+            lhs, symbols, chain, chain_prob = stack.pop()
+            units = []
+            for production in grammar.productions(lhs=lhs):
+                rhs = production.rhs()
+                labels = chain + _chain(production)
+                prob = _product(chain_prob, production.prob())
+                if len(rhs) == 1 and not is_terminal(rhs[0]):
+                    if rhs[0] not in symbols:
+                        units.append((rhs[0], symbols + rhs, labels, prob))
+                else:
+                    yield (symbol, rhs, labels, prob)
+            stack.extend(reversed(units))
+
+
+def _chain(production):
+    """ Return the labels of the original nodes ``production`` stands for
+    """
+    if isinstance(production, DerivedProduction):
+        return production.chain()
+    return (production.lhs(), )
+
+
+def _product(a, b):
+    """ Multiply probabilities, None standing for unknown ones
+    """
+    if a is None or b is None:
+        return None
+    return a * b
+
+
+def with_probabilities(grammar):
+    """ Return ``grammar`` with a probability on every production
+
+        Productions without a probability share evenly the probability left
+        by the other productions of their left-hand side, so that a grammar
+        without any probability gives every alternative the same chance.
+
+        Raises:
+            ValueError if no probability is left for the productions of a
+            symbol without one
+    """
+    shares = {}
+    productions = []
+    for production in grammar.productions():
+        if production.prob() is not None:
+            productions.append(production)
+            continue
+        lhs = production.lhs()
+        if lhs not in shares:
+            alternatives = grammar.productions(lhs=lhs)
+            left = 1.0 - sum(alternative.prob() for alternative in
+                             alternatives if alternative.prob() is not None)
+            if left <= 0:
+                raise ValueError("No probability left for %s" % production)
+            shares[lhs] = left / sum(1 for alternative in alternatives
+                                     if alternative.prob() is None)
+        productions.append(Production(lhs, production.rhs(), shares[lhs]))
+    return Grammar(grammar.start(), productions)
+
+
+def simplify(grammar, factor=False):
+    """ Return a smaller ``grammar`` deriving the same sentences, whose
+        trees are restored to the shape of ``grammar`` by the parsers
+
+        Useless productions are removed, unit productions collapsed and
+        duplicate productions dropped. Left-factoring common prefixes is
+        optional: it trades productions for new symbols.
+    """
+    grammar = deduplicate(collapse_units(remove_useless(grammar)))
+    grammar = remove_useless(grammar)
+    if factor:
+        grammar = left_factor(grammar)
+    return grammar
+
+
+def remove_useless(grammar):
+    """ Return ``grammar`` without its useless productions: the ones using
+        a nonterminal which derives no sentence or which can't be reached
+        from the start symbol
+        The productions kept are left untouched.
+    """
+    productive = set()
+    changed = True
+    while changed:
+        changed = False
+        for production in grammar.productions():
+            if production.lhs() not in productive and \
+                    _derives(production, productive):
+                productive.add(production.lhs())
+                changed = True
+    productions = [production for production in grammar.productions()
+                   if production.lhs() in productive and
+                   _derives(production, productive)]
+    used = Grammar(grammar.start(), productions)
+    reachable = set([grammar.start()])
+    stack = [grammar.start()]
+    while stack:
+        for production in used.productions(lhs=stack.pop()):
+            for symbol in production.rhs():
+                if symbol not in reachable and not is_terminal(symbol):
+                    reachable.add(symbol)
+                    stack.append(symbol)
+    return Grammar(grammar.start(), [production for production in productions
+                                     if production.lhs() in reachable])
+
+
+def _derives(production, productive):
+    """ Return True if every nonterminal of the right-hand side of
+        ``production`` is in ``productive``
+    """
+    return all(is_terminal(symbol) or symbol in productive
+               for symbol in production.rhs())
+
+
+def collapse_units(grammar):
+    """ Return ``grammar`` without unit productions such as NP -> N: each
+        nonterminal gets the productions at the end of its unit chains
+        Cyclic unit chains are only followed once.
+    """
+    return Grammar(grammar.start(),
+                   [DerivedProduction(lhs, rhs, chain, prob)
+                    for lhs, rhs, chain, prob in _collapse_units(grammar)])
+
+
+def deduplicate(grammar):
+    """ Return ``grammar`` with only the first of equal productions
+    """
+    seen = set()
+    productions = []
+    for production in grammar.productions():
+        if production not in seen:
+            seen.add(production)
+            productions.append(production)
+    return Grammar(grammar.start(), productions)
+
+
+def left_factor(grammar):
+    """ Return ``grammar`` with the common prefixes of the productions of
+        each nonterminal factored out, e.g. VP -> V NP | V NP PP becomes
+        VP -> V VP|<V> and VP|<V> -> NP | NP PP
+
+        Prefixes are never factored up to the end of a right-hand side, so
+        that no empty production is introduced: VP|<V> -> NP | NP PP is left
+        as is, since NP would be the whole of its first alternative.
+    """
+    symbols = set()
+    for production in grammar.productions():
+        symbols.add(production.lhs())
+        symbols.update(production.rhs())
+    productions = []
+    pending = [(lhs, list(grammar.productions(lhs=lhs)))
+               for lhs in OrderedDict((production.lhs(), None) for production
+                                      in grammar.productions())]
+    while pending:
+        lhs, alternatives = pending.pop(0)
+        groups = OrderedDict()
+        for index, production in enumerate(alternatives):
+            rhs = production.rhs()
+            # Productions are grouped on their first symbol and the nodes
+            # they stand for, short ones are left alone
+            key = (rhs[0], _chain(production)) if len(rhs) > 1 else index
+            groups.setdefault(key, []).append(production)
+        for group in groups.values():
+            if len(group) == 1:
+                productions.append(group[0])
+                continue
+            prefix = _common_prefix([production.rhs() for production in
+                                     group])
+            factored = "%s|<%s>" % (lhs, "-".join(prefix))
+            while factored in symbols:
+                factored += "'"
+            symbols.add(factored)
+            total = None
+            if all(production.prob() is not None for production in group):
+                total = sum(production.prob() for production in group)
+            productions.append(DerivedProduction(
+                lhs, prefix + (factored, ), _chain(group[0]), total))
+            pending.append((factored, [
+                DerivedProduction(factored, production.rhs()[len(prefix):],
+                                  (), None if total is None else
+                                  production.prob() / total)
+                for production in group]))
+    return Grammar(grammar.start(), productions)
+
+
+def _common_prefix(sequences):
+    """ Return the longest common prefix of ``sequences``, shorter than each
+        of them
+    """
+    size = min(len(sequence) for sequence in sequences) - 1
+    prefix = []
+    for symbols in zip(*sequences):
+        if len(prefix) == size or len(set(symbols)) > 1:
+            break
+        prefix.append(symbols[0])
+    return tuple(prefix)
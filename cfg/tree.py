@@ -6,25 +6,27 @@
 """
 
 import copy
+from array import array
 from cfg.tokenize import tokenize
+from cfg.grammar import is_terminal
 
 
 class Tree(list):
     """ Tree model
+        Children are the items of the list itself: a node only stores its
+        label on top of them.
     """
 
+    __slots__ = ('_node', )
+
     def __init__(self, node, children=None):
         """ Args:
                 node : node of this ``tree``
                 children: children of this ``tree``:
         """
         self._node = node
-        # TODO: not sure this is the better way
         if children:
-            self._children = tuple(children)
             list.__init__(self, children)
-        else:
-            list.__init__(self, [])
 
     def node(self):
         """ Returns the root node of this ``Tree``
@@ -32,26 +34,48 @@ class Tree(list):
         return self._node
 
     def children(self):
-        # TODO: maybe remove?
-        """ Returns the children of this ``Tree``
+        """ Returns the children of this ``Tree``, as a tuple
         """
-        return self._children
+        return tuple(self)
 
     def __str__(self):
         """ Returns a verbose representation of this ``Tree`` as a string
         """
-        string = "(%s" % self._node
-        if len(self) > 0:
-            for child in self:
-                string += ", "
-                string += "%s" % str(child)
-        string += ")"
-        return string
+        parts = ["(%s" % self._node]
+        stack = [iter(self)]
+        while stack:
+            for child in stack[-1]:
+                if isinstance(child, Tree):
+                    parts.append(", (%s" % child._node)
+                    stack.append(iter(child))
+                    break
+                parts.append(", %s" % child)
+            else:
+                stack.pop()
+                parts.append(")")
+        return "".join(parts)
 
     def __repr__(self):
-        """ Returns a concise representation of this ``Tree`` as a string
+        """ Returns a concise representation of this ``Tree`` as a string,
+            the same as "(%r, %r)" % (node, tuple(children))
         """
-        return "(%r, %r)" % (self._node, tuple(self))
+        parts = ["(%r, (" % (self._node, )]
+        # Frames of (enumerated children, number of children)
+        stack = [(enumerate(self), len(self))]
+        while stack:
+            children, count = stack[-1]
+            for index, child in children:
+                if index:
+                    parts.append(", ")
+                if isinstance(child, Tree):
+                    parts.append("(%r, (" % (child._node, ))
+                    stack.append((enumerate(child), len(child)))
+                    break
+                parts.append(repr(child))
+            else:
+                stack.pop()
+                parts.append(",))" if count == 1 else "))")
+        return "".join(parts)
 
     def __eq__(self, other):
         """ Return True if this ``Tree`` is equal to ``other``.
@@ -138,19 +162,357 @@ class Tree(list):
         return leaves
 
 
+class PersistentTree(object):
+    """ Immutable tree model
+        Replacing a node returns a new tree which only copies the path from
+        the root to this node and shares every other subtree with the
+        original one.
+    """
+
+    __slots__ = ('_node', '_children')
+
+    def __init__(self, node, children=()):
+        """ Args:
+                node : node of this ``tree``
+                children: children of this ``tree``, ``PersistentTree``s or
+                    leaves
+        """
+        self._node = node
+        self._children = tuple(children)
+
+    def node(self):
+        """ Returns the root node of this ``PersistentTree``
+        """
+        return self._node
+
+    def children(self):
+        """ Returns the children of this ``PersistentTree``
+        """
+        return self._children
+
+    def __len__(self):
+        return len(self._children)
+
+    def __iter__(self):
+        return iter(self._children)
+
+    def __str__(self):
+        """ Returns a verbose representation of this ``PersistentTree`` as a
+            string, same as ``Tree``
+        """
+        return str(self.to_tree())
+
+    def __repr__(self):
+        """ Returns a concise representation of this ``PersistentTree`` as a
+            string
+        """
+        return "(%r, %r)" % (self._node, self._children)
+
+    def __eq__(self, other):
+        """ Return True if this ``PersistentTree`` is equal to ``other``.
+        """
+        return (type(self) == type(other) and
+                self._node == other._node and
+                self._children == other._children)
+
+    def __ne__(self, other):
+        """ Return True if this ``PersistentTree`` is not equal to ``other``.
+        """
+        return not self == other
+
+    def __hash__(self):
+        return hash((self._node, self._children))
+
+    def __getitem__(self, index):
+        """ Same indexing as ``Tree``: an integer or a slice index children,
+            a list or tuple of integers is a path from the root
+        """
+        if isinstance(index, (int, slice)):
+            return self._children[index]
+        elif isinstance(index, (list, tuple)):
+            tree = self
+            for i in index:
+                tree = tree._children[i]
+            return tree
+        else:
+            raise TypeError("Index must be integer, or slice/list/tuple of\
+                            integers")
+
+    def replace(self, path, subtree):
+        """ Return a new tree where the node at ``path`` is ``subtree``
+            Only the O(depth) nodes on ``path`` are copied.
+
+            Example:
+                (S, (NP), (VP)).replace((1, ), (VP, (V)))
+                returns (S, (NP), (VP, (V))) sharing (NP)
+        """
+        spine = [self]
+        for i in path[:-1]:
+            spine.append(spine[-1]._children[i])
+        for tree, i in zip(reversed(spine), reversed(path)):
+            children = tree._children
+            subtree = PersistentTree(tree._node, children[:i] + (subtree, ) +
+                                     children[i + 1:])
+        return subtree
+
+    def to_tree(self, labels=None):
+        """ Convert this ``PersistentTree`` to a list based ``Tree``
+            Args:
+                labels: optional sequence mapping the nodes and leaves of
+                    this tree, e.g. symbol ids, to the ones of the new tree
+        """
+        return _convert(self, PersistentTree, Tree, labels)
+
+    @staticmethod
+    def from_tree(tree):
+        """ Convert a list based ``Tree`` to a ``PersistentTree``
+        """
+        return _convert(tree, Tree, PersistentTree)
+
+    def leaves(self):
+        """ Returns the leaves of the tree
+        """
+        return self.to_tree().leaves()
+
+
+def _convert(tree, source, target, labels=None):
+    """ Iteratively rebuild a ``source`` tree as a ``target`` tree, mapping
+        nodes and leaves through ``labels`` if given
+    """
+    # Frames of [tree, converted children]
+    stack = [[tree, []]]
+    while True:
+        node, children = stack[-1]
+        if len(children) < len(node):
+            child = node[len(children)]
+            if isinstance(child, source):
+                stack.append([child, []])
+            else:
+                children.append(child if labels is None else labels[child])
+            continue
+        stack.pop()
+        label = node.node()
+        converted = target(label if labels is None else labels[label],
+                           children)
+        if not stack:
+            return converted
+        stack[-1][1].append(converted)
+
+
+def tree_to_tuples(tree):
+    """ Returns a compact serializable form of a ``Tree`` made of nested
+        tuples
+
+        Example:
+            (S, (NP, (N, 'fall')), (VP, (V, 'leaves'))) ->
+            ("S", ("NP", ("N", "'fall'")), ("VP", ("V", "'leaves'")))
+    """
+    return _convert(tree, Tree, lambda node, children: (node, ) +
+                    tuple(children))
+
+
+def tree_from_tuples(data):
+    """ Returns the ``Tree`` of the nested tuples form of
+        ``tree_to_tuples``
+    """
+    return _convert(_TupleTree(data), _TupleTree, Tree)
+
+
+class _TupleTree(object):
+    """ Read the nested tuples form of a ``Tree`` like a tree
+    """
+
+    __slots__ = ('_data', )
+
+    def __init__(self, data):
+        self._data = data
+
+    def node(self):
+        return self._data[0]
+
+    def __len__(self):
+        return len(self._data) - 1
+
+    def __getitem__(self, index):
+        child = self._data[index + 1]
+        return _TupleTree(child) if isinstance(child, (tuple, list)) \
+            else child
+
+
+class LabelTable(object):
+    """ Map the labels of nodes and leaves to ids and back
+        A table can be shared by the ``FlatTree``s of a corpus, so that each
+        label is only stored once.
+    """
+
+    __slots__ = ('_labels', '_ids')
+
+    def __init__(self, labels=()):
+        """ Args:
+                labels: initial labels, e.g. the symbols of a compiled
+                    grammar so that label ids are symbol ids
+        """
+        self._labels = []
+        self._ids = {}
+        for label in labels:
+            self.label_id(label)
+
+    def label_id(self, label):
+        """ Return the id of ``label``, adding it to the table if needed
+        """
+        label_id = self._ids.get(label)
+        if label_id is None:
+            label_id = self._ids[label] = len(self._labels)
+            self._labels.append(label)
+        return label_id
+
+    def __getitem__(self, label_id):
+        """ Return the label of ``label_id``
+        """
+        return self._labels[label_id]
+
+    def __len__(self):
+        return len(self._labels)
+
+
+class FlatTree(object):
+    """ Tree stored as parallel arrays of ints, one entry per node or leaf
+        in preorder: the id of its label, the index of its parent (-1 for
+        the root) and the span of leaves it covers. A node costs a few
+        machine ints whatever its label.
+
+        Leaves cover a single position and have no children, nodes without
+        children cover none, which keeps the two apart.
+    """
+
+    __slots__ = ('_labels', '_label_ids', '_parents', '_starts', '_ends')
+
+    def __init__(self, labels, label_ids, parents, starts, ends):
+        """ Args:
+                labels: ``LabelTable`` of the label ids
+                label_ids, parents, starts, ends: ``array('i')``s of the
+                    label id, parent index, first leaf and end leaf of each
+                    node, in preorder
+        """
+        self._labels = labels
+        self._label_ids = label_ids
+        self._parents = parents
+        self._starts = starts
+        self._ends = ends
+
+    def labels(self):
+        """ Return the ``LabelTable`` of this ``FlatTree``
+        """
+        return self._labels
+
+    def label_ids(self):
+        """ Return the label id of each node, in preorder
+        """
+        return self._label_ids
+
+    def parents(self):
+        """ Return the index of the parent of each node, -1 for the root
+        """
+        return self._parents
+
+    def spans(self):
+        """ Return the (start, end) span of leaves covered by each node
+        """
+        return list(zip(self._starts, self._ends))
+
+    def is_leaf(self, index):
+        """ Return True if the node at ``index`` is a leaf
+        """
+        return (self._ends[index] - self._starts[index] == 1 and
+                (index + 1 == len(self._parents) or
+                 self._parents[index + 1] != index))
+
+    def to_tree(self):
+        """ Convert this ``FlatTree`` to a ``Tree``
+        """
+        labels, parents = self._labels, self._parents
+        is_leaf = self.is_leaf
+        # Nodes by index, None for leaves: their parents are built first
+        nodes = []
+        for index, label_id in enumerate(self._label_ids):
+            parent = parents[index]
+            if is_leaf(index):
+                nodes.append(None)
+                node = labels[label_id]
+            else:
+                node = Tree(labels[label_id])
+                nodes.append(node)
+            if parent >= 0:
+                nodes[parent].append(node)
+        return nodes[0]
+
+    @staticmethod
+    def from_tree(tree, labels=None):
+        """ Convert a ``Tree`` to a ``FlatTree``
+
+            Args:
+                tree: a ``Tree``
+                labels: ``LabelTable`` to take label ids from, extended with
+                    the labels it lacks. A new one by default.
+        """
+        if labels is None:
+            labels = LabelTable()
+        label_id = labels.label_id
+        label_ids, parents = array('i'), array('i')
+        starts, ends = array('i'), array('i')
+        position = 0
+        stack = [(tree, -1)]
+        while stack:
+            node, parent = stack.pop()
+            index = len(label_ids)
+            parents.append(parent)
+            starts.append(position)
+            if isinstance(node, Tree):
+                label_ids.append(label_id(node.node()))
+                ends.append(position)
+                stack.extend((child, index) for child in reversed(node))
+            else:
+                label_ids.append(label_id(node))
+                position += 1
+                ends.append(position)
+        # Children come after their parent in preorder: going backwards,
+        # the span of every node is complete before it extends its parent's
+        for index in range(len(parents) - 1, 0, -1):
+            parent = parents[index]
+            if ends[index] > ends[parent]:
+                ends[parent] = ends[index]
+        return FlatTree(labels, label_ids, parents, starts, ends)
+
+    def __len__(self):
+        """ Return the number of nodes and leaves
+        """
+        return len(self._label_ids)
+
+    def __eq__(self, other):
+        """ Return True if this ``FlatTree`` is equal to ``other``, i.e. if
+            they have the same labels and shape
+        """
+        if type(self) != type(other) or len(self) != len(other) or \
+                self._parents != other._parents or \
+                self._starts != other._starts or self._ends != other._ends:
+            return False
+        if self._labels is other._labels:
+            return self._label_ids == other._label_ids
+        return all(self._labels[a] == other._labels[b] for a, b in
+                   zip(self._label_ids, other._label_ids))
+
+    def __ne__(self, other):
+        return not self == other
+
+
 def tree_from_string(string, grammar=None):
     """ Returns a tree from a string and a ``grammar``
     """
     if grammar is None:
         assert ValueError("Grammar param can't be none.")
     tokens = tokenize(string)
-    trees = []
-    token = tokens[0]
-    token = "'%s'" % token
-    for production in grammar.productions():
-        if token in production.rhs():
-            trees.append(Tree(node=production))
-    return trees
+    return [Tree(node=production) for production in
+            grammar.lexicon(tokens[0])]
 
 
 def subtree_for_production(production, grammar):
@@ -175,8 +537,7 @@ def tree_from_production(production):
     """
     children = []
     for rhs in production.rhs():
-        # TODO: clear this hack by creating a NonTerminal class
-        if rhs[0] is "\'":
+        if is_terminal(rhs):
             children.append(rhs)
         else:
             children.append(Tree(rhs, []))
@@ -3,14 +3,13 @@
 # Author: Florent Piétot <florent.pietot@gmail.com>
 
 from cfg.grammar import Grammar
-from cfg.parse import TopDownParser
+from cfg.parse import EarleyParser
 from cfg.tokenize import tokenize
 
 if __name__ == "__main__":
 
     grammar_as_string = """
-        S0 -> S | S C S
-        S -> NP VP
+        S -> S C S | NP VP
         NP -> N | D N | Adj N | D Adj N
         VP -> V NP | V | V NP NP
         N -> 'fall' | 'spring' | 'leaves' | 'dog' | 'cat'
@@ -29,16 +28,15 @@ if __name__ == "__main__":
     ]
 
     grammar = Grammar.parse_grammar(grammar_as_string)
-    parser = TopDownParser(grammar)
-    tokens = tokenize(sentences[4])
+    parser = EarleyParser(grammar)
     for sentence in sentences:
         tokens = tokenize(sentence)
-        parse = parser.parse(tokens)
-        results = [p for p in parse]
+        # Parses are packed once, counted and unpacked from the same forest
+        forest = parser.parse_forest(tokens)
         print("==========================")
         print(sentence)
         print("--------------------------")
-        for index, parse in enumerate(results):
-            print("Parse #%d:\n%s" % (index, parse))
+        for index, tree in enumerate(forest.trees()):
+            print("Parse #%d:\n%s" % (index, tree))
         print("--------------------------")
-        print("Count: %d" % len(results))
+        print("Count: %d" % forest.count())
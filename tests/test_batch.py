@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+#
+# Author: Florent Piétot <florent.pietot@gmail.com>
+
+""" Tests for batch.py module
+"""
+
+import os
+import unittest
+from cfg.grammar import Grammar
+from cfg.parse import TopDownParser, EarleyParser
+from cfg.batch import BatchResult, parse_many
+from cfg.serialize import tree_to_json
+from cfg.tree import Tree, tree_to_tuples, tree_from_tuples
+
+
+class DyingParser(object):
+    """ Parser whose process dies on the sentence "die" """
+
+    def __init__(self, parser):
+        self._parser = parser
+
+    def parse(self, sentence):
+        if sentence == "die":
+            os._exit(1)
+        return self._parser.parse(sentence)
+
+
+class ChainParser(object):
+    """ Parser of S -> 'a' S | 'a', without any search """
+
+    def parse(self, sentence):
+        tree = Tree("S", ["'a'"])
+        for _ in sentence.split()[1:]:
+            tree = Tree("S", ["'a'", tree])
+        yield (tree, [])
+
+
+class TestParseMany(unittest.TestCase):
+
+    def setUp(self):
+        grammar_as_string = """
+            S -> NP VP
+            NP -> N | D N | Adj N | D Adj N
+            VP -> V NP | V |V NP NP
+            N -> 'fall' | 'spring' | 'leaves'
+            V -> 'spring' | 'leaves' | 'fall'
+            D -> 'the'
+            Adj -> 'fall' | 'spring' | 'purple'
+        """
+        self.grammar = Grammar.parse_grammar(grammar_as_string)
+        self.parser = TopDownParser(self.grammar)
+        self.sentences = ["fall leaves fall", "hello world", "spring leaves",
+                          "the fall leaves fall spring leaves", "fall"] * 3
+
+    def expected(self):
+        return [BatchResult("complete", [tree_to_tuples(tree) for tree, _ in
+                                         self.parser.parse(sentence)], None)
+                for sentence in self.sentences]
+
+    def test_in_process(self):
+        results = self.parser.parse_many(self.sentences, chunk_size=4)
+        self.assertEqual(self.expected(), list(results))
+
+    def test_workers_preserve_order(self):
+        results = self.parser.parse_many(self.sentences, workers=2,
+                                         chunk_size=2)
+        self.assertEqual(self.expected(), list(results))
+
+    def test_error(self):
+        results = list(self.parser.parse_many(["fall", ""]))
+        self.assertEqual("complete", results[0].status)
+        self.assertEqual("error", results[1].status)
+        self.assertIsNotNone(results[1].error)
+
+    def test_timeout(self):
+        """ Catalan(19) parses can't be enumerated within the timeout """
+        grammar = Grammar.parse_grammar("S -> S S | 'a'")
+        parser = TopDownParser(grammar, iterative=True)
+        sentences = ["a " * 20, "a a"]
+        for workers in [1, 2]:
+            results = list(parser.parse_many(sentences, workers=workers,
+                                             timeout=0.2))
+            self.assertEqual("timeout", results[0].status)
+            self.assertGreater(len(results[0].parses), 0)
+            self.assertEqual(BatchResult("complete", [
+                ("S", ("S", "'a'"), ("S", "'a'"))], None), results[1])
+
+    def test_deep_parses(self):
+        """ Trees deeper than the recursion limit come back from workers """
+        parser = ChainParser()
+        sentences = ["a " * 1500, "a a"]
+        expected = [tree_to_json(tree) for sentence in sentences
+                    for tree, _ in parser.parse(sentence)]
+        results = list(parse_many(parser, sentences, workers=2))
+        self.assertEqual(["complete", "complete"],
+                         [result.status for result in results])
+        self.assertEqual(expected, [tree_to_json(tree_from_tuples(parse))
+                                    for result in results
+                                    for parse in result.parses])
+
+    def test_dead_worker(self):
+        """ Sentences of a dead worker fail, the next ones are parsed """
+        parser = DyingParser(self.parser)
+        results = list(parse_many(parser, ["fall", "die", "spring leaves"],
+                                  workers=2, chunk_size=1, max_pending=1))
+        self.assertEqual(["complete", "error", "complete"],
+                         [result.status for result in results])
+        self.assertEqual(self.expected()[2], results[2])
+
+    def test_other_parsers(self):
+        parser = EarleyParser(self.grammar)
+        results = list(parser.parse_many(self.sentences, workers=2))
+        self.assertEqual([len(result.parses) for result in self.expected()],
+                         [len(result.parses) for result in results])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+#
+# Author: Florent Piétot <florent.pietot@gmail.com>
+
+""" Tests for the benchmarks package
+"""
+
+import unittest
+from cfg.grammar import Grammar
+from cfg.parse import EarleyParser
+from cfg.tokenize import tokenize
+from benchmarks.generate import synthetic_grammar, synthetic_sentences
+from benchmarks.run import cases, case_name, run, compare
+
+
+class TestSyntheticGrammar(unittest.TestCase):
+
+    def test_size(self):
+        grammar = Grammar.parse_grammar(synthetic_grammar(
+            lexicon_size=50, fan_out=4, ambiguity=2, depth=2))
+        self.assertEqual("S", grammar.start())
+        self.assertEqual(4, len(grammar.productions("X1_0")))
+        self.assertEqual(2, len(grammar.lexicon("w7")))
+        self.assertEqual(2 + 4 + 4 * 2 * 4 + 50 * 2,
+                         len(grammar.productions()))
+
+    def test_deterministic(self):
+        self.assertEqual(synthetic_grammar(seed=1), synthetic_grammar(seed=1))
+
+    def test_fan_out(self):
+        with self.assertRaises(ValueError):
+            synthetic_grammar(fan_out=1)
+
+
+class TestSyntheticSentences(unittest.TestCase):
+
+    def setUp(self):
+        self.grammar = Grammar.parse_grammar(synthetic_grammar(
+            lexicon_size=20, fan_out=3, depth=2))
+
+    def test_sentences(self):
+        sentences = synthetic_sentences(self.grammar, 7, 5)
+        self.assertEqual(5, len(sentences))
+        parser = EarleyParser(self.grammar)
+        for sentence in sentences:
+            self.assertEqual(7, len(tokenize(sentence)))
+            self.assertLess(0, parser.parse_forest(sentence).count())
+
+    def test_no_sentence_of_length(self):
+        grammar = Grammar.parse_grammar("S -> 'a' 'a'")
+        with self.assertRaises(ValueError):
+            synthetic_sentences(grammar, 3, 1)
+
+
+class TestRun(unittest.TestCase):
+
+    def test_engines_agree(self):
+        grid = cases(lexicon_sizes=[20], lengths=[4])
+        results = run(grid, engines=["topdown", "cky", "earley"],
+                      sentences=2, repeat=1)
+        measures = results[case_name(grid[0])]
+        self.assertEqual(1, len(set(measure["count"] for measure in
+                                    measures.values())))
+        for measure in measures.values():
+            self.assertLess(0, measure["memory"])
+
+    def test_compare(self):
+        baseline = {"case": {"cky": {"time": 1.0, "memory": 100}}}
+        results = {"case": {"cky": {"time": 2.0, "memory": 100},
+                            "earley": {"time": 9.0, "memory": 900}}}
+        self.assertEqual([("case", "cky", "time", 1.0, 2.0)],
+                         compare(results, baseline, threshold=1.5))
+        self.assertEqual([], compare(results, baseline, threshold=2.5))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+#
+# Author: Florent Piétot <florent.pietot@gmail.com>
+
+""" Tests for cache.py module
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from cfg.cache import load_grammar, CACHE_SUFFIX
+from cfg.grammar import Grammar
+from cfg.parse import TopDownParser, EarleyParser
+
+GRAMMAR = """
+    S -> NP VP
+    NP -> N | D N | Adj N | D Adj N
+    VP -> V NP | V |V NP NP
+    N -> 'fall' | 'spring' | 'leaves'
+    V -> 'spring' | 'leaves' | 'fall'
+    D -> 'the'
+    Adj -> 'fall' | 'spring' | 'purple'
+"""
+
+
+class TestLoadGrammar(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "grammar.txt")
+        self.write(GRAMMAR)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, text):
+        with open(self.path, "w") as grammar_file:
+            grammar_file.write(text)
+
+    def test_writes_cache(self):
+        grammar = load_grammar(self.path)
+        self.assertTrue(os.path.exists(self.path + CACHE_SUFFIX))
+        self.assertEqual(str(Grammar.parse_grammar(GRAMMAR)), str(grammar))
+
+    def test_no_cache(self):
+        load_grammar(self.path, cache=False)
+        self.assertFalse(os.path.exists(self.path + CACHE_SUFFIX))
+
+    def test_cached_grammar(self):
+        expected = Grammar.parse_grammar(GRAMMAR)
+        load_grammar(self.path)
+        grammar = load_grammar(self.path)
+        compiled, expected_compiled = grammar.compile(), expected.compile()
+        self.assertEqual(expected_compiled.symbols, compiled.symbols)
+        self.assertEqual(expected_compiled.terminal, compiled.terminal)
+        self.assertEqual(expected_compiled.lhs_index, compiled.lhs_index)
+        self.assertEqual(expected_compiled.lexicon, compiled.lexicon)
+        self.assertEqual(expected.lexicon("fall"), grammar.lexicon("fall"))
+        self.assertEqual(list(expected_compiled.productions),
+                         list(compiled.productions))
+        self.assertEqual(expected.productions("NP"), grammar.productions("NP"))
+        self.assertEqual((), grammar.productions("X"))
+        self.assertEqual(expected.productions(), grammar.productions())
+        self.assertEqual(expected.first("S"), grammar.first("S"))
+
+    def test_cached_analysis(self):
+        """ The analysis of the grammar is read back with it """
+        expected = Grammar.parse_grammar(GRAMMAR).compile().analyze()
+        load_grammar(self.path)
+        compiled = load_grammar(self.path).compile()
+        for name in ("nullable", "min_yield", "production_nullable",
+                     "production_min_yield", "preterminal"):
+            self.assertEqual(list(getattr(expected, name)),
+                             list(getattr(compiled, name)))
+        for name in ("first", "production_first"):
+            self.assertEqual([set(items) for items in getattr(expected, name)],
+                             [set(items) for items in getattr(compiled, name)])
+        self.assertIn(compiled.symbol_id("'fall'"),
+                      compiled.first[compiled.start])
+        self.assertNotIn(compiled.symbol_id("'the'"),
+                         compiled.first[compiled.symbol_id("VP")])
+
+    def test_cached_infinite_yield(self):
+        self.write("S -> 'x' | X\nX -> X 'y'\n")
+        load_grammar(self.path)
+        grammar = load_grammar(self.path)
+        self.assertEqual(float('inf'), grammar.min_yield("X"))
+        self.assertEqual(1, grammar.min_yield("S"))
+
+    def test_parse_with_cached_grammar(self):
+        expected = Grammar.parse_grammar(GRAMMAR)
+        load_grammar(self.path)
+        grammar = load_grammar(self.path)
+        sentence = "the fall leaves fall spring leaves"
+        for parser in (TopDownParser, EarleyParser):
+            self.assertEqual(list(parser(expected).parse(sentence)),
+                             list(parser(grammar).parse(sentence)))
+
+    def test_add_productions_to_cached_grammar(self):
+        load_grammar(self.path)
+        grammar = load_grammar(self.path)
+        grammar.add_productions(Grammar.parse_grammar(
+            "N -> 'dog'").productions())
+        self.assertEqual(4, len(grammar.productions("N")))
+        parses = list(TopDownParser(grammar).parse("the dog fall"))
+        self.assertEqual(1, len(parses))
+
+    def test_probabilities(self):
+        self.write("S -> A [0.25] | 'x'\nA -> 'x' [1.0]\n")
+        load_grammar(self.path)
+        grammar = load_grammar(self.path)
+        self.assertEqual([0.25, None, 1.0],
+                         [production.prob() for production in
+                          grammar.productions()])
+
+    def test_no_productions(self):
+        self.write("# nothing\n")
+        load_grammar(self.path)
+        grammar = load_grammar(self.path)
+        self.assertIsNone(grammar.start())
+        self.assertIsNotNone(grammar.compile())
+        self.assertEqual([], list(TopDownParser(grammar).parse("fall")))
+
+    def test_stale_cache(self):
+        load_grammar(self.path)
+        self.write(GRAMMAR + "N -> 'dog'\n")
+        grammar = load_grammar(self.path)
+        self.assertEqual(4, len(grammar.productions("N")))
+        # The cache was rewritten for the new content
+        self.assertEqual(4, len(load_grammar(self.path).productions("N")))
+
+    def test_corrupted_cache(self):
+        with open(self.path + CACHE_SUFFIX, "wb") as cache_file:
+            cache_file.write(b"CFGC garbage")
+        self.assertEqual(str(Grammar.parse_grammar(GRAMMAR)),
+                         str(load_grammar(self.path)))
+
+
+if __name__ == "__main__":
+    unittest.main()
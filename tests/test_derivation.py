@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+#
+# Author: Florent Piétot <florent.pietot@gmail.com>
+
+""" Tests for derivation.py module
+"""
+
+import unittest
+from cfg.tree import Tree
+from cfg.grammar import Grammar, Production
+from cfg.derivation import Derivation
+
+
+class TestDerivation(unittest.TestCase):
+
+    def setUp(self):
+        grammar_as_string = """
+            S -> NP VP
+            NP -> N | D N
+            VP -> V | V NP
+            N -> 'fall' | 'leaves'
+            V -> 'fall' | 'leaves'
+            D -> 'the'
+        """
+        self.compiled = Grammar.parse_grammar(grammar_as_string).compile()
+        # the fall leaves: S -> NP VP, NP -> D N, D -> 'the', N -> 'fall',
+        # VP -> V, V -> 'leaves'
+        self.derivation = Derivation(self.compiled, [0, 2, 9, 5, 3, 8],
+                                     [0, 0, 0, 1, 2, 2])
+
+    def test_productions(self):
+        res = [Production("S", ["NP", "VP"]), Production("NP", ["D", "N"]),
+               Production("D", ["'the'"]), Production("N", ["'fall'"]),
+               Production("VP", ["V"]), Production("V", ["'leaves'"])]
+        self.assertEqual(res, self.derivation.productions())
+        self.assertEqual(6, len(self.derivation))
+
+    def test_spans(self):
+        res = [(0, 3), (0, 2), (0, 1), (1, 2), (2, 3), (2, 3)]
+        self.assertEqual(res, self.derivation.spans())
+
+    def test_tree(self):
+        res = Tree("S", [Tree("NP", [Tree("D", ["'the'"]),
+                                     Tree("N", ["'fall'"])]),
+                         Tree("VP", [Tree("V", ["'leaves'"])])])
+        self.assertEqual(res, self.derivation.tree())
+
+    def test_deep_tree(self):
+        """ Trees are built without recursion """
+        compiled = Grammar.parse_grammar("S -> 'a' S | 'a'").compile()
+        derivation = Derivation(compiled, [0] * 5000 + [1], range(5001))
+        tree, depth = derivation.tree(), 1
+        while len(tree) == 2:
+            tree, depth = tree[1], depth + 1
+        self.assertEqual(5001, depth)
+        self.assertEqual((0, 5001), derivation.spans()[0])
+
+    def test_eq(self):
+        other = Derivation(self.compiled, [0, 2, 9, 5, 3, 8],
+                           [0, 0, 0, 1, 2, 2])
+        self.assertEqual(self.derivation, other)
+        self.assertEqual(hash(self.derivation), hash(other))
+        self.assertNotEqual(self.derivation,
+                            Derivation(self.compiled, [0, 2, 9, 5, 3, 7],
+                                       [0, 0, 0, 1, 2, 2]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+#
+# Author: Florent Piétot <florent.pietot@gmail.com>
+
+""" Tests for forest.py module
+"""
+
+import unittest
+from cfg.tree import Tree
+from cfg.grammar import Production, Grammar
+from cfg.forest import Forest, ForestNode
+from cfg.parse import CKYParser, EarleyParser
+
+
+class TestForestNode(unittest.TestCase):
+
+    def setUp(self):
+        self.fall = ForestNode("N", 0, 1)
+        self.fall.add(Production("N", ["'fall'"]), ["'fall'"])
+        self.node = ForestNode("NP", 0, 1)
+        self.node.add(Production("NP", ["N"]), [self.fall])
+        self.node.add(Production("NP", ["'fall'"]), ["'fall'"])
+
+    def test_alternatives(self):
+        res = [(Production("NP", ["N"]), (self.fall, )),
+               (Production("NP", ["'fall'"]), ("'fall'", ))]
+        self.assertEqual(res, self.node.alternatives())
+
+    def test_count(self):
+        self.assertEqual(2, self.node.count())
+
+    def test_repr(self):
+        self.assertEqual("(NP, 0, 1)", repr(self.node))
+
+
+class TestForest(unittest.TestCase):
+
+    def setUp(self):
+        grammar_as_string = """
+            S -> S C S | NP VP
+            NP -> N
+            VP -> V NP
+            N -> 'fall'
+            V -> 'leaves'
+            C -> 'and'
+        """
+        self.grammar = Grammar.parse_grammar(grammar_as_string)
+        self.tokens = " and ".join(["fall leaves fall"] * 5)
+
+    def test_no_parse(self):
+        forest = EarleyParser(self.grammar).parse_forest("fall fall")
+        self.assertEqual(0, forest.count())
+        self.assertEqual([], [tree for tree in forest])
+        with self.assertRaises(IndexError):
+            forest.tree(0)
+
+    def test_count(self):
+        """ Number of ways to bracket 5 sentences: 4th Catalan number """
+        for parser in [CKYParser(self.grammar), EarleyParser(self.grammar)]:
+            self.assertEqual(14, parser.parse_forest(self.tokens).count())
+
+    def test_count_without_unpacking(self):
+        """ 30 coordinated sentences have 29th Catalan number parses """
+        tokens = " and ".join(["fall leaves fall"] * 30)
+        forest = EarleyParser(self.grammar).parse_forest(tokens)
+        self.assertEqual(1002242216651368, forest.count())
+
+    def test_trees_are_lazy_parses(self):
+        parser = EarleyParser(self.grammar)
+        trees = list(parser.parse_forest(self.tokens).trees())
+        self.assertCountEqual([tree for tree, _ in parser.parse(self.tokens)],
+                              trees)
+        self.assertEqual(14, len(trees))
+
+    def test_kth_tree(self):
+        for parser in [CKYParser(self.grammar), EarleyParser(self.grammar)]:
+            forest = parser.parse_forest(self.tokens)
+            for k, tree in enumerate(forest.trees()):
+                self.assertEqual(tree, forest.tree(k))
+            with self.assertRaises(IndexError):
+                forest.tree(14)
+
+    def test_kth_tree_restores_original_shape(self):
+        forest = CKYParser(self.grammar).parse_forest("fall leaves fall")
+        res = Tree("S", [Tree("NP", [Tree("N", ["'fall'"])]),
+                         Tree("VP", [Tree("V", ["'leaves'"]),
+                                     Tree("NP", [Tree("N", ["'fall'"])])])])
+        self.assertEqual(res, forest.tree(0))
+
+
+class TestCycles(unittest.TestCase):
+
+    def test_cycles(self):
+        """ A -> B | 'x', B -> A over the same span """
+        a = ForestNode("A", 0, 1)
+        b = ForestNode("B", 0, 1)
+        a.add(Production("A", ["B"]), [b])
+        a.add(Production("A", ["'x'"]), ["'x'"])
+        b.add(Production("B", ["A"]), [a])
+        forest = Forest(a)
+        self.assertEqual(1, forest.count())
+        self.assertEqual(Tree("A", ["'x'"]), forest.tree(0))
+        self.assertEqual(2, len(a.alternatives()))
+
+    def test_shared_cyclic_nodes(self):
+        """ Cycles are cut per path: B -> A is kept under S -> B """
+        grammar = Grammar.parse_grammar("""
+            S -> A | B
+            A -> B | 'x'
+            B -> A | 'x'
+        """)
+        res = [Tree("S", [Tree("A", [Tree("B", ["'x'"])])]),
+               Tree("S", [Tree("A", ["'x'"])]),
+               Tree("S", [Tree("B", [Tree("A", ["'x'"])])]),
+               Tree("S", [Tree("B", ["'x'"])])]
+        for parser in [CKYParser(grammar), EarleyParser(grammar)]:
+            forest = parser.parse_forest("x")
+            self.assertEqual(4, forest.count())
+            self.assertCountEqual(res, list(forest.trees()))
+            self.assertEqual(list(forest.trees()),
+                             [forest.tree(k) for k in range(4)])
+
+    def test_deep_forest(self):
+        """ Unpacking shouldn't hit the recursion limit """
+        grammar = Grammar.parse_grammar("S -> 'a' | 'a' S")
+        for parser in [CKYParser(grammar), EarleyParser(grammar)]:
+            trees = [tree for tree, _ in parser.parse(["a"] * 400)]
+            self.assertEqual(1, len(trees))
+            depth, tree = 0, trees[0]
+            while len(tree) == 2:
+                tree, depth = tree[1], depth + 1
+            self.assertEqual(399, depth)
+
+
+if __name__ == "__main__":
+    unittest.main()
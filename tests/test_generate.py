@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+#
+# Author: Florent Piétot <florent.pietot@gmail.com>
+
+""" Tests for generate.py module
+"""
+
+import io
+import os
+import tempfile
+import unittest
+from collections import Counter
+from cfg.grammar import Grammar
+from cfg.parse import EarleyParser
+from cfg.generate import SentenceGenerator, write_sentences, main
+
+GRAMMAR = """
+    S -> NP VP
+    NP -> N | D N | NP PP
+    VP -> V | V NP | VP PP
+    PP -> P NP
+    N -> 'fall' | 'leaves' | 'spring'
+    V -> 'fall' | 'leaves'
+    D -> 'the'
+    P -> 'in'
+"""
+
+
+class TestSentenceGenerator(unittest.TestCase):
+
+    def setUp(self):
+        self.grammar = Grammar.parse_grammar(GRAMMAR)
+        self.parser = EarleyParser(self.grammar)
+        self.generator = SentenceGenerator(self.grammar, 8, seed=0)
+
+    def test_count(self):
+        self.assertEqual(0, self.generator.count(1))
+        # N V and N N: 3 * 2 sentences of a single derivation each
+        self.assertEqual(6, self.generator.count(2))
+        self.assertEqual(3, self.generator.count(1, "N"))
+        self.assertEqual(0, self.generator.count(1, "'fall'"))
+        self.assertEqual(0, self.generator.count(1, "X"))
+        self.assertRaises(ValueError, self.generator.count, 9)
+
+    def test_count_matches_parses(self):
+        # Every derivation of a length is a parse of one of its sentences
+        generator = SentenceGenerator(self.grammar, 5)
+        words = ["fall", "leaves", "spring", "the", "in"]
+        for length in range(1, 4):
+            sentences = [[]]
+            for _ in range(length):
+                sentences = [sentence + [word] for sentence in sentences
+                             for word in words]
+            total = sum(self.parser.count_parses(sentence)
+                        for sentence in sentences)
+            self.assertEqual(total, generator.count(length))
+
+    def test_sample(self):
+        for length in range(2, 9):
+            sentence = self.generator.sample(length)
+            self.assertEqual(length, len(sentence))
+            self.assertTrue(self.parser.recognize(sentence))
+        self.assertRaises(ValueError, self.generator.sample, 1)
+
+    def test_uniform(self):
+        generator = SentenceGenerator(Grammar.parse_grammar("""
+            S -> A | B
+            A -> 'x' | 'y' | 'z'
+            B -> 'x' 'x'
+        """), 2, seed=0)
+        counts = Counter(" ".join(generator.sample(1))
+                         for _ in range(3000))
+        self.assertEqual(set(["x", "y", "z"]), set(counts))
+        for count in counts.values():
+            self.assertTrue(800 < count < 1200)
+
+    def test_seed(self):
+        first = list(SentenceGenerator(self.grammar, 8, seed=3)
+                     .sentences(6, 20))
+        second = list(SentenceGenerator(self.grammar, 8, seed=3)
+                      .sentences(6, 20))
+        self.assertEqual(first, second)
+        self.assertEqual(20, len(first))
+
+    def test_empty_productions(self):
+        generator = SentenceGenerator(Grammar.parse_grammar("""
+            S -> A 'x' A
+            A -> 'a' |
+        """), 3)
+        self.assertEqual(1, generator.count(1))
+        self.assertEqual(2, generator.count(2))
+        self.assertEqual(["x"], generator.sample(1))
+
+    def test_cycle(self):
+        grammar = Grammar.parse_grammar("""
+            S -> A
+            A -> S | 'x'
+        """)
+        self.assertRaises(ValueError, SentenceGenerator, grammar, 2)
+
+    def test_write_sentences(self):
+        output = io.StringIO()
+        write_sentences(self.generator, [3, 5], 10, output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual([3] * 10 + [5] * 10,
+                         [len(line.split()) for line in lines])
+
+
+class TestMain(unittest.TestCase):
+
+    def test_files(self):
+        directory = tempfile.mkdtemp()
+        paths = [os.path.join(directory, name) for name in
+                 ("grammar.txt", "sentences.txt")]
+        with open(paths[0], "w") as grammar_file:
+            grammar_file.write(GRAMMAR)
+        self.assertEqual(0, main([paths[0], "--length", "4", "--count", "7",
+                                  "-o", paths[1], "--seed", "1",
+                                  "--no-cache"]))
+        with open(paths[1]) as output:
+            lines = output.read().splitlines()
+        self.assertEqual([4] * 7, [len(line.split()) for line in lines])
+        for path in paths:
+            os.remove(path)
+        os.rmdir(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
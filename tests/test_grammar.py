@@ -7,7 +7,7 @@
 
 import unittest
 import copy
-from cfg.grammar import Production, Grammar
+from cfg.grammar import Production, Grammar, CompiledGrammar
 
 
 class TestProduction(unittest.TestCase):
@@ -69,6 +69,22 @@ class TestParseProduction(unittest.TestCase):
         ]
         self.assertEqual(res, Production.parse_production(self.line))
 
+    def test_parse_probabilities(self):
+        productions = Production.parse_production(
+            "NP -> D N [0.4] | N [ 0.6 ]|'fall'")
+        self.assertEqual([Production("NP", ["D", "N"]),
+                          Production("NP", ["N"]),
+                          Production("NP", ["'fall'"])], productions)
+        self.assertEqual([0.4, 0.6, None],
+                         [production.prob() for production in productions])
+        self.assertEqual("NP -> D N [0.4]", str(productions[0]))
+
+    def test_invalid_probabilities(self):
+        for line in ("NP -> N [1.5]", "NP -> N [0]", "NP -> N [high]",
+                     "NP -> N [0.5] [0.5]", "NP -> N [0.5"):
+            with self.assertRaises(ValueError):
+                Production.parse_production(line)
+
 
 class TestGrammar(unittest.TestCase):
 
@@ -124,9 +140,48 @@ class TestGrammarProductions(unittest.TestCase):
                               of this``grammar``"))
 
     def test_standard_use_case(self):
-        res = self.productions[:2]
-        self.assertIsInstance(self.grammar.productions(lhs="NP"), list)
-        self.assertCountEqual(res, self.grammar.productions(lhs="NP"))
+        res = tuple(self.productions[:2])
+        self.assertIsInstance(self.grammar.productions(lhs="NP"), tuple)
+        self.assertEqual(res, self.grammar.productions(lhs="NP"))
+
+    def test_unknown_lhs(self):
+        self.assertEqual((), self.grammar.productions(lhs="VP"))
+
+
+class TestGrammarAddProductions(unittest.TestCase):
+    """ Test case for add_productions(self, productions)
+    """
+
+    def setUp(self):
+        self.productions = [
+            Production("NP", ["N"]),
+            Production("N", ["'fall'"])
+        ]
+        self.grammar = Grammar("NP", self.productions)
+        self.new_productions = [
+            Production("NP", ["D", "N"]),
+            Production("D", ["'the'"])
+        ]
+
+    def test_productions(self):
+        self.grammar.productions(lhs="NP")
+        self.grammar.add_productions(self.new_productions)
+        self.assertEqual(self.productions + self.new_productions,
+                         self.grammar.productions())
+        res = (Production("NP", ["N"]), Production("NP", ["D", "N"]))
+        self.assertEqual(res, self.grammar.productions(lhs="NP"))
+        self.assertEqual((Production("D", ["'the'"]), ),
+                         self.grammar.productions(lhs="D"))
+
+    def test_compiled(self):
+        """ The compiled form is updated in place """
+        compiled = self.grammar.compile()
+        self.grammar.add_productions(self.new_productions)
+        self.assertIs(compiled, self.grammar.compile())
+        self.assertEqual(4, len(compiled))
+        self.assertEqual([0, 2], compiled.lhs_index[compiled.symbol_id("NP")])
+        self.assertEqual([compiled.symbol_id("'the'")],
+                         compiled.token_ids(["the"]))
 
 
 class TestGrammarCalculateIndexes(unittest.TestCase):
@@ -205,6 +260,142 @@ class TestParseGrammar(unittest.TestCase):
         self.assertEqual(str(res),
                          str(Grammar.parse_grammar(self.grammar_as_string)))
 
+    def test_parse_lines(self):
+        """ parse_lines should read the same grammar from an iterable of lines
+        """
+        lines = iter(self.grammar_as_string.split("\n"))
+        self.assertEqual(str(Grammar.parse_grammar(self.grammar_as_string)),
+                         str(Grammar.parse_lines(lines)))
+
+
+class TestCompiledGrammar(unittest.TestCase):
+
+    def setUp(self):
+        self.grammar = Grammar.parse_grammar("""
+        NP -> N | D N
+        N -> 'fall' | 'spring'
+        D -> 'the'
+        """)
+        self.compiled = self.grammar.compile()
+
+    def test_is_cached(self):
+        self.assertIsInstance(self.compiled, CompiledGrammar)
+        self.assertIs(self.compiled, self.grammar.compile())
+
+    def test_symbols(self):
+        """ Symbols are interned to dense ids in order of appearance """
+        res = ["NP", "N", "D", "'fall'", "'spring'", "'the'"]
+        self.assertEqual(res, self.compiled.symbols)
+        self.assertEqual(3, self.compiled.symbol_id("'fall'"))
+        self.assertIsNone(self.compiled.symbol_id("VP"))
+        self.assertEqual(0, self.compiled.start)
+
+    def test_terminal(self):
+        res = [0, 0, 0, 1, 1, 1]
+        self.assertEqual(res, list(self.compiled.terminal))
+
+    def test_productions(self):
+        """ Productions are packed in flat arrays """
+        self.assertEqual(5, len(self.compiled))
+        self.assertEqual([0, 0, 1, 1, 2], list(self.compiled.lhs))
+        self.assertEqual([0, 1, 3, 4, 5, 6], list(self.compiled.rhs_offsets))
+        self.assertEqual([1, 2, 1, 3, 4, 5], list(self.compiled.rhs))
+        self.assertEqual([2, 1], list(self.compiled.production_rhs(1)))
+        self.assertEqual(Production("NP", ["D", "N"]),
+                         self.compiled.productions[1])
+
+    def test_probs(self):
+        compiled = Grammar.parse_grammar(
+            "S -> A [0.25] | 'x'\nA -> 'x'").compile()
+        self.assertEqual(0.25, compiled.probs[0])
+        self.assertEqual(0.25, compiled.productions[0].prob())
+        self.assertIsNone(compiled.productions[1].prob())
+
+    def test_token_ids(self):
+        self.assertEqual([5, 3, -1],
+                         self.compiled.token_ids(["the", "fall", "dog"]))
+
+    def test_no_productions(self):
+        """ A grammar without productions has no start symbol """
+        compiled = Grammar.parse_grammar("# nothing").compile()
+        self.assertIsNone(compiled.start)
+        self.assertEqual([], compiled.symbols)
+        self.assertEqual(0, len(compiled))
+
+
+class TestGrammarAnalysis(unittest.TestCase):
+    """ Test case for nullable symbols, FIRST sets and minimum yields
+    """
+
+    def setUp(self):
+        self.grammar = Grammar.parse_grammar("""
+        S -> NP VP
+        NP -> D N | N
+        D -> 'the' |
+        N -> 'fall' | N N
+        VP -> 'leaves'
+        X -> X 'x'
+        """)
+
+    def test_nullable(self):
+        self.assertEqual(set(["D"]), self.grammar.nullable())
+
+    def test_first(self):
+        self.assertEqual(set(["'the'", "'fall'"]), self.grammar.first("NP"))
+        self.assertEqual(set(["'the'", "'fall'"]), self.grammar.first("S"))
+        self.assertEqual(set(["'leaves'"]), self.grammar.first("VP"))
+        self.assertEqual(set(), self.grammar.first("Y"))
+
+    def test_min_yield(self):
+        self.assertEqual(2, self.grammar.min_yield("S"))
+        self.assertEqual(1, self.grammar.min_yield("NP"))
+        self.assertEqual(0, self.grammar.min_yield("D"))
+        self.assertEqual(float('inf'), self.grammar.min_yield("X"))
+
+    def test_updated_by_add_productions(self):
+        self.grammar.add_productions([Production("VP", [])])
+        self.assertEqual(set(["D", "VP"]), self.grammar.nullable())
+        self.assertEqual(1, self.grammar.min_yield("S"))
+
+
+class TestGrammarLexicon(unittest.TestCase):
+    """ Test case for the word -> preterminal productions index
+    """
+
+    def setUp(self):
+        self.grammar = Grammar.parse_grammar("""
+        S -> NP VP
+        NP -> D N | N
+        D -> 'the'
+        N -> 'fall' | 'leaves'
+        V -> 'fall' | 'leaves'
+        VP -> V | 'leaves' NP
+        """)
+
+    def test_lexicon(self):
+        self.assertEqual((Production("N", ["'fall'"]),
+                          Production("V", ["'fall'"])),
+                         self.grammar.lexicon("fall"))
+        # VP -> 'leaves' NP is not a preterminal production
+        self.assertEqual((Production("N", ["'leaves'"]),
+                          Production("V", ["'leaves'"])),
+                         self.grammar.lexicon("leaves"))
+
+    def test_unknown_word(self):
+        self.assertEqual((), self.grammar.lexicon("dog"))
+
+    def test_updated_by_add_productions(self):
+        self.grammar.add_productions([Production("N", ["'dog'"])])
+        self.assertEqual((Production("N", ["'dog'"]), ),
+                         self.grammar.lexicon("dog"))
+
+    def test_preterminal(self):
+        compiled = self.grammar.compile().analyze()
+        self.assertEqual(set(["D", "N", "V"]),
+                         set(symbol for symbol, preterminal in
+                             zip(compiled.symbols, compiled.preterminal)
+                             if preterminal))
+
 
 if __name__ == "__main__":
     unittest.main()
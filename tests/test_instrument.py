@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+#
+# Author: Florent Piétot <florent.pietot@gmail.com>
+
+""" Tests for instrument.py module
+"""
+
+import contextlib
+import io
+import pickle
+import unittest
+from cfg.grammar import Grammar
+from cfg.parse import TopDownParser
+from cfg.instrument import Instrumentation
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.grammar = Grammar.parse_grammar("""
+            S -> NP VP
+            NP -> N | D N
+            VP -> V | V NP | V 'now'
+            N -> 'dog' | 'cat'
+            V -> 'sees'
+            D -> 'the'
+        """)
+        self.instrument = Instrumentation()
+        self.parser = TopDownParser(self.grammar, instrument=self.instrument)
+
+    def test_same_parses(self):
+        tokens = "the dog sees the cat"
+        self.assertEqual(list(TopDownParser(self.grammar).parse(tokens)),
+                         list(self.parser.parse(tokens)))
+        self.assertIs(self.instrument, self.parser.instrument())
+        self.assertIsNone(TopDownParser(self.grammar).instrument())
+
+    def test_counters(self):
+        list(self.parser.parse("dog sees cat"))
+        # VP is expanded once and its 3 productions applied, the last one
+        # failing on 'now'
+        self.assertEqual(dict(expansions=9, matches=5, failed_matches=1,
+                              tree_copies=10, max_frontier=2),
+                         dict(self.instrument.counters()))
+        self.assertEqual(dict(S=1, NP=2, N=2, VP=1, V=3),
+                         self.instrument.symbol_expansions)
+        self.assertEqual(set(["S", "NP", "N", "VP", "V"]),
+                         set(self.instrument.symbol_time))
+        self.assertGreaterEqual(self.instrument.symbol_time["S"],
+                                self.instrument.symbol_time["VP"])
+
+    def test_reset(self):
+        list(self.parser.parse("dog sees"))
+        self.instrument.reset()
+        self.assertEqual(0, self.instrument.expansions)
+        self.assertEqual({}, self.instrument.symbol_time)
+
+    def test_callback(self):
+        events = []
+        parser = TopDownParser(self.grammar, instrument=Instrumentation(
+            callback=lambda *event: events.append(event), timing=False))
+        list(parser.parse("dog sees"))
+        self.assertEqual(("expand", "S", 0), events[0])
+        self.assertIn(("match", "'dog'", 0), events)
+        self.assertIn(("match", "'sees'", 1), events)
+        self.assertEqual({}, parser.instrument().symbol_time)
+
+    def test_verbose(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            list(TopDownParser(self.grammar, verbose=1).parse("dog sees"))
+        self.assertEqual("expand S at 0", output.getvalue().split("\n")[0])
+
+    def test_report(self):
+        list(self.parser.parse("dog sees cat"))
+        report = self.instrument.report(limit=2)
+        self.assertIn("expansions: 9", report)
+        self.assertEqual(5 + 2, len(report.split("\n")))
+
+    def test_only_default_mode(self):
+        with self.assertRaises(ValueError):
+            TopDownParser(self.grammar, iterative=True,
+                          instrument=Instrumentation())
+        with self.assertRaises(ValueError):
+            TopDownParser(self.grammar, memoize=True,
+                          instrument=Instrumentation())
+
+    def test_pickle(self):
+        parser = pickle.loads(pickle.dumps(self.parser))
+        self.assertEqual(1, len(list(parser.parse("dog sees"))))
+        self.assertLess(0, parser.instrument().expansions)
+        self.assertEqual(0, self.instrument.expansions)
+
+
+if __name__ == "__main__":
+    unittest.main()
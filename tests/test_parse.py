@@ -5,11 +5,14 @@
 """ Tests for parse.py module
 """
 
+import itertools
+import math
 import unittest
 from cfg.tree import Tree
-from cfg.parse import TopDownParser
-from cfg.grammar import Grammar
+from cfg.parse import TopDownParser, CKYParser, EarleyParser, ViterbiParser
+from cfg.grammar import Grammar, Production
 from tests.utils import expect_exception
+from benchmarks.generate import synthetic_grammar, synthetic_sentences
 
 
 class TestTopDownParserInit(unittest.TestCase):
@@ -75,6 +78,193 @@ class TestParse(unittest.TestCase):
         parse = self.parser.parse(tokens)
         self.assertListEqual(res, [p for p in parse])
 
+    def test_add_productions(self):
+        """ Productions added to the grammar are used by the parser """
+        tokens = ["the", "dog", "leaves"]
+        self.assertEqual([], [p for p in self.parser.parse(tokens)])
+        self.parser.grammar().add_productions([Production("N", ["'dog'"])])
+        self.assertEqual(1, len([p for p in self.parser.parse(tokens)]))
+
+    def test_unknown_word(self):
+        """ Sentences with unknown words are rejected before searching, even
+            with a left-recursive grammar the search would loop on
+        """
+        parser = TopDownParser(Grammar.parse_grammar("S -> S 'a' | 'a'"))
+        self.assertEqual([], list(parser.parse(["a", "a", "b"])))
+
+    def test_large_lexicon(self):
+        """ Preterminals are expanded from the lexicon of the next word """
+        lexicon = " | ".join("'w%d'" % i for i in range(5000))
+        grammar = Grammar.parse_grammar("""
+            S -> NP VP
+            NP -> N | D N
+            VP -> V NP | V
+            D -> 'the'
+            N -> %s | 'fall'
+            V -> %s | 'leaves'
+        """ % (lexicon, lexicon))
+        parser = TopDownParser(grammar)
+        self.assertEqual(1, len(list(parser.parse("the w1 leaves w2"))))
+
+
+class TestParseDerivations(unittest.TestCase):
+    """ Tests for TopDownParser().parse_derivations(tokens) """
+
+    def setUp(self):
+        grammar_as_string = """
+            S -> NP VP
+            NP -> N | D N | Adj N | D Adj N
+            VP -> V NP | V |V NP NP
+            N -> 'fall' | 'spring' | 'leaves'
+            V -> 'spring' | 'leaves' | 'fall'
+            D -> 'the'
+            Adj -> 'fall' | 'spring' | 'purple'
+        """
+        self.grammar = Grammar.parse_grammar(grammar_as_string)
+        self.parser = TopDownParser(self.grammar)
+
+    def test_same_trees(self):
+        tokens = "the fall leaves fall spring leaves"
+        res = [tree for tree, _ in self.parser.parse(tokens)]
+        derivations = list(self.parser.parse_derivations(tokens))
+        self.assertEqual(4, len(derivations))
+        self.assertEqual(res, [derivation.tree() for derivation in
+                               derivations])
+
+    def test_rule_sequence(self):
+        derivation = next(self.parser.parse_derivations("fall leaves"))
+        res = [Production("S", ["NP", "VP"]), Production("NP", ["N"]),
+               Production("N", ["'fall'"]), Production("VP", ["V"]),
+               Production("V", ["'leaves'"])]
+        self.assertEqual(res, derivation.productions())
+        self.assertEqual((0, 0, 0, 1, 1), derivation.starts())
+
+    def test_unknown_word(self):
+        self.assertEqual([], list(self.parser.parse_derivations("fall dog")))
+
+
+class TestMemoizedParse(unittest.TestCase):
+    """ Tests for TopDownParser(memoize=True) """
+
+    def setUp(self):
+        grammar_as_string = """
+            S -> NP VP
+            NP -> N | D N | Adj N | D Adj N | N PP
+            PP -> P NP
+            VP -> V NP | V |V NP NP | V NP PP
+            N -> 'fall' | 'spring' | 'leaves'
+            V -> 'spring' | 'leaves' | 'fall'
+            D -> 'the'
+            P -> 'in'
+            Adj -> 'fall' | 'spring' | 'purple'
+        """
+        self.grammar = Grammar.parse_grammar(grammar_as_string)
+        self.tokens = "the fall leaves fall in the spring in fall"
+
+    def test_same_parses_as_top_down(self):
+        """ Same parses, in the same order """
+        res = [p for p in TopDownParser(self.grammar).parse(self.tokens)]
+        parser = TopDownParser(self.grammar, memoize=True)
+        self.assertEqual(res, [p for p in parser.parse(self.tokens)])
+
+    def test_cache_info(self):
+        parser = TopDownParser(self.grammar, memoize=True)
+        [p for p in parser.parse(self.tokens)]
+        info = parser.cache_info()
+        self.assertGreater(info.hits, 0)
+        self.assertGreater(info.misses, 0)
+        self.assertIsNone(info.maxsize)
+        # Derivations needed with a larger budget replace the cached ones
+        self.assertLessEqual(info.currsize, info.misses)
+
+    def test_bounded_cache(self):
+        res = [p for p in TopDownParser(self.grammar).parse(self.tokens)]
+        parser = TopDownParser(self.grammar, memoize=True, cache_size=2)
+        self.assertEqual(res, [p for p in parser.parse(self.tokens)])
+        self.assertEqual(2, parser.cache_info().currsize)
+
+    def test_left_recursion(self):
+        grammar = Grammar.parse_grammar("""
+            NP -> NP Adj | N
+            N -> 'dog'
+            Adj -> 'purple'
+        """)
+        parser = TopDownParser(grammar, memoize=True)
+        for tokens in ("dog purple", "dog purple purple"):
+            res = [p for p in TopDownParser(grammar).parse(tokens)]
+            self.assertEqual(1, len(res))
+            self.assertEqual(res, [p for p in parser.parse(tokens)])
+        grammar = Grammar.parse_grammar("""
+            NP -> NP PP | 'the' 'dog'
+            PP -> 'in' NP
+        """)
+        tokens = "the dog in the dog in the dog"
+        res = [p for p in TopDownParser(grammar).parse(tokens)]
+        self.assertEqual(2, len(res))
+        parser = TopDownParser(grammar, memoize=True)
+        self.assertEqual(res, [p for p in parser.parse(tokens)])
+
+    def test_nullable_left_recursion(self):
+        """ Left recursion which may derive nothing more never stops """
+        grammar = Grammar.parse_grammar("""
+            S -> S B | 'a'
+            B -> 'b' |
+        """)
+        parser = TopDownParser(grammar, memoize=True)
+        with self.assertRaises(ValueError):
+            next(parser.parse("a b"))
+
+
+class TestIterativeParse(unittest.TestCase):
+    """ Tests for TopDownParser(iterative=True) """
+
+    def setUp(self):
+        grammar_as_string = """
+            S0 -> S | S C S
+            S -> NP VP
+            NP -> N | D N | Adj N | D Adj N
+            VP -> V NP | V |V NP NP
+            N -> 'fall' | 'spring' | 'leaves'
+            V -> 'spring' | 'leaves' | 'fall'
+            D -> 'the'
+            C -> 'and'
+            Adj -> 'fall' | 'spring' | 'purple'
+        """
+        self.grammar = Grammar.parse_grammar(grammar_as_string)
+
+    def test_same_parses_as_top_down(self):
+        """ Same parses, in the same order """
+        tokens = "fall leaves fall and spring leaves spring"
+        res = [p for p in TopDownParser(self.grammar).parse(tokens)]
+        parser = TopDownParser(self.grammar, iterative=True)
+        self.assertEqual(res, [p for p in parser.parse(tokens)])
+
+    @expect_exception(StopIteration)
+    def test_non_parsable(self):
+        parser = TopDownParser(self.grammar, iterative=True)
+        next(parser.parse(["hello", "world"]))
+
+    def test_no_recursion_limit(self):
+        grammar = Grammar.parse_grammar("S -> 'a' S | 'a'")
+        tokens = ["a"] * 500
+        parser = TopDownParser(grammar, iterative=True)
+        tree, frontier = next(parser.parse(tokens))
+        self.assertEqual("S", tree.node())
+        self.assertEqual([], frontier)
+
+    def test_max_depth(self):
+        grammar = Grammar.parse_grammar("S -> 'a' S | 'a'")
+        tokens = ["a"] * 10
+        # One expansion and one match per token
+        parser = TopDownParser(grammar, iterative=True, max_depth=19)
+        self.assertEqual([], [p for p in parser.parse(tokens)])
+        parser = TopDownParser(grammar, iterative=True, max_depth=20)
+        self.assertEqual(1, len([p for p in parser.parse(tokens)]))
+
+    def test_exclusive_with_memoize(self):
+        with self.assertRaises(ValueError):
+            TopDownParser(self.grammar, memoize=True, iterative=True)
+
 
 class TestPrivateParse(unittest.TestCase):
 
@@ -90,13 +280,16 @@ class TestPrivateParse(unittest.TestCase):
         """
         grammar = Grammar.parse_grammar(grammar_as_string)
         self.parser = TopDownParser(grammar)
-        self.tree = Tree("S", [])
-        self.tokens = ["'fall'", "'leaves'", "'fall'"]
+        self.compiled = grammar.compile()
+        self.tree = Tree(self.compiled.symbol_id("S"), [])
+        self.tokens = self.compiled.token_ids(["fall", "leaves", "fall"])
         self.frontier = [()]
 
     def test_parse_with_final_match(self):
-        self.tree = Tree("N", ["'fall'"])
-        self.tokens = ["fall"]
+        """ Trees and tokens are made of symbol ids """
+        fall = self.compiled.symbol_id("'fall'")
+        self.tree = Tree(self.compiled.symbol_id("N"), [fall])
+        self.tokens = [fall]
         self.frontier = [(0, )]
         res = self.tree
         parse = self.parser._parse(self.tokens, self.tree, self.frontier)
@@ -165,6 +358,37 @@ class TestExpand(unittest.TestCase):
         with self.assertRaises(StopIteration):
             next(self.parser._expand(self.tokens, tree, frontier))
 
+    def test_expand_prunes_on_first_set(self):
+        """ Only NP -> N can start with 'fall' """
+        compiled = self.parser.grammar().compile()
+        tree = Tree(compiled.symbol_id("NP"), [])
+        expanded = []
+
+        def parse(tokens, tree, frontier, needed=None):
+            expanded.append((tree, needed))
+            return iter([])
+        self.parser._parse = parse
+        tokens = compiled.token_ids(["fall", "leaves"])
+        with self.assertRaises(StopIteration):
+            next(self.parser._expand(tokens, tree, [()]))
+        # The frontier of N needs a token
+        self.assertEqual([(self.parser._subtree(0), 1)], expanded)
+
+    def test_expand_prunes_on_min_yield(self):
+        """ NP -> D N needs two tokens """
+        compiled = self.parser.grammar().compile()
+        tree = Tree(compiled.symbol_id("NP"), [])
+        expanded = []
+
+        def parse(tokens, tree, frontier, needed=None):
+            expanded.append((tree, needed))
+            return iter([])
+        self.parser._parse = parse
+        tokens = compiled.token_ids(["the"])
+        with self.assertRaises(StopIteration):
+            next(self.parser._expand(tokens, tree, [()]))
+        self.assertEqual([], expanded)
+
     def test_expand_non_expandable(self):
         tree = Tree("NP", [Tree("D", ["'the'"]), Tree("N", [])])
         frontier = [(0, 0), (1, )]
@@ -172,5 +396,428 @@ class TestExpand(unittest.TestCase):
             next(self.parser._expand(self.tokens, tree, frontier))
 
 
+class TestBoundedParse(unittest.TestCase):
+    """ Tests for parse_bounded """
+
+    def setUp(self):
+        # Catalan number of parses: 429 for 8 tokens
+        self.grammar = Grammar.parse_grammar("S -> S S | 'a'")
+        self.parser = TopDownParser(self.grammar)
+        self.tokens = ["a"] * 8
+
+    def test_complete(self):
+        res = self.parser.parse_bounded(self.tokens)
+        self.assertEqual(("complete", None), (res.status, res.reason))
+        self.assertEqual([tree for tree, _ in self.parser.parse(self.tokens)],
+                         res.trees)
+
+    def test_max_results(self):
+        res = self.parser.parse_bounded(self.tokens, max_results=3)
+        self.assertEqual(("truncated", "max_results"),
+                         (res.status, res.reason))
+        self.assertEqual([tree for tree, _ in
+                          self.parser.parse(self.tokens)][:3], res.trees)
+
+    def test_no_results(self):
+        for parser in [self.parser, CKYParser(self.grammar)]:
+            res = parser.parse_bounded(self.tokens, max_results=0)
+            self.assertEqual(("truncated", [], "max_results"),
+                             (res.status, res.trees, res.reason))
+
+    def test_max_steps(self):
+        res = self.parser.parse_bounded(self.tokens, max_steps=1000)
+        self.assertEqual(("truncated", "max_steps"),
+                         (res.status, res.reason))
+        self.assertLess(len(res.trees), 429)
+
+    def test_max_memory(self):
+        res = self.parser.parse_bounded(self.tokens, max_memory=1000)
+        self.assertEqual(("truncated", "max_memory"),
+                         (res.status, res.reason))
+        res = self.parser.parse_bounded(self.tokens, max_memory=10 ** 6)
+        self.assertEqual("complete", res.status)
+
+    def test_timeout(self):
+        res = self.parser.parse_bounded(["a"] * 16, timeout=0.05)
+        self.assertEqual(("truncated", "timeout"), (res.status, res.reason))
+
+    def test_unknown_word(self):
+        res = self.parser.parse_bounded(["a", "b"], max_steps=1)
+        self.assertEqual(("complete", []), (res.status, res.trees))
+
+    def test_chart_parsers(self):
+        parser = EarleyParser(self.grammar)
+        res = parser.parse_bounded(["a"] * 3, max_results=2)
+        self.assertEqual(("complete", 2), (res.status, len(res.trees)))
+        res = parser.parse_bounded(self.tokens, max_results=2)
+        self.assertEqual(("truncated", "max_results"),
+                         (res.status, res.reason))
+        with self.assertRaises(ValueError):
+            parser.parse_bounded(self.tokens, max_steps=10)
+
+
+class TestCKYParser(unittest.TestCase):
+    """ Tests for CKYParser().parse(tokens) """
+
+    def setUp(self):
+        grammar_as_string = """
+            S -> NP VP | S C S
+            NP -> N | D N | Adj N | D Adj N
+            VP -> V NP | V |V NP NP
+            N -> 'fall' | 'spring' | 'leaves'
+            V -> 'spring' | 'leaves' | 'fall'
+            D -> 'the'
+            C -> 'and'
+            Adj -> 'fall' | 'spring' | 'purple'
+        """
+        self.grammar = Grammar.parse_grammar(grammar_as_string)
+        self.parser = CKYParser(self.grammar)
+
+    def test_returns_grammar(self):
+        self.assertEqual(self.grammar, self.parser.grammar())
+
+    @expect_exception(StopIteration)
+    def test_non_parsable(self):
+        next(self.parser.parse(["hello", "world"]))
+
+    def test_empty_tokens(self):
+        with self.assertRaises(ValueError):
+            self.parser.parse([])
+
+    def test_syntactically_ambiguous(self):
+        """ Trees are returned in the shape of the original grammar """
+        tokens = ["fall", "leaves", "fall"]
+        tree_1 = Tree("S",
+                      [Tree("NP", [Tree("N", ["'fall'"])]),
+                       Tree("VP", [Tree("V", ["'leaves'"]),
+                                   Tree("NP", [Tree("N", ["'fall'"])])])])
+        tree_2 = Tree("S",
+                      [Tree("NP", [Tree("Adj", ["'fall'"]),
+                                   Tree("N", ["'leaves'"])]),
+                       Tree("VP", [Tree("V", ["'fall'"])])])
+        res = [(tree_1, []), (tree_2, [])]
+        self.assertCountEqual(res, [p for p in self.parser.parse(tokens)])
+
+    def test_same_trees_as_top_down(self):
+        """ Ternary rules are restored from their binarized form """
+        grammar = Grammar.parse_grammar("""
+            S -> NP VP
+            NP -> N | D N | Adj N | D Adj N
+            VP -> V NP | V | V NP NP
+            N -> 'fall' | 'spring' | 'leaves'
+            V -> 'spring' | 'leaves' | 'fall'
+            D -> 'the'
+            Adj -> 'fall' | 'spring' | 'purple'
+        """)
+        tokens = "the fall leaves fall spring leaves"
+        res = [p for p in TopDownParser(grammar).parse(tokens)]
+        self.assertCountEqual(res, [p for p in
+                                    CKYParser(grammar).parse(tokens)])
+
+    def test_long_sentence(self):
+        """ Should quickly find a parse of a 39 tokens sentence """
+        tokens = " and ".join(["fall leaves fall"] * 10)
+        tree, frontier = next(self.parser.parse(tokens))
+        self.assertEqual(39, len(tree.leaves()))
+        self.assertEqual([], frontier)
+
+    def test_unknown_word(self):
+        self.assertEqual(0, self.parser.parse_forest("fall dog").count())
+
+    def test_many_nonterminals(self):
+        """ Bitset cells agree with Earley on a grammar of a hundred
+            nonterminals
+        """
+        grammar = Grammar.parse_grammar(synthetic_grammar(
+            lexicon_size=100, fan_out=30, ambiguity=2, depth=3))
+        parser = CKYParser(grammar)
+        earley = EarleyParser(grammar)
+        for sentence in synthetic_sentences(grammar, 6, 3):
+            self.assertTrue(parser.recognize(sentence))
+            self.assertEqual(earley.parse_forest(sentence).count(),
+                             parser.parse_forest(sentence).count())
+        self.assertFalse(parser.recognize("w1 and"))
+
+
+class TestRecognize(unittest.TestCase):
+    """ Tests for Parser().recognize(tokens) """
+
+    def setUp(self):
+        grammar_as_string = """
+            S -> NP VP | S C S
+            NP -> N | D N | Adj N | D Adj N
+            VP -> V NP | V |V NP NP
+            N -> 'fall' | 'spring' | 'leaves'
+            V -> 'spring' | 'leaves' | 'fall'
+            D -> 'the'
+            C -> 'and'
+            Adj -> 'fall' | 'spring' | 'purple'
+        """
+        self.grammar = Grammar.parse_grammar(grammar_as_string)
+
+    def test_recognize(self):
+        for parser in (TopDownParser(self.grammar), CKYParser(self.grammar),
+                       EarleyParser(self.grammar)):
+            self.assertTrue(parser.recognize("fall leaves fall"))
+            self.assertTrue(parser.recognize(
+                "the fall leaves fall and spring leaves spring"))
+            self.assertFalse(parser.recognize("fall leaves fall and"))
+            self.assertFalse(parser.recognize("the the"))
+            self.assertFalse(parser.recognize("fall dog"))
+
+    def test_empty_tokens(self):
+        with self.assertRaises(ValueError):
+            EarleyParser(self.grammar).recognize([])
+
+    def test_same_as_parse(self):
+        parser = EarleyParser(self.grammar)
+        words = ["fall", "leaves", "the", "and", "purple"]
+        for length in range(1, 5):
+            for tokens in itertools.product(words, repeat=length):
+                tokens = list(tokens)
+                self.assertEqual(parser.parse_forest(tokens).count() > 0,
+                                 parser.recognize(tokens))
+
+    def test_any_grammar(self):
+        """ Left recursion and empty productions are recognized """
+        grammar = Grammar.parse_grammar("""
+            S -> S 'a' | 'b' | E S E
+            E -> 'e' |
+        """)
+        parser = TopDownParser(grammar)
+        self.assertTrue(parser.recognize("b a a"))
+        self.assertTrue(parser.recognize("e b a e"))
+        self.assertFalse(parser.recognize("a b"))
+
+    def test_updated_by_add_productions(self):
+        parser = EarleyParser(self.grammar)
+        self.assertFalse(parser.recognize("the dog fall"))
+        self.grammar.add_productions([Production("N", ["'dog'"])])
+        self.assertTrue(parser.recognize("the dog fall"))
+
+
+class TestCountParses(unittest.TestCase):
+    """ Tests for Parser().count_parses, nth_parse and sample_parses """
+
+    def setUp(self):
+        grammar_as_string = """
+            S -> NP VP | S C S
+            NP -> N | D N | Adj N | D Adj N
+            VP -> V NP | V |V NP NP
+            N -> 'fall' | 'spring' | 'leaves'
+            V -> 'spring' | 'leaves' | 'fall'
+            D -> 'the'
+            C -> 'and'
+            Adj -> 'fall' | 'spring' | 'purple'
+        """
+        self.grammar = Grammar.parse_grammar(grammar_as_string)
+        self.parsers = [TopDownParser(self.grammar), CKYParser(self.grammar),
+                        EarleyParser(self.grammar)]
+
+    def test_count_parses(self):
+        tokens = "fall leaves fall and spring leaves spring"
+        res = len(list(CKYParser(self.grammar).parse(tokens)))
+        for parser in self.parsers:
+            self.assertEqual(res, parser.count_parses(tokens))
+            self.assertEqual(0, parser.count_parses("fall and"))
+
+    def test_count_huge(self):
+        """ 20 clauses of 2 parses each, bracketed in Catalan(19) ways """
+        tokens = " and ".join(["fall leaves fall"] * 20)
+        res = 2 ** 20 * 1767263190
+        for parser in self.parsers[1:]:
+            self.assertEqual(res, parser.count_parses(tokens))
+
+    def test_nth_parse(self):
+        tokens = "fall leaves fall and spring leaves spring"
+        parser = EarleyParser(self.grammar)
+        res = list(parser.parse_forest(tokens).trees())
+        self.assertEqual(res, [parser.nth_parse(tokens, k)
+                               for k in range(len(res))])
+        with self.assertRaises(IndexError):
+            parser.nth_parse(tokens, len(res))
+
+    def test_nth_parse_huge(self):
+        tokens = " and ".join(["fall leaves fall"] * 20)
+        parser = CKYParser(self.grammar)
+        tree = parser.nth_parse(tokens, parser.count_parses(tokens) - 1)
+        self.assertEqual("S", tree.node())
+
+    def test_sample_parses(self):
+        tokens = "fall leaves fall and spring leaves spring"
+        for parser in self.parsers:
+            trees = [tree for tree, _ in parser.parse(tokens)]
+            samples = parser.sample_parses(tokens, 20, seed=1)
+            self.assertEqual(20, len(samples))
+            for tree in samples:
+                self.assertIn(tree, trees)
+            self.assertEqual(samples, parser.sample_parses(tokens, 20,
+                                                           seed=1))
+            self.assertEqual([], parser.sample_parses("fall and", 3))
+
+
+class TestViterbiParser(unittest.TestCase):
+    """ Tests for ViterbiParser().parse(tokens) """
+
+    def setUp(self):
+        grammar_as_string = """
+            S -> NP VP [1.0]
+            NP -> D N [0.5] | NP PP [0.2] | 'john' [0.3]
+            VP -> V NP [0.6] | VP PP [0.4]
+            PP -> P NP
+            D -> 'the'
+            N -> 'man' [0.5] | 'telescope' [0.5]
+            V -> 'saw'
+            P -> 'with'
+        """
+        self.grammar = Grammar.parse_grammar(grammar_as_string)
+        self.tokens = "john saw the man with the telescope"
+        the_man = Tree("NP", [Tree("D", ["'the'"]), Tree("N", ["'man'"])])
+        with_telescope = Tree("PP", [
+            Tree("P", ["'with'"]),
+            Tree("NP", [Tree("D", ["'the'"]), Tree("N", ["'telescope'"])])])
+        # The PP attaches to the verb with probability 0.0045, to the
+        # object with probability 0.00225
+        self.verb_attachment = Tree("S", [
+            Tree("NP", ["'john'"]),
+            Tree("VP", [Tree("VP", [Tree("V", ["'saw'"]), the_man]),
+                        with_telescope])])
+        self.noun_attachment = Tree("S", [
+            Tree("NP", ["'john'"]),
+            Tree("VP", [Tree("V", ["'saw'"]),
+                        Tree("NP", [the_man, with_telescope])])])
+
+    def test_best_parse(self):
+        tree, logprob = ViterbiParser(self.grammar).best_parse(self.tokens)
+        self.assertEqual(self.verb_attachment, tree)
+        self.assertAlmostEqual(0.0045, math.exp(logprob))
+
+    def test_parse(self):
+        """ Only the most likely tree is returned by default """
+        res = [(self.verb_attachment, [])]
+        self.assertEqual(res, list(ViterbiParser(self.grammar).parse(
+            self.tokens)))
+
+    def test_k_best(self):
+        parses = ViterbiParser(self.grammar, k=5).parse_scored(self.tokens)
+        self.assertEqual([self.verb_attachment, self.noun_attachment],
+                         [tree for tree, _ in parses])
+        self.assertAlmostEqual(0.00225, math.exp(parses[1].logprob))
+
+    def test_same_trees_as_cky(self):
+        """ With a large enough k, every parse is found """
+        grammar = Grammar.parse_grammar("""
+            S -> NP VP | S C S
+            NP -> N | D N | Adj N | D Adj N
+            VP -> V NP | V |V NP NP
+            N -> 'fall' | 'spring' | 'leaves'
+            V -> 'spring' | 'leaves' | 'fall'
+            D -> 'the'
+            C -> 'and'
+            Adj -> 'fall' | 'spring' | 'purple'
+        """)
+        tokens = "fall leaves fall and spring leaves fall"
+        res = list(CKYParser(grammar).parse(tokens))
+        parses = list(ViterbiParser(grammar, k=100).parse(tokens))
+        self.assertCountEqual(res, parses)
+
+    def test_pruning(self):
+        """ Pruning keeps the best parse """
+        parser = ViterbiParser(self.grammar, k=5, beam=1)
+        self.assertEqual(self.verb_attachment,
+                         parser.best_parse(self.tokens).tree)
+        # The noun attachment is half as likely as the verb attachment
+        parser = ViterbiParser(self.grammar, k=5, threshold=0.9)
+        res = [(self.verb_attachment, [])]
+        self.assertEqual(res, list(parser.parse(self.tokens)))
+
+    def test_unknown_word(self):
+        parser = ViterbiParser(self.grammar)
+        self.assertIsNone(parser.best_parse("john saw the dog"))
+
+    def test_invalid_parameters(self):
+        with self.assertRaises(ValueError):
+            ViterbiParser(self.grammar, k=0)
+        with self.assertRaises(ValueError):
+            ViterbiParser(self.grammar, threshold=2)
+
+
+class TestEarleyParser(unittest.TestCase):
+    """ Tests for EarleyParser().parse(tokens) """
+
+    def setUp(self):
+        grammar_as_string = """
+            S -> NP VP
+            NP -> N | D N | Adj N | D Adj N
+            VP -> V NP | V |V NP NP
+            N -> 'fall' | 'spring' | 'leaves'
+            V -> 'spring' | 'leaves' | 'fall'
+            D -> 'the'
+            Adj -> 'fall' | 'spring' | 'purple'
+        """
+        self.grammar = Grammar.parse_grammar(grammar_as_string)
+        self.parser = EarleyParser(self.grammar)
+
+    @expect_exception(StopIteration)
+    def test_non_parsable(self):
+        next(self.parser.parse(["hello", "world"]))
+
+    def test_empty_tokens(self):
+        with self.assertRaises(ValueError):
+            self.parser.parse([])
+
+    def test_same_trees_as_top_down(self):
+        tokens = "the fall leaves fall spring leaves"
+        res = [p for p in TopDownParser(self.grammar).parse(tokens)]
+        self.assertCountEqual(res, [p for p in self.parser.parse(tokens)])
+
+    def test_start_symbol_in_rhs(self):
+        grammar = Grammar.parse_grammar("""
+            S -> NP VP | S C S
+            NP -> N
+            VP -> V
+            N -> 'fall' | 'spring'
+            V -> 'leaves'
+            C -> 'and'
+        """)
+        tokens = "fall leaves and spring leaves and fall leaves"
+        parses = [p for p in EarleyParser(grammar).parse(tokens)]
+        self.assertEqual(2, len(parses))
+
+    def test_left_recursion(self):
+        grammar = Grammar.parse_grammar("""
+            NP -> NP Adj | N
+            N -> 'dog'
+            Adj -> 'purple'
+        """)
+        res = Tree("NP", [Tree("NP", [Tree("NP", [Tree("N", ["'dog'"])]),
+                                      Tree("Adj", ["'purple'"])]),
+                          Tree("Adj", ["'purple'"])])
+        parses = [p for p in EarleyParser(grammar).parse("dog purple purple")]
+        self.assertEqual([(res, [])], parses)
+
+    def test_empty_production(self):
+        grammar = Grammar.parse_grammar("""
+            S -> D N
+            D -> 'the' |
+            N -> 'dog'
+        """)
+        res = Tree("S", [Tree("D", []), Tree("N", ["'dog'"])])
+        self.assertEqual([(res, [])],
+                         [p for p in EarleyParser(grammar).parse("dog")])
+
+    def test_unit_cycle(self):
+        """ Cyclic derivations are skipped """
+        grammar = Grammar.parse_grammar("""
+            A -> B | 'x'
+            B -> A
+        """)
+        res = [(Tree("A", ["'x'"]), [])]
+        self.assertEqual(res, [p for p in EarleyParser(grammar).parse("x")])
+
+    def test_unknown_word(self):
+        self.assertEqual(0, self.parser.parse_forest("fall dog").count())
+
+
 if __name__ == "__main__":
     unittest.main()
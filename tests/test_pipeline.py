@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+#
+# Author: Florent Piétot <florent.pietot@gmail.com>
+
+""" Tests for pipeline.py module
+"""
+
+import io
+import json
+import os
+import tempfile
+import unittest
+from collections import deque
+from unittest import mock
+from cfg.grammar import Grammar
+from cfg.parse import TopDownParser
+from cfg.pipeline import (parse_stream, write_jsonl, write_bracketed,
+                          Progress, main)
+from cfg.serialize import tree_to_bracketed, read_bracketed
+from cfg.tree import tree_to_tuples
+
+GRAMMAR = """
+    S -> NP VP
+    NP -> N | D N | Adj N | D Adj N
+    VP -> V NP | V |V NP NP
+    N -> 'fall' | 'spring' | 'leaves'
+    V -> 'spring' | 'leaves' | 'fall'
+    D -> 'the'
+    Adj -> 'fall' | 'spring' | 'purple'
+"""
+
+
+class TestParseStream(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = TopDownParser(Grammar.parse_grammar(GRAMMAR))
+        self.lines = ["fall leaves fall\n", "\n", "hello world\n",
+                      "spring leaves\n"]
+
+    def test_line_numbers_and_order(self):
+        records = list(parse_stream(self.parser, self.lines, chunk_size=1,
+                                    window=2))
+        self.assertEqual([(1, "fall leaves fall"), (3, "hello world"),
+                          (4, "spring leaves")],
+                         [(number, sentence) for number, sentence, _ in
+                          records])
+        expected = [tree_to_tuples(tree) for tree, _ in
+                    self.parser.parse("fall leaves fall")]
+        self.assertEqual(expected, records[0][2].parses)
+        self.assertEqual([], records[1][2].parses)
+
+    def test_lazy(self):
+        # Only the lines needed for the first results are read
+        read = []
+
+        def lines():
+            for line in self.lines * 100:
+                read.append(line)
+                yield line
+        records = parse_stream(self.parser, lines(), chunk_size=1)
+        next(records)
+        self.assertLess(len(read), 10)
+
+    def test_window_smaller_than_chunk(self):
+        lines = ["fall leaves fall\n", "spring leaves\n"] * 50
+        for workers in (1, 2):
+            read = []
+
+            def counted():
+                for line in lines:
+                    read.append(line)
+                    yield line
+            records = parse_stream(self.parser, counted(), workers=workers,
+                                   window=3)
+            next(records)
+            self.assertLessEqual(len(read), 3)
+            self.assertEqual(99, len(list(records)))
+
+    def test_bounded_with_workers(self):
+        # Sentences in flight are bounded by the window, not by the input
+        sizes = []
+
+        class Pending(deque):
+            def popleft(self):
+                sizes.append(len(self))
+                return deque.popleft(self)
+        lines = ["fall leaves fall\n", "spring leaves\n"] * 200
+        with mock.patch("cfg.pipeline.deque", Pending):
+            records = list(parse_stream(self.parser, lines, workers=2,
+                                        chunk_size=4, window=16))
+        self.assertEqual(400, len(records))
+        self.assertEqual(list(range(1, 401)),
+                         [number for number, _, _ in records])
+        self.assertLessEqual(max(sizes), 16 + 4)
+
+    def test_progress(self):
+        stream = io.StringIO()
+        progress = Progress(stream, interval=0)
+        list(parse_stream(self.parser, self.lines, progress=progress))
+        self.assertEqual(3, progress.sentences)
+        self.assertEqual(3, len(stream.getvalue().splitlines()))
+
+    def test_write_jsonl(self):
+        output = io.StringIO()
+        write_jsonl(parse_stream(self.parser, self.lines), output)
+        records = [json.loads(line) for line in
+                   output.getvalue().splitlines()]
+        self.assertEqual([1, 3, 4], [record["line"] for record in records])
+        self.assertEqual([2, 0, 1], [len(record["parses"]) for record in
+                                     records])
+
+    def test_write_bracketed(self):
+        output = io.StringIO()
+        write_bracketed(parse_stream(self.parser, ["spring leaves"]), output)
+        tree, _ = next(self.parser.parse("spring leaves"))
+        self.assertEqual("# 1: spring leaves (complete)\n%s\n\n" %
+                         tree_to_bracketed(tree), output.getvalue())
+
+    def test_read_bracketed(self):
+        output = io.StringIO()
+        write_bracketed(parse_stream(self.parser, self.lines), output)
+        trees = [tree for line in self.lines
+                 for tree, _ in self.parser.parse(line)]
+        self.assertEqual(3, len(trees))
+        self.assertEqual(trees,
+                         list(read_bracketed(io.StringIO(output.getvalue()))))
+
+
+class TestMain(unittest.TestCase):
+
+    def test_files(self):
+        directory = tempfile.mkdtemp()
+        paths = [os.path.join(directory, name) for name in
+                 ("grammar.txt", "corpus.txt", "parses.jsonl")]
+        with open(paths[0], "w") as grammar_file:
+            grammar_file.write(GRAMMAR)
+        with open(paths[1], "w") as corpus_file:
+            corpus_file.write("fall leaves fall\nspring leaves\n")
+        self.assertEqual(0, main([paths[0], paths[1], "-o", paths[2],
+                                  "--parser", "cky", "--no-cache"]))
+        with open(paths[2]) as output:
+            records = [json.loads(line) for line in output]
+        self.assertEqual([2, 1], [len(record["parses"]) for record in
+                                  records])
+        for path in paths:
+            os.remove(path)
+        os.rmdir(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+# Author: Florent Piétot <florent.pietot@gmail.com>
+
+""" Tests for serialize.py module
+"""
+
+import io
+import json
+import unittest
+from cfg.tree import Tree, tree_to_tuples
+from cfg.serialize import (tree_to_bracketed, tree_from_bracketed,
+                           write_bracketed, read_bracketed, tree_to_json,
+                           tree_from_json, write_json, read_json)
+
+
+def deep_tree(depth):
+    tree = Tree("N", ["'x'"])
+    for _ in range(depth):
+        tree = Tree("NP", [tree, Tree("D", ["'y'"])])
+    return tree
+
+
+class TestBracketed(unittest.TestCase):
+
+    def setUp(self):
+        self.tree = Tree("S", [Tree("NP", [Tree("N", ["'fall'"])]),
+                               Tree("VP", [Tree("V", ["'leaves'"])]),
+                               Tree("X", [])])
+        self.string = "(S (NP (N 'fall')) (VP (V 'leaves')) (X))"
+
+    def test_tree_to_bracketed(self):
+        self.assertEqual(self.string, tree_to_bracketed(self.tree))
+
+    def test_tree_from_bracketed(self):
+        self.assertEqual(self.tree, tree_from_bracketed(self.string))
+
+    def test_escape(self):
+        tree = Tree("S", [Tree("P", ["'('"]), Tree("P", ["')'"])])
+        string = tree_to_bracketed(tree)
+        self.assertEqual("(S (P '-LRB-') (P '-RRB-'))", string)
+        self.assertEqual(tree, tree_from_bracketed(string))
+        self.assertRaises(ValueError, tree_to_bracketed,
+                          Tree("S", ["'a b'"]))
+
+    def test_penn(self):
+        """ Trees can span several lines, roots can have no label """
+        lines = ["( (S\n", "    (NP (DT the) (NN fall))\n",
+                 "    (VP (VBZ leaves)) ))\n", "(X y)"]
+        trees = list(read_bracketed(lines))
+        self.assertEqual([Tree("", [Tree("S", [
+            Tree("NP", [Tree("DT", ["the"]), Tree("NN", ["fall"])]),
+            Tree("VP", [Tree("VBZ", ["leaves"])])])]), Tree("X", ["y"])],
+            trees)
+
+    def test_comments(self):
+        lines = ["# 1: fall\n", "(N 'fall')\n", "(N\n", "#)\n"]
+        self.assertEqual([Tree("N", ["'fall'"]), Tree("N", ["#"])],
+                         list(read_bracketed(lines)))
+
+    def test_unbalanced(self):
+        for string in ("(S (NP 'x')", "(S 'x'))", "'x'", "(S) (S)", ""):
+            self.assertRaises(ValueError, tree_from_bracketed, string)
+
+    def test_stream(self):
+        output = io.StringIO()
+        write_bracketed([self.tree, Tree("X", ["y"])], output)
+        self.assertEqual("%s\n(X y)\n" % self.string, output.getvalue())
+        self.assertEqual([self.tree, Tree("X", ["y"])],
+                         list(read_bracketed(io.StringIO(output.getvalue()))))
+
+    def test_deep_tree(self):
+        """ Serialization shouldn't hit the recursion limit """
+        string = tree_to_bracketed(deep_tree(5000))
+        self.assertEqual(string,
+                         tree_to_bracketed(tree_from_bracketed(string)))
+
+
+class TestJson(unittest.TestCase):
+
+    def setUp(self):
+        self.tree = Tree("S", [Tree("NP", [Tree("N", ["'fall'"])]),
+                               Tree("VP", [])])
+        self.string = '["S",["NP",["N","\'fall\'"]],["VP"]]'
+
+    def test_tree_to_json(self):
+        self.assertEqual(self.string, tree_to_json(self.tree))
+        self.assertEqual(list(json.loads(self.string)),
+                         json.loads(json.dumps(tree_to_tuples(self.tree))))
+
+    def test_tree_from_json(self):
+        self.assertEqual(self.tree, tree_from_json(self.string))
+        self.assertEqual(self.tree, tree_from_json(
+            json.dumps(tree_to_tuples(self.tree))))
+
+    def test_escape(self):
+        tree = Tree("S", [u'"\\é', "a b"])
+        self.assertEqual(tree, tree_from_json(tree_to_json(tree)))
+        self.assertEqual(["S", u'"\\é', "a b"],
+                         json.loads(tree_to_json(tree)))
+
+    def test_invalid(self):
+        for string in ('["S"', '["S"]]', '"S"', '[["S"]]', '["S", 1]', ""):
+            self.assertRaises(ValueError, tree_from_json, string)
+
+    def test_stream(self):
+        output = io.StringIO()
+        write_json([self.tree, Tree("X", ["y"])], output)
+        self.assertEqual('%s\n["X","y"]\n' % self.string, output.getvalue())
+        lines = io.StringIO(output.getvalue() + "\n")
+        self.assertEqual([self.tree, Tree("X", ["y"])], list(read_json(lines)))
+
+    def test_deep_tree(self):
+        """ Serialization shouldn't hit the recursion limit """
+        string = tree_to_json(deep_tree(5000))
+        self.assertEqual(string, tree_to_json(tree_from_json(string)))
+
+
+if __name__ == "__main__":
+    unittest.main()
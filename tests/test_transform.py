@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+#
+# Author: Florent Piétot <florent.pietot@gmail.com>
+
+""" Tests for transform.py module
+"""
+
+import unittest
+from cfg.tree import Tree
+from cfg.grammar import Production, Grammar, is_terminal
+from cfg.parse import CKYParser, EarleyParser, TopDownParser
+from cfg.transform import (DerivedProduction, restore, chomsky_normal_form,
+                           with_probabilities, simplify, remove_useless,
+                           collapse_units, deduplicate, left_factor)
+
+
+class TestRestore(unittest.TestCase):
+    """ Test case for restoring nodes of the original grammar
+    """
+
+    def test_plain_production(self):
+        production = Production("N", ["'fall'"])
+        res = [Tree("N", ["'fall'"])]
+        self.assertEqual(res, restore(production, ["'fall'"]))
+
+    def test_unit_chain(self):
+        production = DerivedProduction("NP", ["'fall'"], ["NP", "N"])
+        res = [Tree("NP", [Tree("N", ["'fall'"])])]
+        self.assertEqual(res, restore(production, ["'fall'"]))
+
+    def test_spliced(self):
+        """ Introduced symbols return their children to be spliced """
+        production = DerivedProduction("VP|<NP-NP>", ["NP", "NP"], [])
+        children = [Tree("NP", []), Tree("NP", [])]
+        self.assertEqual(children, restore(production, children))
+
+
+class TestChomskyNormalForm(unittest.TestCase):
+
+    def setUp(self):
+        grammar_as_string = """
+            S -> NP VP
+            NP -> N | D N
+            VP -> V | V 'and' V NP
+            N -> 'fall' | 'leaves'
+            V -> 'fall' | 'leaves'
+            D -> 'the'
+        """
+        self.grammar = Grammar.parse_grammar(grammar_as_string)
+        self.cnf = chomsky_normal_form(self.grammar)
+
+    def test_start(self):
+        self.assertEqual("S", self.cnf.start())
+
+    def test_is_normal_form(self):
+        """ Every production is either A -> B C or A -> 'x' """
+        for production in self.cnf.productions():
+            rhs = production.rhs()
+            if len(rhs) == 1:
+                self.assertEqual("'", rhs[0][0])
+            else:
+                self.assertEqual(2, len(rhs))
+                for symbol in rhs:
+                    self.assertNotEqual("'", symbol[0])
+
+    def test_unit_collapsed(self):
+        res = DerivedProduction("NP", ["'fall'"], ["NP", "N"])
+        self.assertIn(res, self.cnf.productions(lhs="NP"))
+
+    def test_binarized(self):
+        res = [
+            DerivedProduction("VP", ["V", "VP|<<'and'>-V-NP>"], ["VP"]),
+            DerivedProduction("VP|<<'and'>-V-NP>", ["<'and'>", "VP|<V-NP>"],
+                              []),
+            DerivedProduction("VP|<V-NP>", ["V", "NP"], []),
+            DerivedProduction("<'and'>", ["'and'"], [])
+        ]
+        for production in res:
+            self.assertIn(production, self.cnf.productions())
+
+    def test_empty_production(self):
+        grammar = Grammar("S", [Production("S", [])])
+        with self.assertRaises(ValueError):
+            chomsky_normal_form(grammar)
+
+    def test_unit_cycle(self):
+        """ Cyclic unit chains are only followed once """
+        grammar = Grammar("A", [Production("A", ["B"]),
+                                Production("B", ["A"]),
+                                Production("B", ["'x'"])])
+        res = [DerivedProduction("A", ["'x'"], ["A", "B"]),
+               DerivedProduction("B", ["'x'"], ["B"])]
+        self.assertCountEqual(res, chomsky_normal_form(grammar).productions())
+
+    def test_probabilities(self):
+        """ Derivations keep their probability in normal form """
+        grammar = Grammar.parse_grammar("""
+            S -> NP VP [0.5] | VP [0.5]
+            NP -> N [0.4] | D N [0.6]
+            VP -> V 'and' V NP [1.0]
+            N -> 'fall' [1.0]
+            V -> 'fall'
+            D -> 'the'
+        """)
+        probs = dict((production, production.prob()) for production in
+                     chomsky_normal_form(grammar).productions())
+        self.assertAlmostEqual(0.4, probs[DerivedProduction(
+            "NP", ["'fall'"], ["NP", "N"])])
+        self.assertAlmostEqual(0.5, probs[DerivedProduction(
+            "S", ["V", "S|<<'and'>-V-NP>"], ["S", "VP"])])
+        self.assertEqual(1.0, probs[DerivedProduction(
+            "VP|<<'and'>-V-NP>", ["<'and'>", "VP|<V-NP>"], [])])
+        self.assertEqual(1.0, probs[DerivedProduction(
+            "<'and'>", ["'and'"], [])])
+        self.assertIsNone(probs[DerivedProduction("V", ["'fall'"], ["V"])])
+
+
+class TestWithProbabilities(unittest.TestCase):
+
+    def test_uniform(self):
+        grammar = Grammar.parse_grammar("S -> A | B | 'x' 'y'\nA -> 'x'")
+        self.assertEqual([1 / 3.0, 1 / 3.0, 1 / 3.0, 1.0],
+                         [production.prob() for production in
+                          with_probabilities(grammar).productions()])
+
+    def test_left_probability(self):
+        grammar = Grammar.parse_grammar("S -> A [0.5] | B | 'x'")
+        self.assertEqual([0.5, 0.25, 0.25],
+                         [production.prob() for production in
+                          with_probabilities(grammar).productions()])
+
+    def test_no_probability_left(self):
+        grammar = Grammar.parse_grammar("S -> A [0.5] | B [0.5] | 'x'")
+        with self.assertRaises(ValueError):
+            with_probabilities(grammar)
+
+
+class TestSimplify(unittest.TestCase):
+
+    def setUp(self):
+        grammar_as_string = """
+            S0 -> S | S C S
+            S -> NP VP
+            NP -> N | D N | Adj N | D Adj N
+            VP -> V NP | V | V NP NP
+            N -> 'fall' | 'spring' | 'leaves'
+            V -> 'spring' | 'leaves' | 'fall'
+            D -> 'the'
+            C -> 'and'
+            Adj -> 'fall' | 'spring' | 'purple'
+        """
+        self.grammar = Grammar.parse_grammar(grammar_as_string)
+
+    def test_remove_useless(self):
+        grammar = Grammar.parse_grammar("""
+            S -> A | B 'x'
+            A -> 'a'
+            B -> B 'b'
+            C -> 'c'
+        """)
+        res = [Production("S", ["A"]), Production("A", ["'a'"])]
+        self.assertEqual(res, remove_useless(grammar).productions())
+
+    def test_collapse_units(self):
+        grammar = Grammar.parse_grammar("""
+            S -> NP
+            NP -> N | D N
+            N -> 'fall'
+            D -> 'the'
+        """)
+        res = [DerivedProduction("S", ["D", "N"], ["S", "NP"]),
+               DerivedProduction("S", ["'fall'"], ["S", "NP", "N"]),
+               DerivedProduction("NP", ["D", "N"], ["NP"]),
+               DerivedProduction("NP", ["'fall'"], ["NP", "N"]),
+               DerivedProduction("N", ["'fall'"], ["N"]),
+               DerivedProduction("D", ["'the'"], ["D"])]
+        self.assertCountEqual(res, collapse_units(grammar).productions())
+
+    def test_collapse_units_twice(self):
+        """ Chains of derived productions are composed """
+        grammar = collapse_units(Grammar("S", [
+            DerivedProduction("S", ["B"], ["S", "A"]),
+            Production("B", ["'x'"])]))
+        self.assertEqual(
+            ("S", "A", "B"),
+            grammar.productions("S")[0].chain())
+
+    def test_deduplicate(self):
+        grammar = Grammar.parse_grammar("S -> 'a' | 'b' | 'a'")
+        res = [Production("S", ["'a'"]), Production("S", ["'b'"])]
+        self.assertEqual(res, deduplicate(grammar).productions())
+
+    def test_left_factor(self):
+        grammar = Grammar.parse_grammar("""
+            VP -> V NP [0.5] | V NP PP [0.25] | V [0.25]
+        """)
+        res = [DerivedProduction("VP", ["V", "VP|<V>"], ["VP"]),
+               Production("VP", ["V"]),
+               DerivedProduction("VP|<V>", ["NP"], []),
+               DerivedProduction("VP|<V>", ["NP", "PP"], [])]
+        productions = left_factor(grammar).productions()
+        self.assertEqual(res, productions)
+        self.assertEqual([0.75, 0.25, 2 / 3.0, 1 / 3.0],
+                         [production.prob() for production in productions])
+
+    def test_no_unit_productions(self):
+        for production in simplify(self.grammar).productions():
+            rhs = production.rhs()
+            self.assertFalse(len(rhs) == 1 and not is_terminal(rhs[0]))
+
+    def test_same_trees(self):
+        """ Chart parsers restore trees to the shape of the original
+            grammar
+        """
+        tokens = "the fall leaves fall and spring leaves spring"
+        for factor in (False, True):
+            simplified = simplify(self.grammar, factor=factor)
+            for parser in (CKYParser, EarleyParser, TopDownParser):
+                res = list(parser(self.grammar).parse(tokens))
+                self.assertLess(0, len(res))
+                self.assertCountEqual(res,
+                                      list(parser(simplified).parse(tokens)))
+
+    def test_same_trees_top_down(self):
+        """ Every mode of the top-down parser restores trees too, including
+            productions which only differ by the nodes they stand for
+        """
+        grammar = Grammar.parse_grammar("""
+            S -> A | B
+            A -> 'x'
+            B -> 'x'
+        """)
+        for original in (self.grammar, grammar):
+            tokens = "fall leaves fall" if original is self.grammar else "x"
+            simplified = simplify(original, factor=True)
+            res = [tree for tree, _ in TopDownParser(original).parse(tokens)]
+            self.assertLess(0, len(res))
+            for options in ({}, {"memoize": True}, {"iterative": True}):
+                parser = TopDownParser(simplified, **options)
+                self.assertCountEqual(
+                    res, [tree for tree, _ in parser.parse(tokens)])
+            self.assertCountEqual(
+                res, [derivation.tree() for derivation in
+                      TopDownParser(simplified).parse_derivations(tokens)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,8 +6,10 @@
 """
 
 import unittest
-from cfg.tree import (Tree, tree_from_production)
-from cfg.grammar import Production
+from cfg.tree import (Tree, PersistentTree, FlatTree, LabelTable,
+                      tree_from_production, tree_from_string, tree_to_tuples,
+                      tree_from_tuples)
+from cfg.grammar import Production, Grammar
 
 
 class TestTree(unittest.TestCase):
@@ -53,6 +55,18 @@ class TestTree(unittest.TestCase):
         copy = self.tree.copy()
         self.assertEqual(copy, self.tree, "Copy should be equal")
 
+    def test_deep_str(self):
+        """ str and repr shouldn't hit the recursion limit """
+        tree = Tree("N", ["'x'"])
+        for _ in range(5000):
+            tree = Tree("NP", [tree])
+        self.assertEqual("(NP, " * 5000 + "(N, 'x')" + ")" * 5000, str(tree))
+        self.assertEqual("('NP', (" * 5000 + "('N', (\"'x'\",))" +
+                         ",))" * 5000, repr(tree))
+
+    def test_no_instance_dict(self):
+        self.assertFalse(hasattr(self.tree, "__dict__"))
+
     def test_len(self):
         res = 3
         self.assertEqual(res, len(self.tree),
@@ -163,5 +177,137 @@ class TestTreeFromProduction(unittest.TestCase):
         self.assertEqual(res, tree_from_production(self.production))
 
 
+class TestTreeFromString(unittest.TestCase):
+
+    def test_tree_from_string(self):
+        grammar = Grammar.parse_grammar("""
+            NP -> N | 'the' N
+            N -> 'fall' | 'spring'
+            V -> 'fall'
+        """)
+        res = [Tree(Production("N", ["'fall'"])),
+               Tree(Production("V", ["'fall'"]))]
+        self.assertEqual(res, tree_from_string("fall leaves", grammar))
+        self.assertEqual([], tree_from_string("dog", grammar))
+
+
+class TestTreeTuples(unittest.TestCase):
+    """ Test case for the nested tuples form of a ``tree``
+    """
+
+    def setUp(self):
+        self.tree = Tree("S", [Tree("NP", [Tree("N", ["'fall'"])]),
+                               Tree("VP", [])])
+        self.tuples = ("S", ("NP", ("N", "'fall'")), ("VP", ))
+
+    def test_tree_to_tuples(self):
+        self.assertEqual(self.tuples, tree_to_tuples(self.tree))
+
+    def test_tree_from_tuples(self):
+        self.assertEqual(self.tree, tree_from_tuples(self.tuples))
+
+    def test_tree_from_lists(self):
+        """ Lists, e.g. loaded from JSON, are read like tuples """
+        self.assertEqual(self.tree, tree_from_tuples(
+            ["S", ["NP", ["N", "'fall'"]], ["VP"]]))
+
+
+class TestPersistentTree(unittest.TestCase):
+    """ Test case for the immutable ``PersistentTree``
+    """
+
+    def setUp(self):
+        self.np = PersistentTree("NP", [PersistentTree("N", ["'fall'"])])
+        self.tree = PersistentTree("S", [self.np, PersistentTree("VP")])
+
+    def test_get_path(self):
+        self.assertEqual("'fall'", self.tree[(0, 0, 0)])
+        self.assertEqual(self.tree, self.tree[()])
+
+    def test_replace(self):
+        subtree = PersistentTree("VP", [PersistentTree("V", ["'leaves'"])])
+        res = PersistentTree("S", [self.np, subtree])
+        self.assertEqual(res, self.tree.replace((1, ), subtree))
+
+    def test_replace_shares_subtrees(self):
+        new_tree = self.tree.replace((1, ), PersistentTree("VP", ["'x'"]))
+        self.assertIs(self.np, new_tree[0])
+        self.assertEqual(PersistentTree("VP"), self.tree[1],
+                         "Original tree should be left unchanged")
+
+    def test_to_tree(self):
+        res = Tree("S", [Tree("NP", [Tree("N", ["'fall'"])]), Tree("VP", [])])
+        self.assertEqual(res, self.tree.to_tree())
+
+    def test_from_tree(self):
+        self.assertEqual(self.tree,
+                         PersistentTree.from_tree(self.tree.to_tree()))
+
+    def test_str(self):
+        self.assertEqual("(S, (NP, (N, 'fall')), (VP))", str(self.tree))
+
+    def test_deep_tree(self):
+        """ Conversions shouldn't hit the recursion limit """
+        tree = PersistentTree("N", ["'x'"])
+        for _ in range(5000):
+            tree = PersistentTree("NP", [tree])
+        tree = PersistentTree.from_tree(tree.to_tree())
+        depth = 0
+        while isinstance(tree, PersistentTree):
+            tree, depth = tree[0], depth + 1
+        self.assertEqual(5001, depth)
+
+
+class TestFlatTree(unittest.TestCase):
+    """ Test case for the array based ``FlatTree``
+    """
+
+    def setUp(self):
+        self.tree = Tree("S", [Tree("NP", [Tree("D", ["'the'"]),
+                                           Tree("N", ["'fall'"])]),
+                               Tree("VP", [Tree("V", ["'leaves'"])]),
+                               Tree("X", [])])
+        self.flat = FlatTree.from_tree(self.tree)
+
+    def test_arrays(self):
+        labels = self.flat.labels()
+        self.assertEqual(["S", "NP", "D", "'the'", "N", "'fall'", "VP", "V",
+                          "'leaves'", "X"],
+                         [labels[label_id] for label_id in
+                          self.flat.label_ids()])
+        self.assertEqual([-1, 0, 1, 2, 1, 4, 0, 6, 7, 0],
+                         list(self.flat.parents()))
+        self.assertEqual([(0, 3), (0, 2), (0, 1), (0, 1), (1, 2), (1, 2),
+                          (2, 3), (2, 3), (2, 3), (3, 3)], self.flat.spans())
+        self.assertEqual(10, len(self.flat))
+
+    def test_is_leaf(self):
+        self.assertEqual([3, 5, 8], [index for index in range(len(self.flat))
+                                     if self.flat.is_leaf(index)])
+
+    def test_to_tree(self):
+        self.assertEqual(self.tree, self.flat.to_tree())
+
+    def test_shared_labels(self):
+        labels = LabelTable(["S", "NP"])
+        first = FlatTree.from_tree(self.tree, labels)
+        second = FlatTree.from_tree(Tree("S", [Tree("NP", ["'the'"])]),
+                                    labels)
+        self.assertEqual([0, 1, 3], list(second.label_ids()))
+        self.assertEqual(10, len(labels))
+        self.assertEqual(self.flat, first)
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.tree, first.to_tree())
+
+    def test_deep_tree(self):
+        """ Conversions shouldn't hit the recursion limit """
+        tree = Tree("N", ["'x'"])
+        for _ in range(5000):
+            tree = Tree("NP", [tree])
+        flat = FlatTree.from_tree(tree)
+        self.assertEqual([(0, 1)] * 5002, flat.spans())
+        self.assertEqual(flat, FlatTree.from_tree(flat.to_tree()))
+
+
 if __name__ == "__main__":
     unittest.main()